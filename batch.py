@@ -0,0 +1,289 @@
+"""
+Wsadowe przetwarzanie plików PCAP bez uruchamiania serwera WWW
+
+Analizuje wszystkie przechwycenia z podanych katalogów, wzorców glob lub plików w puli
+procesów, korzystając z tych samych funkcji co aplikacja (ingest_pcap, generate_extended_stats,
+generate_pdf_report). Wyniki trafiają do katalogu wyjściowego, po jednym podkatalogu na plik:
+
+    <wyjście>/<nazwa>_<sha256[:12]>/analysis.json, packets.csv, report.pdf
+
+Pliki o tej samej treści (ten sam sha256) są analizowane raz, a pozostałe otrzymują kopie wyników.
+Przetworzone pliki są zapisywane w dzienniku <wyjście>/batch_journal.ndjson - ponowne
+uruchomienie po przerwaniu pomija pliki, których wyniki już istnieją.
+
+Przykład:
+    python batch.py captures/ "archiwum/**/*.pcapng" --output wyniki --workers 4 --formats json,pdf
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import main
+
+BATCH_FORMATS = ('json', 'csv', 'pdf')
+BATCH_JOURNAL = 'batch_journal.ndjson'
+# Nazwy plików wynikowych w katalogu danego przechwycenia
+BATCH_OUTPUT_NAMES = {'json': 'analysis.json', 'csv': 'packets.csv', 'pdf': 'report.pdf'}
+
+def find_captures(inputs):
+    """
+    Zwraca posortowaną listę plików przechwyceń (bez powtórzeń)
+
+    Args:
+        inputs (list): Katalogi (przeszukiwane rekurencyjnie), wzorce glob lub ścieżki plików
+
+    Returns:
+        list: Bezwzględne ścieżki plików o rozszerzeniach obsługiwanych przez aplikację
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = glob.glob(os.path.join(item, '**', '*'), recursive=True)
+        elif os.path.isfile(item):
+            # Pliki podane wprost są przetwarzane niezależnie od rozszerzenia
+            paths.add(os.path.abspath(item))
+            continue
+        else:
+            candidates = glob.glob(item, recursive=True)
+
+        paths.update(os.path.abspath(path) for path in candidates
+                     if os.path.isfile(path) and main.allowed_file(path))
+    return sorted(paths)
+
+def journal_key(path):
+    """Klucz dziennika: ścieżka, rozmiar i czas modyfikacji pliku (zmieniony plik jest przetwarzany ponownie)"""
+    info = os.stat(path)
+    return f"{path}|{info.st_size}|{info.st_mtime_ns}"
+
+def load_journal(journal_path):
+    """Zwraca wpisy udanych przetworzeń z dziennika, których pliki wynikowe nadal istnieją"""
+    done = {}
+    if not os.path.exists(journal_path):
+        return done
+
+    with open(journal_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Ostatni wiersz mógł zostać ucięty przy przerwaniu
+                continue
+            if entry.get('status') == 'ok' and all(os.path.exists(path) for path in entry['outputs'].values()):
+                done[entry['key']] = entry
+    return done
+
+def capture_output_dir(output_dir, path, sha256):
+    """Katalog wyników danego przechwycenia: <wyjście>/<nazwa>_<sha256[:12]>"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(output_dir, f"{stem}_{sha256[:12]}")
+
+def process_capture(path, output_dir, formats, sha256=None):
+    """
+    Analizuje jeden plik przechwycenia i zapisuje wybrane wyniki (uruchamiane w procesie roboczym)
+
+    Args:
+        path (str): Ścieżka pliku PCAP/PCAPNG
+        output_dir (str): Katalog wyjściowy
+        formats (list): Formaty wyników ('json', 'csv', 'pdf')
+        sha256 (str): Skrót treści pliku, jeśli został już obliczony
+
+    Returns:
+        dict: Wpis dziennika (analiza, liczba pakietów i bajtów, ścieżki wyników, czas)
+    """
+    started = time.perf_counter()
+    sha256 = sha256 or main.file_sha256(path)
+
+    # Plik o tej samej treści mógł już zostać przeanalizowany (np. przesłany przez aplikację)
+    json_filename = main.find_analysis_by_hash(sha256)
+    if json_filename is None:
+        json_filename = main.ingest_pcap(path, os.path.basename(path), sha256=sha256)
+
+    with main.get_catalog() as conn:
+        row = conn.execute("SELECT packet_count FROM analyses WHERE json_filename = ?", (json_filename,)).fetchone()
+
+    target_dir = capture_output_dir(output_dir, path, sha256)
+    os.makedirs(target_dir, exist_ok=True)
+
+    outputs = {}
+    for output_format in formats:
+        target = os.path.join(target_dir, BATCH_OUTPUT_NAMES[output_format])
+
+        if output_format == 'json':
+            with open(target, 'w', encoding='utf-8') as f:
+                f.writelines(main.stream_analysis_json(json_filename, indent=2))
+        elif output_format == 'csv':
+            main.run_csv_export(json_filename, target)
+        else:
+            options = main.REPORT_DEFAULT_OPTIONS
+            fingerprint = main.report_fingerprint(json_filename, 'report', options)
+            report_filename = main.find_report(fingerprint) or main.run_report(json_filename, options, fingerprint)['file']
+            shutil.copyfile(os.path.join(main.app.config['UPLOAD_FOLDER'], report_filename), target)
+
+        outputs[output_format] = target
+
+    return {
+        'json_filename': json_filename,
+        'sha256': sha256,
+        'packets': row['packet_count'] if row else 0,
+        'bytes': os.path.getsize(path),
+        'outputs': outputs,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+def copy_capture_outputs(entry, path, output_dir):
+    """
+    Kopiuje wyniki przetworzonego pliku dla innego pliku o tej samej treści
+
+    Args:
+        entry (dict): Wpis dziennika pliku, który został przeanalizowany
+        path (str): Ścieżka pliku o tej samej treści
+        output_dir (str): Katalog wyjściowy
+
+    Returns:
+        dict: Wpis dziennika dla pliku path
+    """
+    target_dir = capture_output_dir(output_dir, path, entry['sha256'])
+    os.makedirs(target_dir, exist_ok=True)
+
+    outputs = {}
+    for output_format, source in entry['outputs'].items():
+        target = os.path.join(target_dir, os.path.basename(source))
+        if os.path.abspath(target) != os.path.abspath(source):
+            shutil.copyfile(source, target)
+        outputs[output_format] = target
+
+    return {**entry, 'outputs': outputs, 'bytes': os.path.getsize(path), 'seconds': 0.0}
+
+def group_duplicates(pending, executor):
+    """
+    Grupuje oczekujące pliki o tej samej treści
+
+    Skróty SHA-256 są liczone w procesach roboczych i tylko dla plików o powtarzającym się
+    rozmiarze - plik o unikalnym rozmiarze nie ma duplikatu, a jego skrót oblicza process_capture.
+
+    Args:
+        pending (list): Pary (ścieżka, klucz dziennika)
+        executor: Pula procesów
+
+    Returns:
+        list: Pary (sha256 lub None, lista par (ścieżka, klucz dziennika)) - analizowany jest pierwszy plik grupy
+    """
+    by_size = {}
+    for path, key in pending:
+        by_size.setdefault(os.path.getsize(path), []).append((path, key))
+
+    groups = [(None, members) for members in by_size.values() if len(members) == 1]
+    candidates = [item for members in by_size.values() if len(members) > 1 for item in members]
+    by_hash = {}
+    for item, sha256 in zip(candidates, executor.map(main.file_sha256, [path for path, _ in candidates])):
+        by_hash.setdefault(sha256, []).append(item)
+    groups.extend(by_hash.items())
+    return groups
+
+def print_summary(results, skipped, elapsed):
+    """Wypisuje podsumowanie przepustowości przetwarzania"""
+    processed = [result for result in results if result['status'] == 'ok']
+    failed = len(results) - len(processed)
+    packets = sum(result['packets'] for result in processed)
+    megabytes = sum(result['bytes'] for result in processed) / (1024 * 1024)
+    rate = lambda value: value / elapsed if elapsed > 0 else 0.0
+
+    print()
+    print(f"Przetworzone: {len(processed)}, pominięte: {skipped}, błędy: {failed}")
+    print(f"Pakiety: {packets}, dane: {megabytes:.2f} MB, czas: {elapsed:.2f} s")
+    print(f"Przepustowość: {rate(len(processed)):.2f} plików/s, {rate(packets):.0f} pakietów/s, {rate(megabytes):.2f} MB/s")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Wsadowa analiza plików PCAP/PCAPNG bez uruchamiania serwera WWW')
+    parser.add_argument('inputs', nargs='+', help='katalogi, wzorce glob lub pliki przechwyceń')
+    parser.add_argument('-o', '--output', default='batch_output', help='katalog wyników (domyślnie batch_output)')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='liczba procesów roboczych (domyślnie liczba rdzeni)')
+    parser.add_argument('-f', '--formats', default='json,csv,pdf',
+                        help=f"formaty wyników oddzielone przecinkami ({', '.join(BATCH_FORMATS)})")
+    parser.add_argument('--no-resume', action='store_true', help='przetwarza ponownie pliki zapisane w dzienniku')
+    args = parser.parse_args(argv)
+
+    args.formats = [item.strip() for item in args.formats.split(',') if item.strip()]
+    unknown = set(args.formats) - set(BATCH_FORMATS)
+    if unknown:
+        parser.error(f"nieznane formaty: {', '.join(sorted(unknown))}")
+    if args.workers < 1:
+        parser.error('liczba procesów roboczych musi być dodatnia')
+    return args
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    main.create_app()
+    os.makedirs(args.output, exist_ok=True)
+    journal_path = os.path.join(args.output, BATCH_JOURNAL)
+
+    captures = find_captures(args.inputs)
+    if not captures:
+        print('Nie znaleziono plików przechwyceń')
+        return 1
+
+    done = {} if args.no_resume else load_journal(journal_path)
+    pending = []
+    for path in captures:
+        key = journal_key(path)
+        if key in done and set(args.formats) <= set(done[key]['outputs']):
+            continue
+        pending.append((path, key))
+    skipped = len(captures) - len(pending)
+    print(f"Pliki: {len(captures)}, do przetworzenia: {len(pending)}, pominięte (dziennik): {skipped}")
+
+    results = []
+    started = time.perf_counter()
+    executor = ProcessPoolExecutor(max_workers=min(args.workers, max(len(pending), 1)))
+    try:
+        # Pliki o tej samej treści są analizowane raz - pozostałe otrzymują kopie wyników
+        groups = group_duplicates(pending, executor)
+        with open(journal_path, 'a', encoding='utf-8') as journal:
+            futures = {executor.submit(process_capture, members[0][0], args.output, args.formats, sha256): members
+                       for sha256, members in groups}
+            for future in as_completed(futures):
+                members = futures[future]
+                try:
+                    processed = future.result()
+                except Exception as e:
+                    processed = None
+                    error = str(e)
+
+                for path, key in members:
+                    try:
+                        if processed is None:
+                            raise RuntimeError(error)
+                        if path == members[0][0]:
+                            entry = {'status': 'ok', **processed}
+                        else:
+                            entry = {'status': 'ok', **copy_capture_outputs(processed, path, args.output),
+                                     'duplicate_of': members[0][0]}
+                        print(f"[{len(results) + 1}/{len(pending)}] {path}: {entry['packets']} pakietów, {entry['seconds']} s")
+                    except Exception as e:
+                        entry = {'status': 'error', 'error': str(e), 'packets': 0, 'bytes': 0, 'outputs': {}}
+                        print(f"[{len(results) + 1}/{len(pending)}] {path}: błąd - {e}")
+
+                    entry.update(key=key, path=path, finished_at=datetime.datetime.now().isoformat(timespec='seconds'))
+                    journal.write(json.dumps(entry) + '\n')
+                    # Dziennik zapisywany na bieżąco - przerwanie nie gubi ukończonych plików
+                    journal.flush()
+                    results.append(entry)
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        print('\nPrzerwano - ponowne uruchomienie wznowi przetwarzanie od nieukończonych plików')
+        print_summary(results, skipped, time.perf_counter() - started)
+        return 130
+
+    executor.shutdown()
+    print_summary(results, skipped, time.perf_counter() - started)
+    return 1 if any(result['status'] != 'ok' for result in results) else 0
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -1,25 +1,34 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, make_response
 from werkzeug.utils import secure_filename
-from scapy.all import rdpcap, IP, TCP, UDP, Ether
 import os
+import re
 import json
 import datetime
 import ipaddress
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')  # Ustawienie backendu dla matplotlib bez GUI
 from io import BytesIO
 import base64
 import collections
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch, cm
-import networkx as nx
-from reportlab.platypus import PageBreak
+import functools
+import heapq
+import itertools
+import random
+import struct
+import mmap
+import socket
+import sqlite3
+import hashlib
+import gzip
+import threading
+import multiprocessing
+import time
+import uuid
+import zipfile
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+# Ciężkie biblioteki (scapy, matplotlib, networkx, ReportLab, pandas) są importowane dopiero
+# w funkcjach, które ich używają - start serwera i procesów roboczych nie płaci za ich ładowanie
 
 # Konfiguracja aplikacji
 app = Flask(__name__)
@@ -28,11 +37,46 @@ app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['JSON_FOLDER'] = 'json_files'
 app.config['STATIC_FOLDER'] = 'static'
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # Limit 100MB
-
-# Tworzenie katalogów, jeśli nie istnieją
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['JSON_FOLDER'], exist_ok=True)
-os.makedirs(os.path.join('static', 'img'), exist_ok=True)
+app.config['PAYLOAD_PREVIEW_BYTES'] = 256  # Maksymalny podgląd payload zapisywany w rekordzie pakietu
+app.config['CATALOG_DB'] = os.path.join(app.config['JSON_FOLDER'], 'catalog.db')
+app.config['CATALOG_PAGE_SIZE'] = 25  # Liczba analiz na jednej stronie listy
+app.config['TCP_TRACKER_MAX_FLOWS'] = 100000  # Maksymalna liczba jednocześnie śledzonych przepływów TCP
+app.config['TCP_TRACKER_IDLE_TIMEOUT'] = 300  # Po ilu sekundach bezczynności przepływ jest zamykany
+app.config['DNS_TRACKER_MAX_PENDING'] = 50000  # Maks. liczba zapytań DNS oczekujących na odpowiedź
+app.config['DNS_TRACKER_TIMEOUT'] = 5  # Czas (s), po którym zapytanie DNS uznaje się za bez odpowiedzi
+app.config['BURST_WINDOW_MS'] = 1.0  # Długość przesuwnego okna wykrywania mikroburstów (ms)
+app.config['BURST_THRESHOLD_BPS'] = 100 * 1000 * 1000  # Próg przepływności w oknie (bit/s), powyżej którego ruch jest burstem
+app.config['BURST_CACHE_SIZE'] = 32  # Liczba wyników /api/bursts (analiza, okno, próg) trzymanych w pamięci
+app.config['JITTER_TRACKER_MAX_FLOWS'] = 100000  # Maks. liczba jednocześnie śledzonych przepływów przy pomiarze jittera
+app.config['JITTER_TRACKER_IDLE_TIMEOUT'] = 300  # Po ilu sekundach bezczynności przepływ jest zamykany
+app.config['TIMESERIES_MAX_POINTS'] = 2000  # Maks. liczba punktów zwracanych przez /api/timeseries
+app.config['TIMESERIES_CACHE_SIZE'] = 8  # Liczba piramid szeregów czasowych trzymanych w pamięci
+app.config['GRAPH_DEFAULT_TOP'] = 100  # Liczba najaktywniejszych węzłów pokazywanych w grafach
+app.config['GRAPH_MAX_GROUPS'] = 50  # Maks. liczba zwiniętych grup (podsieci / producentów) w grafie
+app.config['GRAPH_EXPAND_LIMIT'] = 50  # Maks. liczba węzłów dodawanych przy rozwinięciu węzła
+app.config['GRAPH_INDEX_CACHE_SIZE'] = 8  # Liczba indeksów grafów trzymanych w pamięci
+app.config['GRAPH_REDUCTION_CACHE_SIZE'] = 4  # Liczba zredukowanych wariantów (top, grupowanie) pamiętanych dla jednego grafu
+app.config['DISSECTION_CACHE_SIZE'] = 256  # Liczba ostatnio rozłożonych pakietów trzymanych w pamięci
+app.config['GEOIP_DATABASE'] = os.environ.get('GEOIP_DATABASE')  # Lokalna baza GeoIP (.mmdb lub .csv z zakresami), brak = bez mapy
+app.config['GEOIP_MAP_LIMIT'] = 1000  # Maks. liczba adresów IP pokazywanych na mapie (najaktywniejsze)
+app.config['PACKET_COLUMNS_CACHE_SIZE'] = 4  # Liczba analiz, których kolumny pakietów są trzymane w pamięci
+app.config['ROLLUP_CACHE_SIZE'] = 8  # Liczba kostek agregatów trzymanych w pamięci
+app.config['TRAFFIC_MATRIX_CACHE_SIZE'] = 4  # Liczba macierzy ruchu (źródło × cel) trzymanych w pamięci
+app.config['TRAFFIC_MATRIX_HEATMAP_SIZE'] = 30  # Maks. liczba wierszy/kolumn mapy cieplnej (więcej hostów - agregacja do podsieci)
+app.config['FILTER_CACHE_MAX_BYTES'] = 64 * 1024 * 1024  # Pamięć na zapamiętane wyniki filtrów (indeksy pakietów)
+app.config['WORKER_PROCESSES'] = min(4, os.cpu_count() or 1)  # Procesy robocze dla ciężkich zadań (0 = wątek serwera)
+app.config['JOB_LIMITS'] = {  # Maks. liczba jednocześnie wykonywanych zadań danego rodzaju
+    'stats': 2,
+    'report': 2,
+    'filtered_report': 2,
+    'csv': 2,
+    'filtered_csv': 2,
+    'filtered_pcap': 2,
+    'columns': 2,
+    'bursts': 2
+}
+app.config['JOB_QUEUE_LIMIT'] = 8  # Maks. liczba zadań danego rodzaju czekających w kolejce
+app.config['JOB_HISTORY'] = 200  # Liczba zakończonych zadań pamiętanych przez /api/jobs
 
 # Dozwolone rozszerzenia plików
 ALLOWED_EXTENSIONS = {'pcap', 'pcapng', 'cap'}
@@ -40,6 +84,84 @@ ALLOWED_EXTENSIONS = {'pcap', 'pcapng', 'cap'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Warstwy scapy - ładowane przy pierwszym dekodowaniu pakietów (sam import scapy.all trwa ok. sekundy)
+rdpcap = IP = IPv6 = TCP = UDP = ARP = Ether = Dot1Q = DNS = dnsqtypes = None
+_scapy_loaded = False
+_scapy_lock = threading.Lock()
+
+def load_scapy():
+    """
+    Importuje scapy i udostępnia używane warstwy jako nazwy globalne modułu
+    
+    Flaga _scapy_loaded jest ustawiana dopiero po obu importach, a import odbywa się pod blokadą -
+    inne wątki nie zobaczą częściowo przypisanych nazw (np. rdpcap bez DNS).
+    """
+    global rdpcap, IP, IPv6, TCP, UDP, ARP, Ether, Dot1Q, DNS, dnsqtypes, _scapy_loaded
+    if _scapy_loaded:
+        return
+    with _scapy_lock:
+        if not _scapy_loaded:
+            from scapy.all import rdpcap, IP, IPv6, TCP, UDP, ARP, Ether, Dot1Q
+            from scapy.layers.dns import DNS, dnsqtypes
+            _scapy_loaded = True
+
+# Błędy odczytu niepełnego lub uszkodzonego pliku .npz - plik jest wtedy traktowany jak brakujący
+NPZ_READ_ERRORS = (ValueError, KeyError, OSError, EOFError, zipfile.BadZipFile, zlib.error)
+
+def write_file_atomic(path, write, mode='wb', **open_kwargs):
+    """
+    Zapisuje plik przez plik tymczasowy i os.replace
+    
+    Inne wątki i procesy robocze widzą stary albo kompletny nowy plik, nigdy zapisany
+    częściowo - także gdy ten sam plik zapisuje jednocześnie kilka procesów.
+    
+    Args:
+        path (str): Ścieżka pliku docelowego
+        write: Funkcja zapisująca zawartość do otwartego pliku
+        mode (str): Tryb otwarcia pliku tymczasowego
+    """
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with open(temp_path, mode, **open_kwargs) as f:
+            write(f)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+class LRUCache:
+    """
+    Pamięć podręczna ostatnio używanych wpisów (LRU) współdzielona przez wątki serwera
+    
+    Wszystkie operacje na słowniku są wykonywane pod blokadą - usunięcie najstarszego wpisu
+    przez jeden wątek nie przeszkadza innemu, który właśnie odczytuje ten wpis. Rozmiar
+    jest odczytywany z app.config przy każdym wstawieniu (create_app może go zmienić).
+    """
+    
+    def __init__(self, size_key):
+        self.size_key = size_key
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, default)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            return value
+    
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > app.config[self.size_key]:
+                self._entries.popitem(last=False)
+        return value
+    
+    def __len__(self):
+        return len(self._entries)
+
 # Funkcja do serializacji obiektów sieciowych (np. adresy IP)
 def json_serial(obj):
     if isinstance(obj, ipaddress.IPv4Address) or isinstance(obj, ipaddress.IPv6Address):
@@ -154,18 +276,417 @@ def get_mac_vendor(mac_address):
     
     return MAC_OUI_VENDORS.get(oui, "Unknown")
 
+# Format rekordu indeksu payload: offset (8 bajtów) + długość (4 bajty) dla każdego pakietu
+PAYLOAD_INDEX_FORMAT = '<QI'
+PAYLOAD_INDEX_RECORD_SIZE = struct.calcsize(PAYLOAD_INDEX_FORMAT)
+
+# Ścieżki plików z payloadem powiązanych z plikiem analizy JSON
+def payload_blob_path(json_filename):
+    base = os.path.splitext(json_filename)[0]
+    return os.path.join(app.config['JSON_FOLDER'], f"{base}.payload.bin")
+
+def payload_index_path(json_filename):
+    base = os.path.splitext(json_filename)[0]
+    return os.path.join(app.config['JSON_FOLDER'], f"{base}.payload.idx")
+
+# Funkcja tworząca ograniczony podgląd payload do zapisania w rekordzie pakietu
+def make_payload_preview(payload, limit):
+    preview = payload[:limit]
+    result = {
+        'payload_length': len(payload),
+        'payload_truncated': len(payload) > limit
+    }
+    
+    try:
+        result['payload_preview'] = preview.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # Przycięcie podglądu mogło rozciąć znak wielobajtowy na samym końcu
+        if result['payload_truncated'] and e.reason == 'unexpected end of data':
+            result['payload_preview'] = preview[:e.start].decode('utf-8', errors='replace')
+        else:
+            result['payload_preview_hex'] = preview.hex()
+    
+    return result
+
+# Nagłówki rozszerzeń IPv6 (numer next header -> nazwa)
+IPV6_EXTENSION_HEADERS = {
+    0: 'hop-by-hop', 43: 'routing', 44: 'fragment', 51: 'ah', 60: 'destination', 135: 'mobility'
+}
+
+# Funkcja do przejścia przez znaczniki VLAN (802.1Q, QinQ 802.1ad)
+def walk_link_layer(packet):
+    """
+    Zwraca identyfikatory VLAN (od zewnętrznego) oraz pierwszą warstwę za nagłówkami L2
+    
+    Args:
+        packet: Pakiet scapy
+    
+    Returns:
+        tuple: (lista VLAN ID, warstwa sieciowa scapy lub None dla ramek bez Ethernet)
+    """
+    if Ether not in packet:
+        return [], None
+    
+    vlan_tags = []
+    layer = packet[Ether].payload
+    # Dot1AD (QinQ) dziedziczy po Dot1Q
+    while isinstance(layer, Dot1Q):
+        vlan_tags.append(layer.vlan)
+        layer = layer.payload
+    return vlan_tags, layer
+
+# Funkcja do przejścia przez nagłówki rozszerzeń IPv6
+def walk_ipv6_extension_headers(ipv6):
+    """
+    Wyznacza protokół warstwy wyższej pakietu IPv6 za łańcuchem nagłówków rozszerzeń
+    
+    Args:
+        ipv6: Warstwa IPv6 scapy
+    
+    Returns:
+        tuple: (numer protokołu L4, długość nagłówka L3 razem z rozszerzeniami, lista nazw rozszerzeń)
+    """
+    next_header = ipv6.nh
+    if next_header not in IPV6_EXTENSION_HEADERS:
+        return next_header, 40, []
+    
+    # Odczyt z surowych bajtów - niezależnie od tego, czy scapy rozpoznał dany nagłówek
+    data = bytes(ipv6.payload)
+    offset = 0
+    extensions = []
+    while next_header in IPV6_EXTENSION_HEADERS and offset + 2 <= len(data):
+        extensions.append(IPV6_EXTENSION_HEADERS[next_header])
+        if next_header == 44:
+            size = 8
+        elif next_header == 51:
+            size = (data[offset + 1] + 2) * 4
+        else:
+            size = (data[offset + 1] + 1) * 8
+        next_header = data[offset]
+        offset += size
+    
+    return next_header, 40 + min(offset, len(data)), extensions
+
+# Funkcja do odczytu warstwy sieciowej (IPv4 / IPv6) w jednolitym formacie rekordu
+def get_network_layer(packet):
+    """Zwraca słownik 'ip' rekordu pakietu (IPv4 lub IPv6) albo None"""
+    if IP in packet:
+        ip = packet[IP]
+        return {
+            'version': 4,
+            'src': ip.src,
+            'dst': ip.dst,
+            'proto': ip.proto,
+            'ttl': ip.ttl
+        }
+    
+    if IPv6 in packet:
+        ipv6 = packet[IPv6]
+        next_header, _, extensions = walk_ipv6_extension_headers(ipv6)
+        network = {
+            'version': 6,
+            'src': ipv6.src,
+            'dst': ipv6.dst,
+            'proto': next_header,
+            'ttl': ipv6.hlim
+        }
+        if extensions:
+            network['ext_headers'] = extensions
+        return network
+    
+    return None
+
+# Funkcja do pomiaru rzeczywistych długości nagłówków pakietu
+def measure_header_lengths(packet):
+    """
+    Wyznacza rzeczywiste długości nagłówków warstw L2/L3/L4 oraz długość danych aplikacji
+    
+    Args:
+        packet: Pakiet scapy
+    
+    Returns:
+        tuple: ([L2, L3, L4], payload_len) - bajty; padding ramki (trailer) nie jest
+            wliczany ani do nagłówków, ani do payload
+    """
+    total = len(packet)
+    
+    if IP in packet:
+        ip = packet[IP]
+        l2 = total - len(ip)
+        l3 = ip.ihl * 4
+        # Długość z nagłówka IP - nie obejmuje paddingu Ethernet (0 przy TSO - wtedy długość ramki)
+        ip_len = min(ip.len, len(ip)) if ip.len else len(ip)
+        proto = ip.proto
+    elif IPv6 in packet:
+        ipv6 = packet[IPv6]
+        l2 = total - len(ipv6)
+        proto, l3, _ = walk_ipv6_extension_headers(ipv6)
+        # plen = 0 oznacza jumbogram - wtedy długość ramki
+        ip_len = min(40 + ipv6.plen, len(ipv6)) if ipv6.plen else len(ipv6)
+    elif ARP in packet:
+        arp = packet[ARP]
+        l2 = total - len(arp)
+        return [l2, len(arp) - len(arp.payload), 0], 0
+    else:
+        # Brak znanej warstwy sieciowej - nagłówek to tylko warstwa łącza (z VLAN)
+        _, layer = walk_link_layer(packet)
+        l2 = total - len(layer) if layer is not None else 0
+        return [l2, 0, 0], max(0, total - l2)
+    
+    if TCP in packet:
+        l4 = packet[TCP].dataofs * 4
+    elif UDP in packet or proto in (1, 58):
+        # UDP, ICMP i ICMPv6 - 8 bajtów nagłówka (typ, kod, suma kontrolna, pole zależne od typu)
+        l4 = 8
+    else:
+        l4 = 0
+    
+    payload_len = max(0, ip_len - l3 - l4)
+    return [l2, l3, l4], payload_len
+
+# Protokoły aplikacyjne - w rekordzie pakietu zapisywany jest tylko kod (indeks na liście)
+# jako 'app_proto'. Lista może być wyłącznie rozszerzana na końcu, aby kody zapisane
+# w istniejących analizach pozostały poprawne.
+APP_PROTOCOLS = [
+    'Unknown', 'TCP', 'UDP', 'ICMP', 'ARP', 'DNS', 'HTTP', 'HTTPS', 'TLS', 'QUIC',
+    'DHCP', 'NTP', 'SSH', 'Telnet', 'FTP', 'SMTP', 'POP3', 'IMAP', 'SNMP', 'mDNS',
+    'LLMNR', 'SSDP', 'NetBIOS', 'SMB', 'RDP', 'SIP', 'Syslog', 'TFTP', 'LDAP', 'MySQL',
+    'PostgreSQL', 'IGMP', 'GRE', 'ESP', 'OSPF', 'ICMPv6'
+]
+APP_PROTOCOL_CODES = {name: code for code, name in enumerate(APP_PROTOCOLS)}
+
+# Kolory protokołów używane przez grafy (widok, PDF)
+PROTOCOL_COLORS = {
+    'TCP': '#FF6B6B',
+    'UDP': '#4ECDC4',
+    'ICMP': '#45B7D1',
+    'ICMPv6': '#48DBFB',
+    'ARP': '#96CEB4',
+    'DNS': '#FECA57',
+    'HTTP': '#FF9FF3',
+    'HTTPS': '#54A0FF',
+    'TLS': '#5F27CD',
+    'QUIC': '#00D2D3',
+    'DHCP': '#FF9F43',
+    'SSH': '#10AC84',
+    'mDNS': '#F368E0',
+    'SSDP': '#C8D6E5',
+    'NTP': '#8395A7',
+    'Unknown': '#DDA0DD'
+}
+
+# Znane porty usług (port -> protokół aplikacyjny)
+TCP_SERVICE_PORTS = {
+    20: 'FTP', 21: 'FTP', 22: 'SSH', 23: 'Telnet', 25: 'SMTP', 53: 'DNS', 80: 'HTTP',
+    110: 'POP3', 139: 'NetBIOS', 143: 'IMAP', 389: 'LDAP', 443: 'HTTPS', 445: 'SMB',
+    465: 'SMTP', 587: 'SMTP', 636: 'LDAP', 993: 'IMAP', 995: 'POP3', 3306: 'MySQL',
+    3389: 'RDP', 5060: 'SIP', 5432: 'PostgreSQL', 8000: 'HTTP', 8080: 'HTTP', 8443: 'HTTPS'
+}
+UDP_SERVICE_PORTS = {
+    53: 'DNS', 67: 'DHCP', 68: 'DHCP', 69: 'TFTP', 123: 'NTP', 137: 'NetBIOS',
+    138: 'NetBIOS', 161: 'SNMP', 162: 'SNMP', 443: 'QUIC', 514: 'Syslog', 1900: 'SSDP',
+    5060: 'SIP', 5353: 'mDNS', 5355: 'LLMNR'
+}
+IP_PROTOCOL_SERVICES = {1: 'ICMP', 2: 'IGMP', 47: 'GRE', 50: 'ESP', 58: 'ICMPv6', 89: 'OSPF'}
+
+# Funkcja do budowy tablicy port -> kod protokołu (jeden odczyt zamiast przeszukiwania słownika)
+def build_port_table(services):
+    table = np.zeros(65536, dtype=np.uint8)
+    for port, name in services.items():
+        table[port] = APP_PROTOCOL_CODES[name]
+    return table
+
+TCP_PORT_TABLE = build_port_table(TCP_SERVICE_PORTS)
+UDP_PORT_TABLE = build_port_table(UDP_SERVICE_PORTS)
+
+HTTP_SIGNATURES = (b'GET ', b'POST ', b'PUT ', b'HEAD ', b'DELETE ', b'OPTIONS ',
+                   b'PATCH ', b'CONNECT ', b'HTTP/1.')
+
+def lookup_service_port(table, sport, dport):
+    """Zwraca kod usługi dla pary portów - port niższy (zwykle port serwera) ma pierwszeństwo"""
+    low, high = (sport, dport) if sport <= dport else (dport, sport)
+    return int(table[low]) or int(table[high])
+
+def looks_like_tls(payload):
+    """Nagłówek rekordu TLS: typ 20-23, wersja 3.x"""
+    return len(payload) >= 5 and 20 <= payload[0] <= 23 and payload[1] == 3 and payload[2] <= 4
+
+def looks_like_dns(payload):
+    """Nagłówek DNS z jednym pytaniem i poprawnie zakodowaną nazwą"""
+    if len(payload) < 17 or payload[4:6] != b'\x00\x01' or payload[3] & 0x40:
+        return False
+    offset = 12
+    while offset < len(payload):
+        label_length = payload[offset]
+        if label_length == 0:
+            return offset + 5 <= len(payload)
+        if label_length > 63:
+            return False
+        offset += label_length + 1
+    return False
+
+def classify_app_protocol(packet):
+    """
+    Klasyfikuje pakiet scapy do protokołu aplikacyjnego (sygnatury payload, następnie porty)
+    
+    Args:
+        packet: Pakiet scapy
+    
+    Returns:
+        int: Kod protokołu z listy APP_PROTOCOLS
+    """
+    if ARP in packet:
+        return APP_PROTOCOL_CODES['ARP']
+    
+    if TCP in packet:
+        tcp = packet[TCP]
+        payload = bytes(tcp.payload)
+        if payload.startswith(HTTP_SIGNATURES):
+            return APP_PROTOCOL_CODES['HTTP']
+        if looks_like_tls(payload):
+            https = tcp.sport in (443, 8443) or tcp.dport in (443, 8443)
+            return APP_PROTOCOL_CODES['HTTPS' if https else 'TLS']
+        return lookup_service_port(TCP_PORT_TABLE, tcp.sport, tcp.dport) or APP_PROTOCOL_CODES['TCP']
+    
+    if UDP in packet:
+        udp = packet[UDP]
+        code = lookup_service_port(UDP_PORT_TABLE, udp.sport, udp.dport)
+        if code:
+            return code
+        if looks_like_dns(bytes(udp.payload)):
+            return APP_PROTOCOL_CODES['DNS']
+        return APP_PROTOCOL_CODES['UDP']
+    
+    if IP in packet:
+        proto = packet[IP].proto
+    elif IPv6 in packet:
+        proto, _, _ = walk_ipv6_extension_headers(packet[IPv6])
+    else:
+        return APP_PROTOCOL_CODES['Unknown']
+    
+    service = IP_PROTOCOL_SERVICES.get(proto)
+    return APP_PROTOCOL_CODES[service] if service else APP_PROTOCOL_CODES['Unknown']
+
+def classify_record(packet):
+    """Klasyfikacja na podstawie zapisanego rekordu - dla analiz sprzed zapisu 'app_proto'"""
+    if 'arp' in packet:
+        return APP_PROTOCOL_CODES['ARP']
+    if 'tcp' in packet:
+        code = lookup_service_port(TCP_PORT_TABLE, packet['tcp']['sport'], packet['tcp']['dport'])
+        return code or APP_PROTOCOL_CODES['TCP']
+    if 'udp' in packet:
+        code = lookup_service_port(UDP_PORT_TABLE, packet['udp']['sport'], packet['udp']['dport'])
+        return code or APP_PROTOCOL_CODES['UDP']
+    if 'ip' in packet:
+        service = IP_PROTOCOL_SERVICES.get(packet['ip']['proto'])
+        if service:
+            return APP_PROTOCOL_CODES[service]
+    return APP_PROTOCOL_CODES['Unknown']
+
+def get_app_protocol_code(packet):
+    """Zwraca kod protokołu aplikacyjnego rekordu pakietu"""
+    code = packet.get('app_proto')
+    if code is None or not 0 <= code < len(APP_PROTOCOLS):
+        code = classify_record(packet)
+    return code
+
+def get_app_protocol(packet):
+    """Zwraca nazwę protokołu aplikacyjnego rekordu pakietu"""
+    return APP_PROTOCOLS[get_app_protocol_code(packet)]
+
+# Maksymalna liczba rekordów odpowiedzi DNS zapisywanych w rekordzie pakietu
+DNS_MAX_ANSWERS = 8
+
+# Nazwy kodów odpowiedzi DNS (RFC 1035 / 2136)
+DNS_RCODES = {0: 'NOERROR', 1: 'FORMERR', 2: 'SERVFAIL', 3: 'NXDOMAIN', 4: 'NOTIMP', 5: 'REFUSED'}
+
+def normalize_dns_name(name):
+    """Zamienia nazwę DNS (bytes/str) na małe litery bez kropki końcowej"""
+    if isinstance(name, bytes):
+        name = name.decode('utf-8', errors='replace')
+    return str(name).rstrip('.').lower()
+
+# Funkcja do dekodowania wiadomości DNS podczas ingestu
+def decode_dns(packet):
+    """
+    Wyciąga z pakietu scapy najważniejsze pola wiadomości DNS
+    
+    Args:
+        packet: Pakiet scapy
+    
+    Returns:
+        dict: Rekord 'dns' (id, qr, rcode, qname, qtype, answers) lub None
+    """
+    if DNS not in packet:
+        return None
+    
+    try:
+        dns = packet[DNS]
+        question = dns.qd[0] if dns.qdcount and dns.qd else None
+        record = {
+            'id': dns.id,
+            'qr': dns.qr,
+            'rcode': dns.rcode,
+            'qname': normalize_dns_name(question.qname) if question else '',
+            'qtype': dnsqtypes.get(question.qtype, str(question.qtype)) if question else '',
+            'ancount': dns.ancount
+        }
+        
+        if dns.qr and dns.an:
+            answers = []
+            for answer in dns.an[:DNS_MAX_ANSWERS]:
+                rdata = answer.rdata
+                if isinstance(rdata, bytes):
+                    rdata = normalize_dns_name(rdata)
+                answers.append({
+                    'name': normalize_dns_name(answer.rrname),
+                    'type': dnsqtypes.get(answer.type, str(answer.type)),
+                    'ttl': answer.ttl,
+                    'data': str(rdata)
+                })
+            record['answers'] = answers
+        
+        return record
+    except Exception:
+        # Uszkodzona wiadomość DNS - pakiet pozostaje zwykłym pakietem UDP/TCP
+        return None
+
 # Funkcja do przetwarzania pliku PCAP na JSON
-def pcap_to_json(pcap_file):
+def pcap_to_json(pcap_file, payload_blob=None):
+    """
+    Przetwarza plik PCAP na listę rekordów pakietów
+    
+    Args:
+        pcap_file (str): Ścieżka do pliku PCAP
+        payload_blob (str, optional): Nazwa pliku analizy JSON; jeśli podana, pełne payloady
+            są zapisywane raz do osobnego pliku binarnego, a rekord zawiera tylko podgląd
+            i referencję offset/długość
+    
+    Returns:
+        list: Lista słowników opisujących pakiety
+    """
+    load_scapy()
+    preview_limit = app.config['PAYLOAD_PREVIEW_BYTES']
+    blob_file = None
+    index_file = None
     try:
         packets = rdpcap(pcap_file)
         result = []
         
+        if payload_blob:
+            blob_file = open(payload_blob_path(payload_blob), 'wb')
+            index_file = open(payload_index_path(payload_blob), 'wb')
+        blob_offset = 0
+        
         for i, packet in enumerate(packets):
             packet_data = {
                 'packet_number': i + 1,
                 'time': str(datetime.datetime.fromtimestamp(float(packet.time))),
+                'timestamp': float(packet.time),
                 'length': len(packet),
             }
+            packet_data['hdr_len'], packet_data['payload_len'] = measure_header_lengths(packet)
+            packet_data['app_proto'] = classify_app_protocol(packet)
             
             # Analiza warstwy Ethernet
             if Ether in packet:
@@ -177,14 +698,24 @@ def pcap_to_json(pcap_file):
                     'dst_vendor': get_mac_vendor(packet[Ether].dst)
                 }
             
-            # Analiza warstwy IP
-            if IP in packet:
-                packet_data['ip'] = {
-                    'src': packet[IP].src,
-                    'dst': packet[IP].dst,
-                    'proto': packet[IP].proto,
-                    'ttl': packet[IP].ttl
+            # Znaczniki VLAN (802.1Q / QinQ) - od zewnętrznego
+            vlan_tags, _ = walk_link_layer(packet)
+            if vlan_tags:
+                packet_data['vlan'] = vlan_tags
+            
+            # Analiza warstwy sieciowej (IPv4 / IPv6)
+            network = get_network_layer(packet)
+            if network is None and ARP in packet:
+                packet_data['arp'] = {
+                    'op': packet[ARP].op,
+                    'psrc': packet[ARP].psrc,
+                    'pdst': packet[ARP].pdst,
+                    'hwsrc': packet[ARP].hwsrc,
+                    'hwdst': packet[ARP].hwdst
                 }
+            
+            if network is not None:
+                packet_data['ip'] = network
                 
                 # Analiza warstwy TCP
                 if TCP in packet:
@@ -193,7 +724,10 @@ def pcap_to_json(pcap_file):
                         'dport': packet[TCP].dport,
                         'flags': str(packet[TCP].flags),
                         'seq': packet[TCP].seq,
-                        'ack': packet[TCP].ack
+                        'ack': packet[TCP].ack,
+                        'window': packet[TCP].window,
+                        # Długość danych segmentu (bez paddingu Ethernet)
+                        'len': packet_data['payload_len']
                     }
                 
                 # Analiza warstwy UDP
@@ -204,15 +738,26 @@ def pcap_to_json(pcap_file):
                         'len': packet[UDP].len
                     }
             
-            # Dodanie ładunku (payload) jeśli istnieje
+            # Wiadomość DNS (również mDNS/LLMNR)
+            dns_record = decode_dns(packet)
+            if dns_record:
+                packet_data['dns'] = dns_record
+            
+            # Dodanie ładunku (payload) jeśli istnieje - w rekordzie tylko ograniczony podgląd
+            payload_offset, payload_length = 0, 0
             if hasattr(packet, 'load') and packet.load:
-                try:
-                    # Próba dekodowania ładunku jako UTF-8
-                    payload = packet.load.decode('utf-8', errors='replace')
-                    packet_data['payload'] = payload
-                except:
-                    # Jeśli nie można zdekodować, zapisz jako hex
-                    packet_data['payload_hex'] = packet.load.hex()
+                payload = bytes(packet.load)
+                packet_data.update(make_payload_preview(payload, preview_limit))
+                
+                # Pełny payload zapisywany raz do pliku binarnego
+                if blob_file:
+                    blob_file.write(payload)
+                    payload_offset, payload_length = blob_offset, len(payload)
+                    packet_data['payload_ref'] = {'offset': payload_offset, 'length': payload_length}
+                    blob_offset += payload_length
+            
+            if index_file:
+                index_file.write(struct.pack(PAYLOAD_INDEX_FORMAT, payload_offset, payload_length))
             
             result.append(packet_data)
         
@@ -220,9 +765,28 @@ def pcap_to_json(pcap_file):
     except Exception as e:
         print(f"Błąd podczas przetwarzania pliku PCAP: {e}")
         return {'error': str(e)}
+    finally:
+        if blob_file:
+            blob_file.close()
+        if index_file:
+            index_file.close()
+
+# Funkcja odczytująca referencję payload pakietu z indeksu (bez wczytywania pliku JSON)
+def read_payload_ref(json_filename, packet_number):
+    index_path = payload_index_path(json_filename)
+    if packet_number < 1 or not os.path.exists(index_path):
+        return None
+    
+    with open(index_path, 'rb') as f:
+        f.seek((packet_number - 1) * PAYLOAD_INDEX_RECORD_SIZE)
+        record = f.read(PAYLOAD_INDEX_RECORD_SIZE)
+    
+    if len(record) < PAYLOAD_INDEX_RECORD_SIZE:
+        return None
+    return struct.unpack(PAYLOAD_INDEX_FORMAT, record)
 
 # Funkcja do generowania rozszerzonych statystyk
-def generate_extended_stats(data):
+def generate_extended_stats(data, columns=None):
     stats = {
         'total_packets': len(data),
         'protocols': {},
@@ -247,7 +811,11 @@ def generate_extended_stats(data):
         'edges': []
     }
     
-    # Obsługa geolokalizacji (bardzo podstawowa - można rozszerzyć)
+    # Indeksy węzłów i krawędzi grafów (id -> słownik), kolejność wstawiania zachowana
+    ip_nodes, ip_edges = {}, {}
+    mac_nodes, mac_edges = {}, {}
+    
+    # Geolokalizacja jest uzupełniana osobno (get_geo_data) - zależy od lokalnej bazy GeoIP
     geo_data = []
     
     # Znajdowanie zakresu czasowego wszystkich pakietów
@@ -322,86 +890,60 @@ def generate_extended_stats(data):
             stats['top_mac_vendors'][src_vendor] = stats['top_mac_vendors'].get(src_vendor, 0) + 1
             stats['top_mac_vendors'][dst_vendor] = stats['top_mac_vendors'].get(dst_vendor, 0) + 1
             
-            # Dodawanie komunikacji MAC do grafu
-            if src_mac not in [n.get('id') for n in mac_graph['nodes']]:
-                mac_graph['nodes'].append({
-                    'id': src_mac,
-                    'label': src_mac,
-                    'title': src_vendor,
-                    'value': stats['top_mac_addresses'][src_mac]
-                })
-            
-            if dst_mac not in [n.get('id') for n in mac_graph['nodes']]:
-                mac_graph['nodes'].append({
-                    'id': dst_mac,
-                    'label': dst_mac,
-                    'title': dst_vendor,
-                    'value': stats['top_mac_addresses'][dst_mac]
-                })
+            # Dodawanie komunikacji MAC do grafu (słowniki zamiast przeszukiwania list)
+            if src_mac not in mac_nodes:
+                mac_nodes[src_mac] = {'id': src_mac, 'label': src_mac, 'title': src_vendor, 'value': 0}
+            if dst_mac not in mac_nodes:
+                mac_nodes[dst_mac] = {'id': dst_mac, 'label': dst_mac, 'title': dst_vendor, 'value': 0}
             
             # Dodanie krawędzi z wartością
             edge_id = f"{src_mac}-{dst_mac}"
-            existing_edge = next((e for e in mac_graph['edges'] if e.get('id') == edge_id), None)
+            existing_edge = mac_edges.get(edge_id)
             
             if existing_edge:
                 existing_edge['value'] += 1
                 existing_edge['title'] = f"Pakiety: {existing_edge['value']}"
             else:
-                mac_graph['edges'].append({
+                mac_edges[edge_id] = {
                     'id': edge_id,
                     'from': src_mac,
                     'to': dst_mac,
                     'value': 1,
                     'title': 'Pakiety: 1'
-                })
+                }
         
-        if 'ip' in packet:
-            # Protokoły
-            if 'tcp' in packet:
-                stats['protocols']['TCP'] = stats['protocols'].get('TCP', 0) + 1
-            elif 'udp' in packet:
-                stats['protocols']['UDP'] = stats['protocols'].get('UDP', 0) + 1
-            else:
-                proto_num = packet['ip']['proto']
-                proto_name = f"Protokół {proto_num}"
-                stats['protocols'][proto_name] = stats['protocols'].get(proto_name, 0) + 1
+        endpoints = get_ip_endpoints(packet)
+        if endpoints:
+            # Protokoły (aplikacyjne - te same nazwy i kolory co w tabeli pakietów i grafach)
+            proto_name = get_protocol_name(packet)
+            stats['protocols'][proto_name] = stats['protocols'].get(proto_name, 0) + 1
             
-            # Adresy IP
-            src_ip = packet['ip']['src']
-            dst_ip = packet['ip']['dst']
+            # Adresy IP (IPv4, IPv6, adresy protokołowe ARP)
+            src_ip, dst_ip = endpoints
             stats['top_ips'][src_ip] = stats['top_ips'].get(src_ip, 0) + 1
             stats['top_ips'][dst_ip] = stats['top_ips'].get(dst_ip, 0) + 1
             
             # Network graph (dodawanie węzłów i krawędzi)
-            if src_ip not in [n.get('id') for n in network_graph['nodes']]:
-                network_graph['nodes'].append({
-                    'id': src_ip,
-                    'label': src_ip,
-                    'value': stats['top_ips'][src_ip]
-                })
-            
-            if dst_ip not in [n.get('id') for n in network_graph['nodes']]:
-                network_graph['nodes'].append({
-                    'id': dst_ip,
-                    'label': dst_ip,
-                    'value': stats['top_ips'][dst_ip]
-                })
+            if src_ip not in ip_nodes:
+                ip_nodes[src_ip] = {'id': src_ip, 'label': src_ip, 'value': 0}
+            if dst_ip not in ip_nodes:
+                ip_nodes[dst_ip] = {'id': dst_ip, 'label': dst_ip, 'value': 0}
             
             # Dodanie krawędzi z wartością
             edge_id = f"{src_ip}-{dst_ip}"
-            existing_edge = next((e for e in network_graph['edges'] if e.get('id') == edge_id), None)
+            existing_edge = ip_edges.get(edge_id)
             
             if existing_edge:
                 existing_edge['value'] += 1
                 existing_edge['title'] = f"Pakiety: {existing_edge['value']}"
             else:
-                network_graph['edges'].append({
+                ip_edges[edge_id] = {
                     'id': edge_id,
                     'from': src_ip,
                     'to': dst_ip,
                     'value': 1,
                     'title': 'Pakiety: 1'
-                })
+                }
             
             # Porty
             if 'tcp' in packet:
@@ -424,8 +966,9 @@ def generate_extended_stats(data):
     
     # Histogram wielkości pakietów
     if stats['packet_sizes']:
-        # Tworzenie przedziałów dla wielkości pakietów
-        bins = [0, 64, 128, 256, 512, 1024, 1500, max(stats['packet_sizes']) + 1]
+        # Tworzenie przedziałów dla wielkości pakietów - granice zgodne z etykietami, ostatnia
+        # granica zawsze większa od poprzedniej (także gdy wszystkie pakiety są mniejsze niż 1500 B)
+        bins = [0, 65, 129, 257, 513, 1025, 1501, max(max(stats['packet_sizes']) + 1, 1502)]
         labels = ['0-64', '65-128', '129-256', '257-512', '513-1024', '1025-1500', '1500+']
         
         # Liczenie histogramu
@@ -441,6 +984,16 @@ def generate_extended_stats(data):
             'values': []
         }
     
+    # Węzły grafów - wartość to łączna liczba pakietów hosta
+    for node_id, node in mac_nodes.items():
+        node['value'] = stats['top_mac_addresses'][node_id]
+    for node_id, node in ip_nodes.items():
+        node['value'] = stats['top_ips'][node_id]
+    mac_graph['nodes'] = list(mac_nodes.values())
+    mac_graph['edges'] = list(mac_edges.values())
+    network_graph['nodes'] = list(ip_nodes.values())
+    network_graph['edges'] = list(ip_edges.values())
+    
     # Sortowanie statystyk
     stats['top_ips'] = dict(sorted(stats['top_ips'].items(), key=lambda x: x[1], reverse=True)[:10])
     stats['top_ports'] = dict(sorted(stats['top_ports'].items(), key=lambda x: x[1], reverse=True)[:10])
@@ -461,12 +1014,24 @@ def generate_extended_stats(data):
     # Dodanie danych do mac graph
     stats['mac_graph'] = mac_graph
     
-    # Dodanie danych geolokalizacyjnych (puste, do rozszerzenia)
+    # Dane geolokalizacyjne (uzupełniane przez get_analysis_stats)
     stats['geo_data'] = geo_data
     
-    network_metrics = calculate_network_metrics(data)
+    network_metrics = calculate_network_metrics(data, columns)
     stats.update(network_metrics)
     
+    # Rekonstrukcja sesji TCP (RTT, retransmisje, resety)
+    stats['tcp_analysis'] = analyze_tcp_sessions(data)
+    
+    # Analiza DNS (parowanie zapytań i odpowiedzi)
+    stats['dns_analysis'] = analyze_dns(data)
+    
+    # Mikrobursty i jitter przepływów (przesuwne okno na znacznikach czasu pakietów)
+    stats['burst_analysis'] = analyze_bursts(data)
+    
+    # Kwantyle rozkładów (szkice DDSketch - histogramy logarytmiczne dostępne przez /api/distribution)
+    stats['distributions'] = analyze_distributions(data)
+    
     # Ulepszone dane dla grafu MAC z protokołami
     enhanced_mac_graph = {
         'nodes': [],
@@ -480,18 +1045,7 @@ def generate_extended_stats(data):
         total_packets = sum(protocol_stats.values()) if protocol_stats else 0
         
         # Określ kolor na podstawie dominującego protokołu
-        color_map = {
-            'TCP': '#FF6B6B',
-            'UDP': '#4ECDC4', 
-            'ICMP': '#45B7D1',
-            'ARP': '#96CEB4',
-            'DNS': '#FECA57',
-            'HTTP': '#FF9FF3',
-            'HTTPS': '#54A0FF',
-            'Unknown': '#DDA0DD'
-        }
-        
-        node_color = color_map.get(dominant_protocol, '#DDA0DD')
+        node_color = PROTOCOL_COLORS.get(dominant_protocol, PROTOCOL_COLORS['Unknown'])
         
         enhanced_mac_graph['nodes'].append({
             'id': mac,
@@ -504,23 +1058,17 @@ def generate_extended_stats(data):
         })
     
     # Dodaj krawędzie MAC (zachowaj istniejącą logikę)
+    enhanced_edges = {}
     for packet in data:
         if 'ethernet' in packet:
             src_mac = packet['ethernet']['src']
             dst_mac = packet['ethernet']['dst']
             
             edge_id = f"{src_mac}-{dst_mac}"
-            existing_edge = next((e for e in enhanced_mac_graph['edges'] if e.get('id') == edge_id), None)
+            existing_edge = enhanced_edges.get(edge_id)
             
             # Określ protokół dla krawędzi
-            if 'tcp' in packet:
-                edge_protocol = 'TCP'
-            elif 'udp' in packet:
-                edge_protocol = 'UDP'
-            elif 'ip' in packet:
-                edge_protocol = f"IP({packet['ip']['proto']})"
-            else:
-                edge_protocol = 'Other'
+            edge_protocol = get_protocol_name(packet)
             
             if existing_edge:
                 existing_edge['value'] += 1
@@ -530,14 +1078,15 @@ def generate_extended_stats(data):
                     existing_edge['protocols'] = set()
                 existing_edge['protocols'].add(edge_protocol)
             else:
-                enhanced_mac_graph['edges'].append({
+                enhanced_edges[edge_id] = {
                     'id': edge_id,
                     'from': src_mac,
                     'to': dst_mac,
                     'value': 1,
                     'title': f'Packets: 1\nProtocol: {edge_protocol}',
                     'protocols': {edge_protocol}
-                })
+                }
+    enhanced_mac_graph['edges'] = list(enhanced_edges.values())
     
     # Konwertuj sets na listy dla JSON
     for edge in enhanced_mac_graph['edges']:
@@ -549,8 +1098,12 @@ def generate_extended_stats(data):
     return stats
 
 # Funkcja generująca obrazy dla raportu PDF z poprawioną jakością
-def generate_chart_image(chart_type, data, title, width=800, height=400):
-    import numpy as np
+def generate_chart_image(chart_type, data, title, width=800, height=400, colors=None):
+    import matplotlib
+    matplotlib.use('Agg')  # Ustawienie backendu dla matplotlib bez GUI
+    import matplotlib.pyplot as plt
+    import networkx as nx
+    report_stage('charts', title)
     # Zwiększyłem DPI dla lepszej jakości wydruku
     plt.figure(figsize=(width/100, height/100), dpi=300)
     
@@ -558,7 +1111,11 @@ def generate_chart_image(chart_type, data, title, width=800, height=400):
         # Wykres kołowy (np. dla protokołów)
         labels = list(data.keys())
         values = list(data.values())
-        plt.pie(values, labels=labels, autopct='%1.1f%%', shadow=True, startangle=140)
+        if colors is not None:
+            # Brakujące kolory (None) z domyślnej palety matplotlib
+            palette = plt.rcParams['axes.prop_cycle'].by_key()['color']
+            colors = [color or palette[i % len(palette)] for i, color in enumerate(colors)]
+        plt.pie(values, labels=labels, colors=colors, autopct='%1.1f%%', shadow=True, startangle=140)
         plt.axis('equal')
     
     elif chart_type == 'bar':
@@ -621,16 +1178,7 @@ def generate_chart_image(chart_type, data, title, width=800, height=400):
                                        edgecolor='none', pad=1))
         
         # Dodaj legendę protokołów
-        protocol_colors = {
-            'TCP': '#FF6B6B',
-            'UDP': '#4ECDC4',
-            'ICMP': '#45B7D1',
-            'ARP': '#96CEB4',
-            'DNS': '#FECA57',
-            'HTTP': '#FF9FF3',
-            'HTTPS': '#54A0FF',
-            'Unknown': '#DDA0DD'
-        }
+        protocol_colors = PROTOCOL_COLORS
         
         # Tworzenie legendy
         legend_elements = []
@@ -697,6 +1245,16 @@ def generate_chart_image(chart_type, data, title, width=800, height=400):
         nx.draw_networkx_labels(G, pos, font_size=9, font_weight='bold',
                               bbox=dict(facecolor='white', alpha=0.7, edgecolor='none', pad=1))
     
+    elif chart_type == 'heatmap':
+        # Mapa cieplna macierzy ruchu (skala logarytmiczna - wartości różnią się o rzędy wielkości)
+        values = np.log10(np.asarray(data['values'], dtype=float) + 1)
+        plt.imshow(values, cmap='YlOrRd', aspect='auto', interpolation='nearest')
+        plt.colorbar(label=f"log10({data['metric']} + 1)")
+        plt.xticks(range(len(data['labels'])), data['labels'], rotation=90, fontsize=6)
+        plt.yticks(range(len(data['labels'])), data['labels'], fontsize=6)
+        plt.xlabel('Destination')
+        plt.ylabel('Source')
+    
     elif chart_type == 'mac_network':
         # Graf komunikacji między adresami MAC
         G = nx.DiGraph()
@@ -765,15 +1323,39 @@ def generate_chart_image(chart_type, data, title, width=800, height=400):
     
     return img_data
 
-def calculate_network_metrics(data):
-    """Oblicza zaawansowane wskaźniki sieciowe"""
+# Długości nagłówków przyjmowane dla starszych analiz (bez zapisanych rzeczywistych wartości)
+LEGACY_HEADER_LENGTHS = {'ethernet': 14, 'ip': 20, 'tcp': 20, 'udp': 8}
+
+def estimate_header_lengths(packet):
+    """Zwraca [L2, L3, L4] oraz długość payload - z rekordu lub szacunkowo dla starszych analiz"""
+    if 'hdr_len' in packet and 'payload_len' in packet:
+        return packet['hdr_len'], packet['payload_len']
+    
+    l2 = LEGACY_HEADER_LENGTHS['ethernet'] if 'ethernet' in packet else 0
+    l3 = LEGACY_HEADER_LENGTHS['ip'] if 'ip' in packet else 0
+    l4 = 0
+    if 'tcp' in packet:
+        l4 = LEGACY_HEADER_LENGTHS['tcp']
+    elif 'udp' in packet:
+        l4 = LEGACY_HEADER_LENGTHS['udp']
+    
+    hdr_len = [l2, l3, l4]
+    return hdr_len, max(0, packet.get('length', 0) - sum(hdr_len))
+
+def calculate_network_metrics(data, columns=None):
+    """
+    Oblicza zaawansowane wskaźniki sieciowe (agregacje wektorowe na kolumnach numpy)
+    
+    Długości nagłówków L2/L3/L4 i payloadu są brane z kolumn pakietów (l2_len, l3_len, l4_len,
+    payload_len), jeśli je podano - w przeciwnym razie odczytywane z rekordów.
+    """
     
     metrics = {
         'payload_stats': {
             'total_payload_bytes': 0,
             'avg_payload_per_packet': 0,
             'max_payload_size': 0,
-            'min_payload_size': float('inf'),
+            'min_payload_size': 0,
             'payload_distribution': {}
         },
         'throughput_stats': {
@@ -784,195 +1366,1058 @@ def calculate_network_metrics(data):
             'time_labels': []
         },
         'protocol_payload': {},  # Payload per protocol
+        'app_protocols': {},  # Liczba pakietów per protokół aplikacyjny
         'mac_protocol_stats': {},  # Protocol distribution per MAC
         'network_load': {
             'total_bytes': 0,
             'header_overhead': 0,
-            'payload_efficiency': 0
+            'payload_efficiency': 0,
+            'l2_overhead': 0,
+            'l3_overhead': 0,
+            'l4_overhead': 0,
+            'trailer_overhead': 0
         }
     }
     
-    # Organizacja danych czasowych
-    time_buckets = {}
-    all_times = []
+    # Pakiety bez poprawnego czasu są pomijane (jak wcześniej)
+    timestamps = [get_packet_timestamp(packet) for packet in data]
+    packets = [packet for packet, ts in zip(data, timestamps) if ts is not None]
+    if not packets:
+        return metrics
     
-    # Zbieranie danych podstawowych
-    for packet in data:
-        packet_time = None
-        try:
-            packet_time = datetime.datetime.fromisoformat(packet['time'])
-            all_times.append(packet_time)
-        except:
-            continue
-            
-        packet_length = packet.get('length', 0)
-        metrics['network_load']['total_bytes'] += packet_length
-        
-        # Obliczanie payload
-        payload_size = 0
-        header_size = packet_length
-        
-        # Szacowanie wielkości nagłówków i payload
-        if 'ethernet' in packet:
-            header_size = 14  # Ethernet header
-            
-        if 'ip' in packet:
-            header_size += 20  # IP header (minimum)
-            
-        if 'tcp' in packet:
-            header_size += 20  # TCP header (minimum)
-            protocol = 'TCP'
-        elif 'udp' in packet:
-            header_size += 8   # UDP header
-            protocol = 'UDP'
-        elif 'ip' in packet:
-            protocol = f"IP({packet['ip']['proto']})"
-        else:
-            protocol = 'Other'
-            
-        payload_size = max(0, packet_length - header_size)
-        
-        # Aktualizacja statystyk payload
-        metrics['payload_stats']['total_payload_bytes'] += payload_size
-        metrics['network_load']['header_overhead'] += header_size
-        
-        if payload_size > 0:
-            metrics['payload_stats']['max_payload_size'] = max(
-                metrics['payload_stats']['max_payload_size'], payload_size
-            )
-            metrics['payload_stats']['min_payload_size'] = min(
-                metrics['payload_stats']['min_payload_size'], payload_size
-            )
-            
-        # Payload per protocol
-        if protocol not in metrics['protocol_payload']:
-            metrics['protocol_payload'][protocol] = {'total': 0, 'packets': 0}
-        metrics['protocol_payload'][protocol]['total'] += payload_size
-        metrics['protocol_payload'][protocol]['packets'] += 1
-        
-        # MAC protocol stats
+    # Kolumny numeryczne
+    times = np.array([ts for ts in timestamps if ts is not None], dtype=np.float64)
+    lengths = np.fromiter((packet.get('length', 0) for packet in packets), dtype=np.int64, count=len(packets))
+    if columns is not None:
+        valid = np.fromiter((ts is not None for ts in timestamps), dtype=bool, count=len(data))
+        hdr_len = np.stack([columns['l2_len'], columns['l3_len'], columns['l4_len']], axis=1)[valid].astype(np.int64)
+        payload = columns['payload_len'][valid].astype(np.int64)
+    else:
+        header_columns = [estimate_header_lengths(packet) for packet in packets]
+        hdr_len = np.array([hdr for hdr, _ in header_columns], dtype=np.int64).reshape(-1, 3)
+        payload = np.fromiter((p for _, p in header_columns), dtype=np.int64, count=len(packets))
+    protocols = [get_protocol_name(packet) for packet in packets]
+    app_codes = np.fromiter((get_app_protocol_code(packet) for packet in packets), dtype=np.int64, count=len(packets))
+    
+    total_bytes = int(lengths.sum())
+    total_payload = int(payload.sum())
+    layer_totals = hdr_len.sum(axis=0)
+    
+    metrics['network_load']['total_bytes'] = total_bytes
+    metrics['network_load']['header_overhead'] = total_bytes - total_payload
+    metrics['network_load']['l2_overhead'] = int(layer_totals[0])
+    metrics['network_load']['l3_overhead'] = int(layer_totals[1])
+    metrics['network_load']['l4_overhead'] = int(layer_totals[2])
+    metrics['network_load']['trailer_overhead'] = max(0, total_bytes - total_payload - int(layer_totals.sum()))
+    if total_bytes > 0:
+        metrics['network_load']['payload_efficiency'] = total_payload / total_bytes * 100
+    
+    # Statystyki payload
+    metrics['payload_stats']['total_payload_bytes'] = total_payload
+    metrics['payload_stats']['avg_payload_per_packet'] = total_payload / len(data)
+    nonzero_payload = payload[payload > 0]
+    if nonzero_payload.size:
+        metrics['payload_stats']['max_payload_size'] = int(nonzero_payload.max())
+        metrics['payload_stats']['min_payload_size'] = int(nonzero_payload.min())
+    
+    # Payload per protocol (grupowanie przez bincount)
+    protocol_names, protocol_index = np.unique(np.array(protocols), return_inverse=True)
+    protocol_totals = np.bincount(protocol_index, weights=payload, minlength=len(protocol_names))
+    protocol_counts = np.bincount(protocol_index, minlength=len(protocol_names))
+    for i, protocol in enumerate(protocol_names):
+        metrics['protocol_payload'][str(protocol)] = {
+            'total': int(protocol_totals[i]),
+            'packets': int(protocol_counts[i])
+        }
+    
+    # Rozkład protokołów aplikacyjnych (kody z ingestu)
+    app_counts = np.bincount(app_codes, minlength=len(APP_PROTOCOLS))
+    metrics['app_protocols'] = {
+        APP_PROTOCOLS[code]: int(app_counts[code])
+        for code in np.argsort(-app_counts, kind='stable') if app_counts[code]
+    }
+    
+    # MAC protocol stats (według protokołu aplikacyjnego)
+    for packet, code in zip(packets, app_codes):
         if 'ethernet' in packet:
-            src_mac = packet['ethernet']['src']
-            dst_mac = packet['ethernet']['dst']
-            
-            for mac in [src_mac, dst_mac]:
-                if mac not in metrics['mac_protocol_stats']:
-                    metrics['mac_protocol_stats'][mac] = {}
-                if protocol not in metrics['mac_protocol_stats'][mac]:
-                    metrics['mac_protocol_stats'][mac][protocol] = 0
-                metrics['mac_protocol_stats'][mac][protocol] += 1
-                
-        # Grupowanie w buckety czasowe dla throughput
-        if packet_time:
-            time_key = packet_time.strftime('%Y-%m-%d %H:%M:%S')
-            if time_key not in time_buckets:
-                time_buckets[time_key] = {'packets': 0, 'bytes': 0}
-            time_buckets[time_key]['packets'] += 1
-            time_buckets[time_key]['bytes'] += packet_length
-    
-    # Finalizacja obliczeń
-    total_packets = len(data)
-    if total_packets > 0:
-        metrics['payload_stats']['avg_payload_per_packet'] = (
-            metrics['payload_stats']['total_payload_bytes'] / total_packets
-        )
-        
-    if metrics['payload_stats']['min_payload_size'] == float('inf'):
-        metrics['payload_stats']['min_payload_size'] = 0
-        
-    # Efektywność payload
-    if metrics['network_load']['total_bytes'] > 0:
-        metrics['network_load']['payload_efficiency'] = (
-            metrics['payload_stats']['total_payload_bytes'] / 
-            metrics['network_load']['total_bytes'] * 100
-        )
+            protocol = APP_PROTOCOLS[code]
+            for mac in (packet['ethernet']['src'], packet['ethernet']['dst']):
+                mac_stats = metrics['mac_protocol_stats'].setdefault(mac, {})
+                mac_stats[protocol] = mac_stats.get(protocol, 0) + 1
     
-    # Przygotowanie danych throughput
-    if all_times and len(all_times) > 1:
-        min_time = min(all_times)
-        max_time = max(all_times)
-        duration = (max_time - min_time).total_seconds()
-        
-        if duration > 0:
-            # Średni throughput
-            metrics['throughput_stats']['avg_throughput'] = (
-                metrics['network_load']['total_bytes'] / duration
-            )
+    # Przygotowanie danych throughput - równomierne buckety czasowe
+    min_time = times.min()
+    duration = float(times.max() - min_time)
+    
+    if len(times) > 1 and duration > 0:
+        # Średni throughput
+        metrics['throughput_stats']['avg_throughput'] = total_bytes / duration
+        
+        # Max 60 punktów, nie więcej niż liczba różnych sekund w przechwyceniu
+        distinct_seconds = len(np.unique(np.floor(times)))
+        num_points = min(60, distinct_seconds)
+        if distinct_seconds > 1:
+            interval = duration / num_points
+            bucket_index = np.minimum(((times - min_time) / interval).astype(np.int64), num_points - 1)
+            bucket_bytes = np.bincount(bucket_index, weights=lengths, minlength=num_points)
+            bucket_packets = np.bincount(bucket_index, minlength=num_points)
             
-            # Utworzenie równomiernie rozłożonych bucketów czasowych
-            num_points = min(60, len(time_buckets))  # Max 60 punktów
-            if len(time_buckets) > 1:
-                interval = duration / num_points
-                
-                for i in range(num_points):
-                    bucket_time = min_time + datetime.timedelta(seconds=i * interval)
-                    time_label = bucket_time.strftime('%H:%M:%S')
-                    
-                    # Znajdź pakiety w tym przedziale
-                    bucket_bytes = 0
-                    bucket_packets = 0
-                    
-                    start_time = bucket_time
-                    end_time = bucket_time + datetime.timedelta(seconds=interval)
-                    
-                    for packet_time in all_times:
-                        if start_time <= packet_time < end_time:
-                            # Znajdź odpowiadający pakiet
-                            for packet in data:
-                                try:
-                                    if datetime.datetime.fromisoformat(packet['time']) == packet_time:
-                                        bucket_bytes += packet.get('length', 0)
-                                        bucket_packets += 1
-                                        break
-                                except:
-                                    continue
-                    
-                    throughput = bucket_bytes / interval if interval > 0 else 0
-                    
-                    metrics['throughput_stats']['time_labels'].append(time_label)
-                    metrics['throughput_stats']['bytes_per_second'].append(throughput)
-                    metrics['throughput_stats']['packets_per_second'].append(
-                        bucket_packets / interval if interval > 0 else 0
-                    )
-                    
-                    metrics['throughput_stats']['peak_throughput'] = max(
-                        metrics['throughput_stats']['peak_throughput'], throughput
-                    )
+            bytes_per_second = bucket_bytes / interval
+            metrics['throughput_stats']['bytes_per_second'] = bytes_per_second.tolist()
+            metrics['throughput_stats']['packets_per_second'] = (bucket_packets / interval).tolist()
+            metrics['throughput_stats']['peak_throughput'] = float(bytes_per_second.max())
+            metrics['throughput_stats']['time_labels'] = [
+                datetime.datetime.fromtimestamp(min_time + i * interval).strftime('%H:%M:%S')
+                for i in range(num_points)
+            ]
     
     return metrics
 
-# Funkcja do generowania raportu PDF (bez interaktywnych linków)
-def generate_pdf_report(filename, data, stats, options):
-    # Utworzenie dokumentu PDF
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    # Wyciągnij podstawową nazwę pliku bez rozszerzenia
-    base_filename = os.path.splitext(os.path.basename(filename))[0]
-    # Utwórz nazwę raportu zgodnie z formatem: "raport_pcap_<data>_<godzina>.pdf"
-    report_filename = f"report_{base_filename}_{timestamp}.pdf"
-    report_path = os.path.join(app.config['UPLOAD_FOLDER'], report_filename)
+# Porównanie numerów sekwencyjnych TCP z uwzględnieniem przepełnienia (RFC 1982)
+def seq_after(a, b):
+    return ((a - b) & 0xFFFFFFFF) < 0x80000000 and a != b
+
+def get_packet_timestamp(packet):
+    """Zwraca znacznik czasu pakietu w sekundach (dla starszych analiz - z pola 'time')"""
+    if 'timestamp' in packet:
+        return packet['timestamp']
+    try:
+        return datetime.datetime.fromisoformat(packet['time']).timestamp()
+    except (KeyError, ValueError, TypeError):
+        return None
+
+# Reservoir sampling - stała pamięć niezależnie od liczby próbek
+def add_reservoir_sample(samples, count, value, max_samples, rng):
+    """Dodaje wartość do próbki (count - liczba wszystkich dotychczasowych wartości, włącznie z tą)"""
+    if len(samples) < max_samples:
+        samples.append(value)
+    else:
+        slot = rng.randrange(count)
+        if slot < max_samples:
+            samples[slot] = value
+
+def summarize_latency_samples(samples, count, total):
+    """Podsumowanie opóźnień (sekundy) w milisekundach: średnia z sumy, percentyle z próbki"""
+    if not count:
+        return {'samples': 0, 'avg_ms': 0, 'min_ms': 0, 'median_ms': 0, 'p95_ms': 0, 'max_ms': 0}
+    values = np.array(samples) * 1000
+    return {
+        'samples': count,
+        'avg_ms': total / count * 1000,
+        'min_ms': float(values.min()),
+        'median_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'max_ms': float(values.max())
+    }
+
+class TCPSessionTracker:
+    """
+    Strumieniowa rekonstrukcja sesji TCP w jednym przebiegu po pakietach
     
-    # Tworzenie dokumentu
-    doc = SimpleDocTemplate(
-        report_path,
-        pagesize=A4,
-        rightMargin=72, leftMargin=72,
-        topMargin=72, bottomMargin=72
-    )
+    Stan każdego przepływu jest ograniczony (max. max_outstanding niepotwierdzonych segmentów
+    na kierunek), a przepływy nieaktywne dłużej niż idle_timeout lub ponad limit max_flows
+    są usuwane w kolejności LRU i doliczane do wyników zbiorczych.
+    """
     
-    # Style
-    styles = getSampleStyleSheet()
-    title_style = styles['Heading1']
-    subtitle_style = styles['Heading2']
-    normal_style = styles['Normal']
+    def __init__(self, max_flows=100000, idle_timeout=300.0, max_outstanding=64,
+                 max_samples=10000, top_flows=10):
+        self.max_flows = max_flows
+        self.idle_timeout = idle_timeout
+        self.max_outstanding = max_outstanding
+        self.max_samples = max_samples
+        self.top_flows_limit = top_flows
+        
+        self.flows = collections.OrderedDict()  # Kolejność LRU: najdawniej aktywne na początku
+        self.flows_total = 0
+        self.flows_evicted = 0
+        self.peak_active_flows = 0
+        self.totals = {'retransmissions': 0, 'out_of_order': 0, 'zero_window': 0, 'resets': 0}
+        
+        # Próbki RTT i czasu handshake (reservoir sampling - stała pamięć)
+        self.rtt_samples = []
+        self.rtt_count = 0
+        self.rtt_sum = 0.0
+        self.handshake_samples = []
+        self.handshake_count = 0
+        self.handshake_sum = 0.0
+        self._random = random.Random(42)
+        
+        self.top_flows = []  # Kopiec (min-heap) najbardziej problematycznych przepływów
+        self._flow_seq = 0
     
-    # Lista elementów do dodania do dokumentu
-    elements = []
+    def _add_sample(self, samples, count, value):
+        add_reservoir_sample(samples, count, value, self.max_samples, self._random)
     
-    # Tytuł
-    elements.append(Paragraph(f"Network Traffic Analysis Report", title_style))
-    elements.append(Paragraph(f"File: {filename}", subtitle_style))
-    elements.append(Paragraph(f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", normal_style))
-    elements.append(Spacer(1, 0.5*inch))
+    def _new_flow(self, key, ts):
+        self.flows_total += 1
+        return {
+            'key': key,
+            'first_seen': ts,
+            'last_seen': ts,
+            'packets': 0,
+            'bytes': 0,
+            'syn_time': None,
+            'synack_time': None,
+            'client_dir': None,
+            'handshake': None,
+            'next_seq': [None, None],
+            'outstanding': [collections.OrderedDict(), collections.OrderedDict()],
+            'rtt_sum': 0.0,
+            'rtt_count': 0,
+            'retransmissions': 0,
+            'out_of_order': 0,
+            'zero_window': 0,
+            'resets': 0
+        }
+    
+    def _close_flow(self, flow):
+        # Zapamiętanie przepływu w rankingu najbardziej problematycznych
+        score = (flow['retransmissions'] + flow['out_of_order'] + flow['resets'] + flow['zero_window'],
+                 flow['packets'])
+        self._flow_seq += 1
+        entry = (score, self._flow_seq, flow)
+        if len(self.top_flows) < self.top_flows_limit:
+            heapq.heappush(self.top_flows, entry)
+        elif entry[:2] > self.top_flows[0][:2]:
+            heapq.heapreplace(self.top_flows, entry)
+    
+    def _evict(self, now):
+        # Usuwanie przepływów nieaktywnych lub nadmiarowych (od najdawniej aktywnych)
+        while self.flows:
+            key, flow = next(iter(self.flows.items()))
+            if len(self.flows) > self.max_flows or now - flow['last_seen'] > self.idle_timeout:
+                self.flows.popitem(last=False)
+                self.flows_evicted += 1
+                self._close_flow(flow)
+            else:
+                break
+    
+    def process(self, packet):
+        """Przetwarza pojedynczy rekord pakietu (pakiety inne niż TCP są pomijane)"""
+        if 'tcp' not in packet or 'ip' not in packet:
+            return
+        
+        ts = get_packet_timestamp(packet)
+        if ts is None:
+            return
+        
+        tcp = packet['tcp']
+        src = (packet['ip']['src'], tcp['sport'])
+        dst = (packet['ip']['dst'], tcp['dport'])
+        key = (src, dst) if src <= dst else (dst, src)
+        direction = 0 if src == key[0] else 1
+        other = 1 - direction
+        
+        flow = self.flows.get(key)
+        if flow is None:
+            flow = self._new_flow(key, ts)
+            self.flows[key] = flow
+        else:
+            self.flows.move_to_end(key)
+        
+        flow['last_seen'] = ts
+        flow['packets'] += 1
+        flow['bytes'] += packet.get('length', 0)
+        
+        flags = tcp.get('flags', '')
+        seq = tcp.get('seq', 0)
+        ack = tcp.get('ack', 0)
+        
+        # Resety i zerowe okno odbiorcy
+        if 'R' in flags:
+            flow['resets'] += 1
+            self.totals['resets'] += 1
+        elif tcp.get('window') == 0:
+            flow['zero_window'] += 1
+            self.totals['zero_window'] += 1
+        
+        # Three-way handshake: SYN -> SYN/ACK -> ACK
+        if 'S' in flags and 'A' not in flags:
+            if flow['syn_time'] is None:
+                flow['syn_time'] = ts
+                flow['client_dir'] = direction
+        elif 'S' in flags and 'A' in flags:
+            if flow['syn_time'] is not None and flow['synack_time'] is None:
+                flow['synack_time'] = ts
+        elif ('A' in flags and flow['handshake'] is None and flow['synack_time'] is not None
+              and direction == flow['client_dir']):
+            flow['handshake'] = ts - flow['syn_time']
+            self.handshake_count += 1
+            self.handshake_sum += flow['handshake']
+            self._add_sample(self.handshake_samples, self.handshake_count, flow['handshake'])
+        
+        # Analiza numerów sekwencyjnych (SYN i FIN zajmują jeden numer)
+        seg_len = tcp.get('len', 0) + (1 if 'S' in flags else 0) + (1 if 'F' in flags else 0)
+        if seg_len > 0 and 'R' not in flags:
+            seq_end = (seq + seg_len) & 0xFFFFFFFF
+            expected = flow['next_seq'][direction]
+            
+            if expected is not None and not seq_after(seq_end, expected):
+                # Segment nie wnosi nowych danych - retransmisja (Karn: bez próbki RTT)
+                flow['retransmissions'] += 1
+                self.totals['retransmissions'] += 1
+                flow['outstanding'][direction].pop(seq_end, None)
+            else:
+                if expected is not None and seq_after(seq, expected):
+                    # Luka w numeracji - segment dotarł przed brakującymi danymi
+                    flow['out_of_order'] += 1
+                    self.totals['out_of_order'] += 1
+                flow['next_seq'][direction] = seq_end
+                
+                outstanding = flow['outstanding'][direction]
+                outstanding[seq_end] = ts
+                if len(outstanding) > self.max_outstanding:
+                    outstanding.popitem(last=False)
+        
+        # Próbka RTT: ACK potwierdzający najnowszy niepotwierdzony segment drugiej strony
+        if 'A' in flags:
+            outstanding = flow['outstanding'][other]
+            sent_ts = None
+            while outstanding:
+                seq_end, first_ts = next(iter(outstanding.items()))
+                if seq_after(seq_end, ack):
+                    break
+                outstanding.popitem(last=False)
+                sent_ts = first_ts
+            
+            if sent_ts is not None:
+                rtt = ts - sent_ts
+                flow['rtt_sum'] += rtt
+                flow['rtt_count'] += 1
+                self.rtt_count += 1
+                self.rtt_sum += rtt
+                self._add_sample(self.rtt_samples, self.rtt_count, rtt)
+        
+        self.peak_active_flows = max(self.peak_active_flows, len(self.flows))
+        self._evict(ts)
+    
+    @staticmethod
+    def _summary(samples, count, total):
+        return summarize_latency_samples(samples, count, total)
+    
+    def finalize(self):
+        """Zamyka aktywne przepływy i zwraca wyniki zbiorcze"""
+        while self.flows:
+            _, flow = self.flows.popitem(last=False)
+            self._close_flow(flow)
+        
+        top_flows = []
+        for _, _, flow in sorted(self.top_flows, key=lambda e: e[:2], reverse=True):
+            (ip_a, port_a), (ip_b, port_b) = flow['key']
+            top_flows.append({
+                'flow': f"{format_endpoint(ip_a, port_a)} ↔ {format_endpoint(ip_b, port_b)}",
+                'packets': flow['packets'],
+                'bytes': flow['bytes'],
+                'duration': flow['last_seen'] - flow['first_seen'],
+                'handshake_ms': flow['handshake'] * 1000 if flow['handshake'] is not None else None,
+                'rtt_avg_ms': flow['rtt_sum'] / flow['rtt_count'] * 1000 if flow['rtt_count'] else None,
+                'retransmissions': flow['retransmissions'],
+                'out_of_order': flow['out_of_order'],
+                'zero_window': flow['zero_window'],
+                'resets': flow['resets']
+            })
+        
+        return {
+            'flows_total': self.flows_total,
+            'flows_evicted': self.flows_evicted,
+            'peak_active_flows': self.peak_active_flows,
+            'handshake': self._summary(self.handshake_samples, self.handshake_count, self.handshake_sum),
+            'rtt': self._summary(self.rtt_samples, self.rtt_count, self.rtt_sum),
+            'retransmissions': self.totals['retransmissions'],
+            'out_of_order': self.totals['out_of_order'],
+            'zero_window': self.totals['zero_window'],
+            'resets': self.totals['resets'],
+            'top_flows': top_flows
+        }
+
+def analyze_tcp_sessions(data):
+    """Oblicza metryki sesji TCP (handshake, RTT, retransmisje itd.) w jednym przebiegu"""
+    tracker = TCPSessionTracker(
+        max_flows=app.config['TCP_TRACKER_MAX_FLOWS'],
+        idle_timeout=app.config['TCP_TRACKER_IDLE_TIMEOUT']
+    )
+    for packet in data:
+        tracker.process(packet)
+    return tracker.finalize()
+
+def format_precise_time(ts):
+    """Znacznik czasu z mikrosekundami (czas lokalny, jak pole 'time' rekordów)"""
+    return datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+class BurstJitterTracker:
+    """
+    Strumieniowe wykrywanie mikroburstów i pomiar jittera odstępów między pakietami
+    
+    Burst to nieprzerwany okres, w którym przepływność liczona w przesuwnym oknie
+    (window_ms, kończącym się na każdym pakiecie) przekracza threshold_bps. Okno zawiera
+    tylko pakiety z ostatnich window_ms, a ranking burstów i przepływów to kopce ograniczonej
+    wielkości. Jitter liczony jest jak w RFC 3550: J += (|D| - J) / 16, gdzie D to zmiana
+    odstępu między kolejnymi pakietami - osobno dla każdego przepływu (kierunku) i interfejsu
+    (VLAN albo ruch nieoznaczony). Przepływy nieaktywne lub ponad limit usuwane są w kolejności LRU.
+    """
+    
+    def __init__(self, window_ms=1.0, threshold_bps=100e6, max_flows=100000, idle_timeout=300.0,
+                 top_bursts=10, top_flows=10, min_flow_packets=10):
+        self.window = window_ms / 1000.0
+        self.threshold_bps = threshold_bps
+        self.max_flows = max_flows
+        self.idle_timeout = idle_timeout
+        self.top_bursts_limit = top_bursts
+        self.top_flows_limit = top_flows
+        self.min_flow_packets = min_flow_packets
+        
+        # Pakiety w bieżącym oknie: (czas, bajty)
+        self.window_packets = collections.deque()
+        self.window_bytes = 0
+        self.peak_bps = 0.0
+        self.peak_time = None
+        self.last_timestamp = None
+        self.burst = None
+        self.bursts_total = 0
+        self.burst_time = 0.0
+        self.top_bursts = []  # Kopiec (min-heap) burstów o największej przepływności
+        
+        self.interfaces = {}
+        self.flows = collections.OrderedDict()  # Kolejność LRU: najdawniej aktywne na początku
+        self.flows_total = 0
+        self.flows_evicted = 0
+        self.top_flows = []  # Kopiec (min-heap) przepływów o największym jitterze
+        self._seq = 0
+    
+    @staticmethod
+    def _new_series(ts):
+        return {'first_seen': ts, 'last_seen': ts, 'packets': 0, 'bytes': 0,
+                'last_gap': None, 'jitter': 0.0, 'gap_sum': 0.0, 'max_gap': 0.0}
+    
+    @staticmethod
+    def _update_series(series, ts, length):
+        if series['packets']:
+            gap = ts - series['last_seen']
+            if series['last_gap'] is not None:
+                series['jitter'] += (abs(gap - series['last_gap']) - series['jitter']) / 16
+            series['last_gap'] = gap
+            series['gap_sum'] += gap
+            series['max_gap'] = max(series['max_gap'], gap)
+        series['last_seen'] = ts
+        series['packets'] += 1
+        series['bytes'] += length
+    
+    @staticmethod
+    def _series_summary(series):
+        gaps = series['packets'] - 1
+        return {
+            'packets': series['packets'],
+            'bytes': series['bytes'],
+            'jitter_ms': series['jitter'] * 1000,
+            'mean_gap_ms': series['gap_sum'] / gaps * 1000 if gaps else 0,
+            'max_gap_ms': series['max_gap'] * 1000
+        }
+    
+    def _push_top(self, heap, limit, score, item):
+        self._seq += 1
+        entry = (score, self._seq, item)
+        if len(heap) < limit:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+    
+    def _close_flow(self, flow):
+        if flow['packets'] >= self.min_flow_packets:
+            self._push_top(self.top_flows, self.top_flows_limit, flow['jitter'], flow)
+    
+    def _evict(self, now):
+        while self.flows:
+            _, flow = next(iter(self.flows.items()))
+            if len(self.flows) > self.max_flows or now - flow['last_seen'] > self.idle_timeout:
+                self.flows.popitem(last=False)
+                self.flows_evicted += 1
+                self._close_flow(flow)
+            else:
+                break
+    
+    def _close_burst(self):
+        burst = self.burst
+        self.burst = None
+        self.bursts_total += 1
+        self.burst_time += burst['end'] - burst['start']
+        self._push_top(self.top_bursts, self.top_bursts_limit, burst['peak_bps'], burst)
+    
+    def process(self, packet):
+        ts = get_packet_timestamp(packet)
+        if ts is None:
+            return
+        # Pakiety zapisane nie w kolejności czasu traktowane jak równoczesne z poprzednim
+        if self.last_timestamp is not None and ts < self.last_timestamp:
+            ts = self.last_timestamp
+        self.last_timestamp = ts
+        length = packet.get('length', 0)
+        
+        # Przesuwne okno (ts - window, ts]
+        self.window_packets.append((ts, length))
+        self.window_bytes += length
+        while ts - self.window_packets[0][0] >= self.window:
+            self.window_bytes -= self.window_packets.popleft()[1]
+        
+        rate = self.window_bytes * 8 / self.window
+        if rate > self.peak_bps:
+            self.peak_bps = rate
+            self.peak_time = ts
+        
+        if rate > self.threshold_bps:
+            if self.burst is None:
+                self.burst = {'start': self.window_packets[0][0], 'end': ts, 'peak_bps': rate, 'peak_time': ts,
+                              'packets': len(self.window_packets), 'bytes': self.window_bytes}
+            else:
+                self.burst['end'] = ts
+                self.burst['packets'] += 1
+                self.burst['bytes'] += length
+                if rate > self.burst['peak_bps']:
+                    self.burst['peak_bps'] = rate
+                    self.burst['peak_time'] = ts
+        elif self.burst is not None:
+            self._close_burst()
+        
+        # Jitter interfejsu (VLAN) i przepływu
+        vlan = packet.get('vlan')
+        interface = f"VLAN {'/'.join(str(tag) for tag in vlan)}" if vlan else 'untagged'
+        series = self.interfaces.get(interface)
+        if series is None:
+            series = self.interfaces[interface] = self._new_series(ts)
+        self._update_series(series, ts, length)
+        
+        if 'ip' in packet:
+            ip = packet['ip']
+            transport = packet.get('tcp') or packet.get('udp') or {}
+            protocol = ('TCP' if 'tcp' in packet else 'UDP' if 'udp' in packet
+                        else IP_PROTOCOL_SERVICES.get(ip['proto'], f"IP({ip['proto']})"))
+            key = (protocol, ip['src'], transport.get('sport'), ip['dst'], transport.get('dport'))
+            flow = self.flows.get(key)
+            if flow is None:
+                self.flows_total += 1
+                flow = self.flows[key] = self._new_series(ts)
+                flow['key'] = key
+            else:
+                self.flows.move_to_end(key)
+            self._update_series(flow, ts, length)
+        
+        self._evict(ts)
+    
+    def finalize(self):
+        """Zamyka otwarty burst i aktywne przepływy, zwraca wyniki zbiorcze"""
+        if self.burst is not None:
+            self._close_burst()
+        while self.flows:
+            _, flow = self.flows.popitem(last=False)
+            self._close_flow(flow)
+        
+        top_bursts = []
+        for _, _, burst in sorted(self.top_bursts, key=lambda e: e[:2], reverse=True):
+            top_bursts.append({
+                'start': burst['start'],
+                'start_time': format_precise_time(burst['start']),
+                'peak_time': format_precise_time(burst['peak_time']),
+                'duration_ms': (burst['end'] - burst['start']) * 1000,
+                'peak_bps': burst['peak_bps'],
+                'packets': burst['packets'],
+                'bytes': burst['bytes']
+            })
+        
+        top_flows = []
+        for _, _, flow in sorted(self.top_flows, key=lambda e: e[:2], reverse=True):
+            protocol, src, sport, dst, dport = flow['key']
+            name = f"{format_endpoint(src, sport)} → {format_endpoint(dst, dport)}" if sport is not None else f"{src} → {dst}"
+            top_flows.append({'flow': name, 'protocol': protocol, **self._series_summary(flow)})
+        
+        return {
+            'window_ms': self.window * 1000,
+            'threshold_bps': self.threshold_bps,
+            'peak_bps': self.peak_bps,
+            'peak_time': format_precise_time(self.peak_time) if self.peak_time is not None else None,
+            'bursts_total': self.bursts_total,
+            'burst_time_ms': self.burst_time * 1000,
+            'top_bursts': top_bursts,
+            'interfaces': [{'interface': name, **self._series_summary(series)}
+                           for name, series in sorted(self.interfaces.items(), key=lambda item: item[1]['packets'], reverse=True)],
+            'flows_total': self.flows_total,
+            'flows_evicted': self.flows_evicted,
+            'top_flows': top_flows
+        }
+
+def analyze_bursts(data, window_ms=None, threshold_bps=None):
+    """Wykrywa mikrobursty i mierzy jitter przepływów w jednym przebiegu (domyślnie progi z konfiguracji)"""
+    tracker = BurstJitterTracker(
+        window_ms=window_ms or app.config['BURST_WINDOW_MS'],
+        threshold_bps=threshold_bps or app.config['BURST_THRESHOLD_BPS'],
+        max_flows=app.config['JITTER_TRACKER_MAX_FLOWS'],
+        idle_timeout=app.config['JITTER_TRACKER_IDLE_TIMEOUT']
+    )
+    for packet in data:
+        tracker.process(packet)
+    return tracker.finalize()
+
+class DNSTransactionTracker:
+    """
+    Strumieniowe parowanie zapytań i odpowiedzi DNS po identyfikatorze transakcji
+    
+    Oczekujące zapytania są przechowywane w ograniczonej tablicy (max_pending) w kolejności
+    napływu; zapytania starsze niż timeout lub wypchnięte przez limit są liczone jako
+    pozostawione bez odpowiedzi.
+    """
+    
+    def __init__(self, max_pending=50000, timeout=5.0, max_samples=10000, top_domains=10):
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_samples = max_samples
+        self.top_domains_limit = top_domains
+        
+        # (klient IP, klient port, serwer IP, serwer port, id) -> (czas zapytania, nazwa)
+        self.pending = collections.OrderedDict()
+        self.totals = {
+            'queries': 0,
+            'responses': 0,
+            'matched': 0,
+            'unanswered': 0,
+            'unmatched_responses': 0,
+            'retransmitted_queries': 0
+        }
+        self.rcodes = collections.Counter()
+        self.qtypes = collections.Counter()
+        self.domains = collections.Counter()
+        self.nxdomains = collections.Counter()
+        self.resolvers = {}
+        
+        self.latency_samples = []
+        self.latency_count = 0
+        self.latency_sum = 0.0
+        self._random = random.Random(42)
+    
+    def _expire(self, now):
+        while self.pending:
+            ts, _ = next(iter(self.pending.values()))
+            if now - ts <= self.timeout:
+                break
+            self.pending.popitem(last=False)
+            self.totals['unanswered'] += 1
+    
+    def _resolver(self, ip):
+        resolver = self.resolvers.get(ip)
+        if resolver is None:
+            resolver = {'queries': 0, 'responses': 0, 'latency_sum': 0.0, 'latency_count': 0, 'nxdomain': 0}
+            self.resolvers[ip] = resolver
+        return resolver
+    
+    def process(self, packet):
+        """Przetwarza pojedynczy rekord pakietu (pomijane są pakiety bez DNS oraz mDNS/LLMNR)"""
+        dns = packet.get('dns')
+        if not dns or get_app_protocol(packet) != 'DNS':
+            return
+        
+        endpoints = get_ip_endpoints(packet)
+        ts = get_packet_timestamp(packet)
+        if endpoints is None or ts is None:
+            return
+        
+        transport = packet.get('udp') or packet.get('tcp')
+        src, dst = endpoints
+        self._expire(ts)
+        
+        if not dns['qr']:
+            self.totals['queries'] += 1
+            self.qtypes[dns['qtype']] += 1
+            if dns['qname']:
+                self.domains[dns['qname']] += 1
+            self._resolver(dst)['queries'] += 1
+            
+            key = (src, transport['sport'], dst, transport['dport'], dns['id'])
+            if key in self.pending:
+                # Ponowione zapytanie - opóźnienie liczone od pierwszego wysłania
+                self.totals['retransmitted_queries'] += 1
+                return
+            self.pending[key] = (ts, dns['qname'])
+            if len(self.pending) > self.max_pending:
+                self.pending.popitem(last=False)
+                self.totals['unanswered'] += 1
+            return
+        
+        self.totals['responses'] += 1
+        rcode = DNS_RCODES.get(dns['rcode'], str(dns['rcode']))
+        self.rcodes[rcode] += 1
+        resolver = self._resolver(src)
+        resolver['responses'] += 1
+        if rcode == 'NXDOMAIN':
+            resolver['nxdomain'] += 1
+            if dns['qname']:
+                self.nxdomains[dns['qname']] += 1
+        
+        query = self.pending.pop((dst, transport['dport'], src, transport['sport'], dns['id']), None)
+        if query is None:
+            self.totals['unmatched_responses'] += 1
+            return
+        
+        latency = max(0.0, ts - query[0])
+        self.totals['matched'] += 1
+        self.latency_count += 1
+        self.latency_sum += latency
+        add_reservoir_sample(self.latency_samples, self.latency_count, latency, self.max_samples, self._random)
+        resolver['latency_sum'] += latency
+        resolver['latency_count'] += 1
+    
+    def finalize(self):
+        """Zwraca wyniki zbiorcze (zapytania bez odpowiedzi na końcu przechwytywania są doliczane)"""
+        self.totals['unanswered'] += len(self.pending)
+        self.pending.clear()
+        
+        top_domains = [
+            {'domain': domain, 'queries': count, 'nxdomain': self.nxdomains.get(domain, 0)}
+            for domain, count in self.domains.most_common(self.top_domains_limit)
+        ]
+        top_nxdomains = [
+            {'domain': domain, 'responses': count}
+            for domain, count in self.nxdomains.most_common(self.top_domains_limit)
+        ]
+        resolvers = [
+            {
+                'resolver': ip,
+                'queries': resolver['queries'],
+                'responses': resolver['responses'],
+                'nxdomain': resolver['nxdomain'],
+                'avg_ms': resolver['latency_sum'] / resolver['latency_count'] * 1000 if resolver['latency_count'] else None
+            }
+            for ip, resolver in heapq.nlargest(
+                self.top_domains_limit, self.resolvers.items(),
+                key=lambda item: item[1]['queries'] + item[1]['responses'])
+        ]
+        
+        responses = self.totals['responses']
+        return dict(self.totals, **{
+            'nxdomain': self.rcodes.get('NXDOMAIN', 0),
+            'nxdomain_rate': self.rcodes.get('NXDOMAIN', 0) / responses * 100 if responses else 0,
+            'rcodes': dict(self.rcodes.most_common()),
+            'qtypes': dict(self.qtypes.most_common(self.top_domains_limit)),
+            'latency': summarize_latency_samples(self.latency_samples, self.latency_count, self.latency_sum),
+            'top_domains': top_domains,
+            'top_nxdomains': top_nxdomains,
+            'resolvers': resolvers
+        })
+
+def analyze_dns(data):
+    """Oblicza statystyki DNS (domeny, kody odpowiedzi, opóźnienia resolverów) w jednym przebiegu"""
+    tracker = DNSTransactionTracker(
+        max_pending=app.config['DNS_TRACKER_MAX_PENDING'],
+        timeout=app.config['DNS_TRACKER_TIMEOUT']
+    )
+    for packet in data:
+        tracker.process(packet)
+    return tracker.finalize()
+
+class QuantileSketch:
+    """
+    Szkic kwantyli DDSketch - względny błąd kwantyla nie większy niż relative_accuracy
+    
+    Wartości dodatnie trafiają do kubełków logarytmicznych (kubełek k obejmuje przedział
+    (gamma^(k-1), gamma^k]), wartości zerowe i ujemne do osobnego licznika. Pamięć jest stała:
+    po przekroczeniu max_bins najniższe kubełki są łączone. Szkice o tej samej dokładności
+    można scalać (merge), np. statystyki protokołów w statystykę całości.
+    """
+    
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+    
+    def add_many(self, values):
+        """Dodaje wartości (lista lub tablica numpy) jednym przebiegiem wektorowym"""
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        
+        self.count += len(values)
+        self.total += float(values.sum())
+        low, high = float(values.min()), float(values.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        
+        positive = values[values > 0]
+        self.zero_count += len(values) - len(positive)
+        if len(positive):
+            keys, counts = np.unique(np.ceil(np.log(positive) / self._log_gamma).astype(np.int64), return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                self.bins[key] = self.bins.get(key, 0) + count
+            self._collapse()
+    
+    def merge(self, other):
+        """Dodaje do szkicu zawartość innego szkicu o tej samej dokładności"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Cannot merge sketches with different relative accuracy')
+        if not other.count:
+            return
+        
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._collapse()
+    
+    def _collapse(self):
+        if len(self.bins) <= self.max_bins:
+            return
+        keys = sorted(self.bins)
+        excess = len(keys) - self.max_bins
+        self.bins[keys[excess]] += sum(self.bins.pop(key) for key in keys[:excess])
+    
+    def _bin_value(self, key):
+        # Środek kubełka w sensie względnym - błąd względny najwyżej relative_accuracy
+        return 2 * self.gamma ** key / (self.gamma + 1)
+    
+    def quantile(self, q):
+        """Zwraca przybliżony kwantyl q (0-1) lub None dla pustego szkicu"""
+        if not self.count:
+            return None
+        
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return min(self.min, 0.0)
+        
+        seen = self.zero_count
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                # Wynik nie wychodzi poza rzeczywisty zakres wartości
+                return min(max(self._bin_value(key), self.min), self.max)
+        return self.max
+    
+    def histogram(self, bins=20):
+        """
+        Histogram w skali logarytmicznej odtworzony ze szkicu
+        
+        Args:
+            bins (int): Liczba przedziałów między najmniejszą a największą wartością dodatnią
+        
+        Returns:
+            dict: Granice przedziałów (edges), liczności (counts) i liczba wartości zerowych
+        """
+        if not self.bins:
+            return {'edges': [], 'counts': [], 'zero_count': self.zero_count}
+        
+        keys = np.array(sorted(self.bins), dtype=np.int64)
+        counts = np.array([self.bins[key] for key in keys.tolist()], dtype=np.int64)
+        # Przy wartościach zerowych dolną granicą jest początek najniższego kubełka
+        low = self.min if self.min > 0 else self.gamma ** (int(keys[0]) - 1)
+        high = max(self.max, low * self.gamma)
+        edges = np.geomspace(low, high, bins + 1)
+        
+        positions = np.clip(np.searchsorted(edges, self._bin_value(keys), side='right') - 1, 0, bins - 1)
+        hist = np.bincount(positions, weights=counts, minlength=bins).astype(np.int64)
+        return {'edges': edges.tolist(), 'counts': hist.tolist(), 'zero_count': self.zero_count}
+    
+    def summary(self, quantiles, scale=1.0):
+        """Liczba wartości, min, max, średnia i wybrane kwantyle (pomnożone przez scale, np. s -> ms)"""
+        result = {'count': self.count}
+        if not self.count:
+            result.update({'min': 0, 'max': 0, 'avg': 0})
+            result.update({quantile_key(q): 0 for q in quantiles})
+            return result
+        
+        result.update({'min': self.min * scale, 'max': self.max * scale, 'avg': self.total / self.count * scale})
+        result.update({quantile_key(q): self.quantile(q) * scale for q in quantiles})
+        return result
+    
+    def to_dict(self):
+        keys = sorted(self.bins)
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'max_bins': self.max_bins,
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'keys': keys,
+            'counts': [self.bins[key] for key in keys]
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'], data['max_bins'])
+        sketch.bins = dict(zip(data['keys'], data['counts']))
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        sketch.total = data['total']
+        sketch.min = data['min']
+        sketch.max = data['max']
+        return sketch
+
+# Kwantyle raportowane dla rozkładów (p50, p95, p99, p99.9)
+DISTRIBUTION_QUANTILES = (0.5, 0.95, 0.99, 0.999)
+# Rozkłady: nazwa -> (opis, jednostka wyniku, mnożnik wartości zapisanych w szkicu)
+DISTRIBUTION_METRICS = {
+    'packet_size': ('Packet size', 'B', 1.0),
+    'payload_size': ('Payload size', 'B', 1.0),
+    'inter_arrival': ('Inter-arrival time', 'ms', 1000.0)
+}
+
+def quantile_key(q):
+    """Nazwa kwantyla w statystykach: 0.5 -> 'p50', 0.999 -> 'p99_9'"""
+    return 'p' + f"{q * 100:g}".replace('.', '_')
+
+class DistributionTracker:
+    """
+    Strumieniowe szkice kwantyli wielkości pakietów, wielkości danych aplikacji i odstępów
+    między pakietami - łącznie i osobno dla każdego protokołu
+    
+    Wartości są buforowane w krótkich listach i dodawane do szkiców porcjami (wektorowo),
+    więc pamięć nie zależy od liczby pakietów.
+    """
+    
+    def __init__(self, relative_accuracy=0.01, flush_size=4096):
+        self.relative_accuracy = relative_accuracy
+        self.flush_size = flush_size
+        self.sketches = {metric: {} for metric in DISTRIBUTION_METRICS}
+        self.overall_inter_arrival = QuantileSketch(relative_accuracy)
+        self.pending = collections.defaultdict(list)
+        self.last_seen = {}
+        self.last_timestamp = None
+    
+    @staticmethod
+    def _protocol(packet):
+        if 'tcp' in packet:
+            return 'TCP'
+        if 'udp' in packet:
+            return 'UDP'
+        if 'arp' in packet:
+            return 'ARP'
+        if 'ip' in packet:
+            return f"Protokół {packet['ip']['proto']}"
+        return 'Other'
+    
+    def _add(self, metric, protocol, value):
+        values = self.pending[(metric, protocol)]
+        values.append(value)
+        if len(values) >= self.flush_size:
+            self._flush(metric, protocol)
+    
+    def _flush(self, metric, protocol):
+        values = self.pending.pop((metric, protocol), None)
+        if not values:
+            return
+        if protocol is None:
+            self.overall_inter_arrival.add_many(values)
+            return
+        sketch = self.sketches[metric].get(protocol)
+        if sketch is None:
+            sketch = self.sketches[metric][protocol] = QuantileSketch(self.relative_accuracy)
+        sketch.add_many(values)
+    
+    def process(self, packet):
+        protocol = self._protocol(packet)
+        self._add('packet_size', protocol, packet.get('length', 0))
+        
+        payload = packet.get('payload_len', packet.get('payload_length'))
+        if payload is not None:
+            self._add('payload_size', protocol, payload)
+        
+        ts = get_packet_timestamp(packet)
+        if ts is None:
+            return
+        # Odstępy ujemne (pakiety nie w kolejności czasu) liczone jako zerowe
+        if self.last_timestamp is not None:
+            self._add('inter_arrival', None, max(ts - self.last_timestamp, 0.0))
+        if protocol in self.last_seen:
+            self._add('inter_arrival', protocol, max(ts - self.last_seen[protocol], 0.0))
+        self.last_timestamp = ts
+        self.last_seen[protocol] = ts
+    
+    def finalize(self):
+        for metric, protocol in list(self.pending):
+            self._flush(metric, protocol)
+        
+        result = {'quantiles': [quantile_key(q) for q in DISTRIBUTION_QUANTILES], 'metrics': {}, 'sketches': {}}
+        for metric, (label, unit, scale) in DISTRIBUTION_METRICS.items():
+            by_protocol = dict(sorted(self.sketches[metric].items(), key=lambda item: item[1].count, reverse=True))
+            if metric == 'inter_arrival':
+                overall = self.overall_inter_arrival
+            else:
+                # Rozkład całości to scalone szkice protokołów
+                overall = QuantileSketch(self.relative_accuracy)
+                for sketch in by_protocol.values():
+                    overall.merge(sketch)
+            
+            result['metrics'][metric] = {
+                'label': label,
+                'unit': unit,
+                'overall': overall.summary(DISTRIBUTION_QUANTILES, scale),
+                'by_protocol': {protocol: sketch.summary(DISTRIBUTION_QUANTILES, scale)
+                                for protocol, sketch in by_protocol.items()}
+            }
+            result['sketches'][metric] = {
+                'overall': overall.to_dict(),
+                'by_protocol': {protocol: sketch.to_dict() for protocol, sketch in by_protocol.items()}
+            }
+        return result
+
+def analyze_distributions(data):
+    """Oblicza kwantyle wielkości pakietów, danych aplikacji i odstępów między pakietami w jednym przebiegu"""
+    tracker = DistributionTracker()
+    for packet in data:
+        tracker.process(packet)
+    return tracker.finalize()
+
+def output_filename(prefix, json_filename, extension):
+    """
+    Unikalna nazwa pliku wynikowego (raportu, eksportu) w katalogu UPLOAD_FOLDER
+    
+    Zadania tego samego rodzaju mogą kończyć się w tej samej sekundzie, dlatego po dacie
+    i godzinie dodawany jest losowy sufiks - wyniki różnych zadań nie nadpisują się.
+    """
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    base_filename = os.path.splitext(os.path.basename(json_filename))[0]
+    return f"{prefix}_{base_filename}_{timestamp}_{uuid.uuid4().hex[:8]}.{extension}"
+
+# Funkcja do generowania raportu PDF (bez interaktywnych linków)
+def generate_pdf_report(filename, data, stats, options):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+    
+    # Utworzenie dokumentu PDF
+    # Nazwa raportu w formacie: "report_<analiza>_<data>_<godzina>_<sufiks>.pdf"
+    report_filename = output_filename('report', filename, 'pdf')
+    report_path = os.path.join(app.config['UPLOAD_FOLDER'], report_filename)
+    
+    # Tworzenie dokumentu
+    doc = SimpleDocTemplate(
+        report_path,
+        pagesize=A4,
+        rightMargin=72, leftMargin=72,
+        topMargin=72, bottomMargin=72
+    )
+    
+    # Style
+    styles = getSampleStyleSheet()
+    title_style = styles['Heading1']
+    subtitle_style = styles['Heading2']
+    normal_style = styles['Normal']
+    
+    # Lista elementów do dodania do dokumentu
+    elements = []
+    
+    # Tytuł
+    elements.append(Paragraph(f"Network Traffic Analysis Report", title_style))
+    elements.append(Paragraph(f"File: {filename}", subtitle_style))
+    elements.append(Paragraph(f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", normal_style))
+    elements.append(Spacer(1, 0.5*inch))
     
     # Spis treści
     elements.append(Paragraph("Table of Contents", subtitle_style))
@@ -998,6 +2443,10 @@ def generate_pdf_report(filename, data, stats, options):
         toc_items.append("Network Efficiency")
     if 'protocol_payload' in options and 'protocol_payload' in stats:
         toc_items.append("Protocol Payload Analysis")
+    if 'tcp_analysis' in options and 'tcp_analysis' in stats:
+        toc_items.append("TCP Session Analysis")
+    if 'dns_analysis' in options and 'dns_analysis' in stats:
+        toc_items.append("DNS Analysis")
     # Pozostałe istniejące opcje...
     if 'time' in options and 'time_distribution' in stats:
         toc_items.append("Time Distribution")
@@ -1005,6 +2454,8 @@ def generate_pdf_report(filename, data, stats, options):
         toc_items.append("Packet Size Distribution")
     if 'top_ips' in options and stats['top_ips']:
         toc_items.append("Most Common IP Addresses")
+    if 'traffic_matrix' in options and stats['top_ips']:
+        toc_items.append("Traffic Matrix")
     
     # Dodanie spisu treści jako zwykłego tekstu
     for title in toc_items:
@@ -1169,12 +2620,117 @@ def generate_pdf_report(filename, data, stats, options):
         elements.append(protocol_payload_table)
         elements.append(Spacer(1, 0.3*inch))
 
+    # Analiza sesji TCP
+    if 'tcp_analysis' in options and 'tcp_analysis' in stats:
+        tcp = stats['tcp_analysis']
+        elements.append(Paragraph("TCP Session Analysis", subtitle_style))
+        
+        tcp_details = [
+            ["Metric", "Value"],
+            ["TCP flows", f"{tcp['flows_total']:,}"],
+            ["Handshake latency (median / p95)", f"{tcp['handshake']['median_ms']:.2f} / {tcp['handshake']['p95_ms']:.2f} ms"],
+            ["RTT (median / p95)", f"{tcp['rtt']['median_ms']:.2f} / {tcp['rtt']['p95_ms']:.2f} ms"],
+            ["RTT samples", f"{tcp['rtt']['samples']:,}"],
+            ["Retransmissions", f"{tcp['retransmissions']:,}"],
+            ["Out-of-order segments", f"{tcp['out_of_order']:,}"],
+            ["Zero-window events", f"{tcp['zero_window']:,}"],
+            ["Resets", f"{tcp['resets']:,}"]
+        ]
+        
+        tcp_table = Table(tcp_details, colWidths=[220, 200])
+        tcp_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]))
+        elements.append(tcp_table)
+        elements.append(Spacer(1, 0.3*inch))
+        
+        # Przepływy z największą liczbą problemów
+        if tcp['top_flows']:
+            flows_data = [["Flow", "Packets", "RTT avg", "Retrans.", "OOO", "Zero win.", "RST"]]
+            for flow in tcp['top_flows']:
+                rtt_avg = f"{flow['rtt_avg_ms']:.2f} ms" if flow['rtt_avg_ms'] is not None else "-"
+                flows_data.append([
+                    flow['flow'], str(flow['packets']), rtt_avg, str(flow['retransmissions']),
+                    str(flow['out_of_order']), str(flow['zero_window']), str(flow['resets'])
+                ])
+            
+            flows_table = Table(flows_data, colWidths=[170, 45, 55, 45, 35, 45, 35])
+            flows_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, -1), 7),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ]))
+            elements.append(flows_table)
+            elements.append(Spacer(1, 0.3*inch))
+    
+    # Analiza DNS
+    if 'dns_analysis' in options and 'dns_analysis' in stats:
+        dns = stats['dns_analysis']
+        elements.append(Paragraph("DNS Analysis", subtitle_style))
+        
+        dns_details = [
+            ["Metric", "Value"],
+            ["Queries / responses", f"{dns['queries']:,} / {dns['responses']:,}"],
+            ["Matched transactions", f"{dns['matched']:,}"],
+            ["Unanswered queries", f"{dns['unanswered']:,}"],
+            ["Retransmitted queries", f"{dns['retransmitted_queries']:,}"],
+            ["NXDOMAIN rate", f"{dns['nxdomain_rate']:.1f}% ({dns['nxdomain']:,})"],
+            ["Resolver latency (median / p95)", f"{dns['latency']['median_ms']:.2f} / {dns['latency']['p95_ms']:.2f} ms"],
+            ["Resolver latency (max)", f"{dns['latency']['max_ms']:.2f} ms"]
+        ]
+        
+        dns_table = Table(dns_details, colWidths=[220, 200])
+        dns_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]))
+        elements.append(dns_table)
+        elements.append(Spacer(1, 0.3*inch))
+        
+        # Najczęściej odpytywane domeny
+        if dns['top_domains']:
+            domains_data = [["Domain", "Queries", "NXDOMAIN"]]
+            for domain in dns['top_domains']:
+                domains_data.append([domain['domain'][:60], str(domain['queries']), str(domain['nxdomain'])])
+            
+            domains_table = Table(domains_data, colWidths=[300, 60, 60])
+            domains_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, -1), 8),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ]))
+            elements.append(domains_table)
+            elements.append(Spacer(1, 0.3*inch))
     
     if 'protocols' in options and stats['protocols']:
         elements.append(Paragraph("Protocol Distribution", subtitle_style))
         
         # Generowanie wykresu protokołów z lepszą jakością
-        chart_img = generate_chart_image('pie', stats['protocols'], 'Protocol Distribution', width=600, height=450)
+        chart_img = generate_chart_image('pie', stats['protocols'], 'Protocol Distribution', width=600, height=450,
+                                         colors=[PROTOCOL_COLORS.get(protocol) for protocol in stats['protocols']])
         img = Image(chart_img, width=400, height=300)
         img.hAlign = 'CENTER'  # Wyśrodkowanie obrazu
         elements.append(img)
@@ -1234,6 +2790,31 @@ def generate_pdf_report(filename, data, stats, options):
         img.hAlign = 'CENTER'  # Wyśrodkowanie obrazu
         elements.append(img)
         elements.append(Spacer(1, 0.3*inch))
+        
+        # Kwantyle rozkładów - łącznie i dla protokołów
+        if stats.get('distributions'):
+            elements.append(Paragraph("Distribution Quantiles", subtitle_style))
+            quantile_names = stats['distributions']['quantiles']
+            quantile_data = [['Metric', 'Protocol', 'Count'] + [name.replace('_', '.') for name in quantile_names] + ['Max']]
+            for metric in stats['distributions']['metrics'].values():
+                rows = [('All', metric['overall'])] + list(metric['by_protocol'].items())[:5]
+                for protocol, summary in rows:
+                    quantile_data.append(
+                        [f"{metric['label']} ({metric['unit']})", protocol, summary['count']] +
+                        [f"{summary[name]:.2f}" for name in quantile_names] + [f"{summary['max']:.2f}"]
+                    )
+            
+            quantile_table = Table(quantile_data, repeatRows=1)
+            quantile_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, -1), 7),
+                ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+            ]))
+            elements.append(quantile_table)
+            elements.append(Spacer(1, 0.3*inch))
     
     # Najczęściej występujące adresy IP (jeśli wybrane)
     if 'top_ips' in options and stats['top_ips']:
@@ -1258,6 +2839,23 @@ def generate_pdf_report(filename, data, stats, options):
         elements.append(ip_table)
         elements.append(Spacer(1, 0.2*inch))
     
+    # Macierz ruchu źródło × cel (hosty lub podsieci)
+    if 'traffic_matrix' in options and stats['top_ips']:
+        heatmap = traffic_heatmap(filename, size=20)
+        if heatmap['shown_nodes']:
+            elements.append(Paragraph("Traffic Matrix", subtitle_style))
+            scope = 'subnets (/24, /64)' if heatmap['level'] == 'subnet' else 'hosts'
+            elements.append(Paragraph(
+                f"Bytes sent between the {heatmap['shown_nodes']} most active of {heatmap['total_nodes']} {scope} "
+                f"({heatmap['coverage'] * 100:.1f}% of IP traffic).", normal_style))
+            elements.append(Spacer(1, 0.1*inch))
+            
+            chart_img = generate_chart_image('heatmap', heatmap, 'Traffic Matrix', width=700, height=600)
+            img = Image(chart_img, width=450, height=390)
+            img.hAlign = 'CENTER'  # Wyśrodkowanie obrazu
+            elements.append(img)
+            elements.append(Spacer(1, 0.3*inch))
+    
     # Najczęściej występujące adresy MAC (jeśli wybrane)
     if 'mac_addresses' in options and stats['top_mac_addresses']:
         elements.append(Paragraph("Most Common MAC Addresses", subtitle_style))
@@ -1294,6 +2892,7 @@ def generate_pdf_report(filename, data, stats, options):
         canvas.restoreState()
     
     # Zbudowanie dokumentu ze stopką
+    track_layout_progress(doc)
     doc.build(elements, onFirstPage=add_page_number, onLaterPages=add_page_number)
     
     return report_filename
@@ -1310,10 +2909,14 @@ def generate_filtered_packets_report(filename, packets, filter_params):
     Returns:
         str: Nazwa wygenerowanego pliku raportu
     """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    
     # Utworzenie dokumentu PDF
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    base_filename = os.path.splitext(os.path.basename(filename))[0]
-    report_filename = f"filtered_packets_{base_filename}_{timestamp}.pdf"
+    report_filename = output_filename('filtered_packets', filename, 'pdf')
     report_path = os.path.join(app.config['UPLOAD_FOLDER'], report_filename)
     
     # Tworzenie dokumentu
@@ -1423,21 +3026,32 @@ def generate_filtered_packets_report(filename, packets, filter_params):
         canvas.restoreState()
     
     # Zbudowanie dokumentu ze stopką
+    track_layout_progress(doc)
     doc.build(elements, onFirstPage=add_page_number, onLaterPages=add_page_number)
     
     return report_filename
 
     # Funkcje pomocnicze do formatowania danych pakietów
 def get_protocol_name(packet):
-    """Zwraca nazwę protokołu pakietu"""
-    if 'tcp' in packet:
-        return "TCP"
-    elif 'udp' in packet:
-        return "UDP"
-    elif 'ip' in packet:
-        return f"IP({packet['ip']['proto']})"
-    else:
-        return "Other"
+    """Zwraca nazwę protokołu pakietu (protokół aplikacyjny, np. DNS, HTTPS, a bez rozpoznanej usługi - TCP/UDP)"""
+    return get_app_protocol(packet)
+
+def get_ip_endpoints(packet):
+    """Zwraca parę adresów (źródło, cel) z warstwy IPv4/IPv6 lub z ARP, albo None"""
+    if 'ip' in packet:
+        return packet['ip']['src'], packet['ip']['dst']
+    if 'arp' in packet:
+        return packet['arp']['psrc'], packet['arp']['pdst']
+    return None
+
+def format_endpoint(ip, port):
+    """Formatuje adres z portem (adresy IPv6 w nawiasach kwadratowych)"""
+    return f"[{ip}]:{port}" if ':' in ip else f"{ip}:{port}"
+
+# Filtr szablonów - nazwa protokołu aplikacyjnego rekordu pakietu
+@app.template_filter('app_protocol')
+def app_protocol_filter(packet):
+    return get_app_protocol(packet)
 
 def get_ports_str(packet):
     """Zwraca sformatowany ciąg portów (źródłowy -> docelowy)"""
@@ -1448,226 +3062,3659 @@ def get_ports_str(packet):
     else:
         return "-"
     
-# Strona główna
-@app.route('/')
-def index():
-    # Pobierz listę przetworzonych plików JSON
-    json_files = os.listdir(app.config['JSON_FOLDER'])
-    json_files = [f for f in json_files if f.endswith('.json')]
-    json_files.sort(reverse=True)  # Sortowanie od najnowszych
-    
-    return render_template('index.html', json_files=json_files)
+# Wersja formatu cache statystyk - zmiana wymusza ponowne obliczenie zapisanych statystyk
+STATS_CACHE_VERSION = 10
 
-# Formularz przesyłania pliku
-@app.route('/upload', methods=['POST'])
-def upload_file():
-    if 'file' not in request.files and 'file_path' not in request.form:
-        flash('Nie wybrano pliku ani nie podano ścieżki')
-        return redirect(request.url)
-    
-    # Obsługa przesłanego pliku
-    if 'file' in request.files and request.files['file'].filename:
-        file = request.files['file']
-        
-        if not allowed_file(file.filename):
-            flash('Nieprawidłowy format pliku. Dozwolone formaty: .pcap, .pcapng, .cap')
-            return redirect(url_for('index'))
+# Nazwy plików analiz (pliki pomocnicze jak *.stats.json nie pasują do wzorca)
+# (przyrostek _N odróżnia analizy zapisane w tej samej sekundzie)
+ANALYSIS_FILENAME_RE = re.compile(r'^pcap_analysis_\d{8}_\d{6}(?:_\d+)?\.json$')
+# Skompresowane dane analizy - nazwa analizy to nazwa bazowa z rozszerzeniem .json
+ANALYSIS_STORAGE_RE = re.compile(r'^(pcap_analysis_\d{8}_\d{6}(?:_\d+)?)\.ndjson\.gz$')
+
+# Katalog przeanalizowanych plików (SQLite) - metadane zapisywane w momencie analizy
+def get_catalog():
+    conn = sqlite3.connect(app.config['CATALOG_DB'])
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_catalog():
+    """Tworzy tabelę katalogu i jednorazowo dopisuje analizy zapisane przed jego wprowadzeniem"""
+    with get_catalog() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                json_filename TEXT PRIMARY KEY,
+                original_name TEXT,
+                sha256 TEXT,
+                packet_count INTEGER DEFAULT 0,
+                first_packet TEXT,
+                last_packet TEXT,
+                duration REAL DEFAULT 0,
+                byte_size INTEGER DEFAULT 0,
+                stats_cached INTEGER DEFAULT 0,
+                created_at TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_created ON analyses (created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_sha256 ON analyses (sha256)")
+        
+        # Ścieżka źródłowego pliku PCAP (kolumna dodana później - starsze katalogi są uzupełniane)
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(analyses)")}
+        if 'source_path' not in columns:
+            conn.execute("ALTER TABLE analyses ADD COLUMN source_path TEXT")
+        
+        # Wygenerowane raporty PDF - odcisk opcji pozwala ponownie użyć identycznego raportu
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS reports (
+                fingerprint TEXT PRIMARY KEY,
+                json_filename TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                options TEXT,
+                report_filename TEXT NOT NULL,
+                created_at TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_json ON reports (json_filename)")
         
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
+        known = {row['json_filename'] for row in conn.execute("SELECT json_filename FROM analyses")}
     
-    # Obsługa ścieżki do pliku
-    elif 'file_path' in request.form and request.form['file_path'].strip():
-        file_path = request.form['file_path'].strip()
+    # Analizy bez wpisu w katalogu (np. z poprzednich wersji aplikacji); zwykłe pliki JSON
+    # są przy okazji jednorazowo przepisywane do postaci skompresowanej
+    for stored_name in os.listdir(app.config['JSON_FOLDER']):
+        storage_match = ANALYSIS_STORAGE_RE.match(stored_name)
+        legacy = bool(ANALYSIS_FILENAME_RE.match(stored_name))
+        if not legacy and not storage_match:
+            continue
         
-        if not os.path.exists(file_path):
-            flash(f'Plik nie istnieje: {file_path}')
-            return redirect(url_for('index'))
+        json_filename = stored_name if legacy else f"{storage_match.group(1)}.json"
+        if not legacy and json_filename in known:
+            continue
         
-        if not allowed_file(file_path):
-            flash('Nieprawidłowy format pliku. Dozwolone formaty: .pcap, .pcapng, .cap')
-            return redirect(url_for('index'))
-    
-    else:
-        flash('Nie wybrano pliku ani nie podano ścieżki')
-        return redirect(url_for('index'))
+        try:
+            stored_path = os.path.join(app.config['JSON_FOLDER'], stored_name)
+            created_at = datetime.datetime.fromtimestamp(os.path.getmtime(stored_path))
+            data = load_analysis(json_filename)
+            if json_filename not in known:
+                register_analysis(json_filename, data, original_name=json_filename, created_at=created_at)
+                known.add(json_filename)
+            if legacy:
+                write_analysis(json_filename, data)
+                os.remove(stored_path)
+                # Nieskompresowany cache statystyk zostanie odtworzony przy pierwszym podglądzie
+                legacy_cache = stats_cache_path(json_filename)[:-len('.gz')]
+                if os.path.exists(legacy_cache):
+                    os.remove(legacy_cache)
+        except Exception as e:
+            print(f"Nie udało się dodać {json_filename} do katalogu: {e}")
+
+def register_analysis(json_filename, data, original_name, sha256=None, byte_size=0, created_at=None,
+                      source_path=None):
+    """
+    Zapisuje metadane analizy w katalogu
     
-    # Przetwarzanie pliku PCAP
+    Args:
+        json_filename (str): Nazwa pliku analizy JSON
+        data (list): Lista przetworzonych pakietów
+        original_name (str): Oryginalna nazwa pliku PCAP
+        sha256 (str, optional): Skrót SHA-256 zawartości pliku PCAP
+        byte_size (int): Rozmiar pliku PCAP w bajtach
+        created_at (datetime, optional): Czas wykonania analizy (domyślnie teraz)
+        source_path (str, optional): Ścieżka źródłowego pliku PCAP (do eksportu wybranych pakietów)
+    """
+    first_packet = data[0]['time'] if data else None
+    last_packet = data[-1]['time'] if data else None
+    duration = 0
     try:
-        packets_data = pcap_to_json(file_path)
-        
-        # Generowanie nazwy pliku JSON na podstawie daty i godziny
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        json_filename = f"pcap_analysis_{timestamp}.json"
-        json_path = os.path.join(app.config['JSON_FOLDER'], json_filename)
-        
-        # Zapisanie danych do pliku JSON
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(packets_data, f, indent=2, default=json_serial)
-        
-        flash(f'Pomyślnie przetworzono plik. Zapisano jako {json_filename}')
-        return redirect(url_for('view_json', filename=json_filename))
-        
-    except Exception as e:
-        flash(f'Błąd podczas przetwarzania pliku: {str(e)}')
-        return redirect(url_for('index'))
+        if data:
+            duration = (datetime.datetime.fromisoformat(last_packet) -
+                        datetime.datetime.fromisoformat(first_packet)).total_seconds()
+    except (ValueError, TypeError):
+        pass
+    
+    with get_catalog() as conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO analyses
+                (json_filename, original_name, sha256, packet_count, first_packet, last_packet,
+                 duration, byte_size, stats_cached, created_at, source_path)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (json_filename, original_name, sha256, len(data), first_packet, last_packet,
+              duration, byte_size, int(os.path.exists(stats_cache_path(json_filename))),
+              (created_at or datetime.datetime.now()).isoformat(timespec='seconds'),
+              os.path.abspath(source_path) if source_path else None))
 
-# Wyświetlanie przetworzonego pliku JSON
-@app.route('/view/<filename>')
-def view_json(filename):
-    try:
-        file_path = os.path.join(app.config['JSON_FOLDER'], filename)
-        
-        if not os.path.exists(file_path):
-            flash('Plik nie istnieje')
-            return redirect(url_for('index'))
-        
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Generowanie rozszerzonych statystyk
-        stats = generate_extended_stats(data)
-        
-        return render_template('view.html', filename=filename, data=data, stats=stats)
-        
-    except Exception as e:
-        flash(f'Błąd podczas odczytu pliku: {str(e)}')
-        return redirect(url_for('index'))
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """Oblicza skrót SHA-256 pliku czytanego porcjami"""
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
 
-    # Pobieranie pliku JSON
-@app.route('/download/<filename>')
-def download_file(filename):
-    return send_from_directory(app.config['JSON_FOLDER'], filename, as_attachment=True)
+def save_upload_with_hash(stream, file_path, chunk_size=1024 * 1024):
+    """Zapisuje strumień na dysk porcjami, licząc przy okazji SHA-256 (bez ponownego odczytu)"""
+    sha = hashlib.sha256()
+    with open(file_path, 'wb') as f:
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            sha.update(chunk)
+            f.write(chunk)
+    return sha.hexdigest()
 
-# API do pobierania danych JSON
-@app.route('/api/json/<filename>')
+def find_analysis_by_hash(sha256):
+    """Zwraca nazwę istniejącej analizy pliku o danym skrócie lub None"""
+    with get_catalog() as conn:
+        rows = conn.execute(
+            "SELECT json_filename FROM analyses WHERE sha256 = ? ORDER BY created_at DESC", (sha256,)
+        ).fetchall()
+    
+    for row in rows:
+        if analysis_exists(row['json_filename']):
+            return row['json_filename']
+    return None
+
+# Dane analizy: NDJSON w niezależnie skompresowanych ramkach gzip. Każda ramka to osobny człon
+# gzip (cały plik pozostaje poprawnym .gz), a indeks ramek pozwala czytać wybrane pakiety
+ANALYSIS_FRAME_PACKETS = 1000
+ANALYSIS_COMPRESS_LEVEL = 6
+FRAME_INDEX_DTYPE = np.dtype([('offset', '<u8'), ('length', '<u4'), ('first', '<u4'), ('count', '<u4')])
+
+def analysis_storage_path(json_filename):
+    base = os.path.splitext(json_filename)[0]
+    return os.path.join(app.config['JSON_FOLDER'], f"{base}.ndjson.gz")
+
+def analysis_frame_index_path(json_filename):
+    base = os.path.splitext(json_filename)[0]
+    return os.path.join(app.config['JSON_FOLDER'], f"{base}.frames.idx")
+
+def analysis_path(json_filename):
+    """Ścieżka pliku z danymi analizy - skompresowanego lub (starsze analizy) zwykłego JSON"""
+    storage_path = analysis_storage_path(json_filename)
+    if os.path.exists(storage_path):
+        return storage_path
+    return os.path.join(app.config['JSON_FOLDER'], json_filename)
+
+def analysis_exists(json_filename):
+    return os.path.exists(analysis_path(json_filename))
+
+def write_analysis(json_filename, packets):
+    """
+    Zapisuje pakiety analizy w ramkach po ANALYSIS_FRAME_PACKETS rekordów wraz z indeksem ramek
+    
+    Args:
+        json_filename (str): Nazwa analizy
+        packets (list): Lista rekordów pakietów
+    """
+    frames = []
+    
+    def write_frames(f):
+        offset = 0
+        for first in range(0, len(packets), ANALYSIS_FRAME_PACKETS):
+            chunk = packets[first:first + ANALYSIS_FRAME_PACKETS]
+            text = ''.join(json.dumps(packet, default=json_serial, separators=(',', ':')) + '\n' for packet in chunk)
+            frame = gzip.compress(text.encode('utf-8'), compresslevel=ANALYSIS_COMPRESS_LEVEL, mtime=0)
+            f.write(frame)
+            frames.append((offset, len(frame), first, len(chunk)))
+            offset += len(frame)
+    
+    # Oba pliki przez unikalne pliki tymczasowe (równoległe migracje nie kolidują); indeks jest
+    # podmieniany po danych, więc nigdy nie opisuje ramek, których jeszcze nie ma w pliku
+    write_file_atomic(analysis_storage_path(json_filename), write_frames)
+    write_file_atomic(analysis_frame_index_path(json_filename),
+                      lambda f: f.write(np.array(frames, dtype=FRAME_INDEX_DTYPE).tobytes()))
+
+def decode_analysis_frame(frame):
+    """Dekompresuje ramkę i dekoduje jej rekordy jednym wywołaniem json.loads"""
+    text = gzip.decompress(frame).decode('utf-8').rstrip('\n')
+    # Znaki nowej linii w JSON występują tylko jako separatory rekordów
+    return json.loads('[' + text.replace('\n', ',') + ']') if text else []
+
+def read_frame_index(json_filename):
+    index_path = analysis_frame_index_path(json_filename)
+    if not os.path.exists(index_path):
+        return None
+    return np.fromfile(index_path, dtype=FRAME_INDEX_DTYPE)
+
+def iter_analysis_frames(json_filename):
+    """Zwraca kolejne porcje (listy) pakietów analizy, dekompresując plik strumieniowo"""
+    storage_path = analysis_storage_path(json_filename)
+    if not os.path.exists(storage_path):
+        # Starsza analiza zapisana jako zwykły JSON
+        with open(os.path.join(app.config['JSON_FOLDER'], json_filename), 'r', encoding='utf-8') as f:
+            yield json.load(f)
+        return
+    
+    index = read_frame_index(json_filename)
+    with open(storage_path, 'rb') as f:
+        if index is None:
+            # Bez indeksu - kolejne człony gzip czytane jako jeden strumień
+            batch = []
+            with gzip.GzipFile(fileobj=f) as stream:
+                for line in stream:
+                    batch.append(json.loads(line))
+                    if len(batch) >= ANALYSIS_FRAME_PACKETS:
+                        yield batch
+                        batch = []
+            if batch:
+                yield batch
+            return
+        
+        for frame in index:
+            f.seek(int(frame['offset']))
+            yield decode_analysis_frame(f.read(int(frame['length'])))
+
+def iter_analysis(json_filename):
+    for frame in iter_analysis_frames(json_filename):
+        yield from frame
+
+def load_analysis(json_filename):
+    """Wczytuje wszystkie pakiety analizy"""
+    packets = []
+    for frame in iter_analysis_frames(json_filename):
+        packets.extend(frame)
+    return packets
+
+def read_analysis_packets(json_filename, start, stop):
+    """
+    Zwraca pakiety o indeksach [start, stop), dekompresując tylko potrzebne ramki
+    
+    Args:
+        json_filename (str): Nazwa analizy
+        start (int): Indeks pierwszego pakietu (od 0)
+        stop (int): Indeks za ostatnim pakietem
+    
+    Returns:
+        list: Rekordy pakietów
+    """
+    index = read_frame_index(json_filename)
+    if index is None or not os.path.exists(analysis_storage_path(json_filename)):
+        return list(itertools.islice(iter_analysis(json_filename), start, stop))
+    
+    if len(index) == 0 or stop <= start:
+        return []
+    
+    lo = max(int(np.searchsorted(index['first'], start, side='right')) - 1, 0)
+    hi = int(np.searchsorted(index['first'], stop, side='left'))
+    
+    packets = []
+    with open(analysis_storage_path(json_filename), 'rb') as f:
+        for frame in index[lo:hi]:
+            f.seek(int(frame['offset']))
+            packets.extend(decode_analysis_frame(f.read(int(frame['length']))))
+    
+    skip = start - int(index['first'][lo])
+    return packets[skip:skip + (stop - start)]
+
+def iter_analysis_range(json_filename, offset=0, limit=None):
+    """
+    Zwraca kolejne porcje pakietów o indeksach [offset, offset + limit), dekompresując tylko potrzebne ramki
+    
+    Args:
+        json_filename (str): Nazwa analizy
+        offset (int): Indeks pierwszego pakietu (od 0)
+        limit (int, optional): Maks. liczba pakietów (None = do końca analizy)
+    """
+    stop = None if limit is None else offset + limit
+    index = read_frame_index(json_filename)
+    if index is None or not os.path.exists(analysis_storage_path(json_filename)):
+        packets = itertools.islice(iter_analysis(json_filename), offset, stop)
+        while True:
+            batch = list(itertools.islice(packets, ANALYSIS_FRAME_PACKETS))
+            if not batch:
+                return
+            yield batch
+    
+    if len(index) == 0:
+        return
+    total = int(index['first'][-1]) + int(index['count'][-1])
+    stop = total if stop is None else min(stop, total)
+    if offset >= stop:
+        return
+    
+    lo = max(int(np.searchsorted(index['first'], offset, side='right')) - 1, 0)
+    with open(analysis_storage_path(json_filename), 'rb') as f:
+        for frame in index[lo:]:
+            first = int(frame['first'])
+            if first >= stop:
+                return
+            f.seek(int(frame['offset']))
+            packets = decode_analysis_frame(f.read(int(frame['length'])))
+            yield packets[max(offset - first, 0):stop - first]
+
+def count_analysis_packets(json_filename):
+    """Liczba pakietów analizy - z indeksu ramek (starsze analizy: z pełnego odczytu)"""
+    index = read_frame_index(json_filename)
+    if index is None or not os.path.exists(analysis_storage_path(json_filename)):
+        return len(load_analysis(json_filename))
+    return int(index['first'][-1]) + int(index['count'][-1]) if len(index) else 0
+
+def read_analysis_packets_at(json_filename, indices):
+    """
+    Zwraca pakiety o podanych indeksach, dekompresując tylko ramki, które je zawierają
+    
+    Args:
+        json_filename (str): Nazwa analizy
+        indices (array): Rosnące indeksy pakietów (od 0)
+    
+    Returns:
+        list: Rekordy pakietów w kolejności indeksów
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    index = read_frame_index(json_filename)
+    if index is None or not os.path.exists(analysis_storage_path(json_filename)):
+        packets = load_analysis(json_filename)
+        return [packets[i] for i in indices.tolist()]
+    
+    if len(index) == 0 or len(indices) == 0:
+        return []
+    
+    frame_ids = np.searchsorted(index['first'], indices, side='right') - 1
+    frames, bounds = np.unique(frame_ids, return_index=True)
+    bounds = np.append(bounds, len(indices))
+    
+    packets = []
+    with open(analysis_storage_path(json_filename), 'rb') as f:
+        for position, frame_id in enumerate(frames.tolist()):
+            frame = index[frame_id]
+            f.seek(int(frame['offset']))
+            records = decode_analysis_frame(f.read(int(frame['length'])))
+            first = int(frame['first'])
+            packets.extend(records[i - first] for i in indices[bounds[position]:bounds[position + 1]].tolist())
+    return packets
+
+# Nagłówki plików przechwytywania: magiczne liczby pcap (us i ns) -> kolejność bajtów
+PCAP_MAGIC = {
+    b'\xd4\xc3\xb2\xa1': '<',
+    b'\xa1\xb2\xc3\xd4': '>',
+    b'\x4d\x3c\xb2\xa1': '<',
+    b'\xa1\xb2\x3c\x4d': '>'
+}
+PCAP_GLOBAL_HEADER_LEN = 24
+PCAP_RECORD_HEADER_LEN = 16
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_LE = b'\x4d\x3c\x2b\x1a'
+PCAPNG_PACKET_BLOCKS = {2, 3, 6}  # Packet Block (przestarzały), Simple Packet Block, Enhanced Packet Block
+PCAPNG_ISB = 5  # Interface Statistics Block - w wycinku jego liczniki byłyby nieprawdziwe
+CAPTURE_COPY_CHUNK = 1024 * 1024
+
+def capture_index_path(json_filename):
+    base = os.path.splitext(json_filename)[0]
+    return os.path.join(app.config['JSON_FOLDER'], f"{base}.capture.npz")
+
+def scan_capture(pcap_file):
+    """
+    Wyznacza położenie każdego pakietu w pliku pcap/pcapng bez dekodowania pakietów
+    
+    Args:
+        pcap_file (str): Ścieżka do pliku przechwytywania
+    
+    Returns:
+        dict: Format pliku, offsety i długości rekordów pakietów (nagłówek + dane) oraz
+              bloków strukturalnych (nagłówek pliku, SHB, IDB, ...), rozmiar pliku
+    """
+    offsets, lengths = [], []
+    blocks = []
+    
+    with open(pcap_file, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < PCAP_GLOBAL_HEADER_LEN:
+            raise ValueError('Capture file is too short')
+        
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic = bytes(mm[:4])
+            
+            if magic in PCAP_MAGIC:
+                capture_format = 'pcap'
+                record_header = struct.Struct(PCAP_MAGIC[magic] + 'IIII')
+                blocks.append((0, PCAP_GLOBAL_HEADER_LEN))
+                pos = PCAP_GLOBAL_HEADER_LEN
+                while pos + PCAP_RECORD_HEADER_LEN <= size:
+                    record_len = PCAP_RECORD_HEADER_LEN + record_header.unpack_from(mm, pos)[2]
+                    if pos + record_len > size:
+                        break  # Ucięty ostatni rekord
+                    offsets.append(pos)
+                    lengths.append(record_len)
+                    pos += record_len
+            
+            elif struct.unpack_from('<I', mm, 0)[0] == PCAPNG_SHB:
+                capture_format = 'pcapng'
+                endian = '<'
+                pos = 0
+                while pos + 12 <= size:
+                    block_type = struct.unpack_from(endian + 'I', mm, pos)[0]
+                    if block_type == PCAPNG_SHB:
+                        # Kolejność bajtów sekcji wynika z pola byte-order magic bloku SHB
+                        endian = '<' if bytes(mm[pos + 8:pos + 12]) == PCAPNG_BYTE_ORDER_LE else '>'
+                    block_len = struct.unpack_from(endian + 'I', mm, pos + 4)[0]
+                    if block_len < 12 or pos + block_len > size:
+                        break
+                    
+                    if block_type in PCAPNG_PACKET_BLOCKS:
+                        offsets.append(pos)
+                        lengths.append(block_len)
+                    elif block_type != PCAPNG_ISB:
+                        blocks.append((pos, block_len))
+                    pos += block_len
+            
+            else:
+                raise ValueError('Unknown capture file format')
+    
+    return {
+        'format': capture_format,
+        'offsets': np.array(offsets, dtype=np.uint64),
+        'lengths': np.array(lengths, dtype=np.uint32),
+        'block_offsets': np.array([b[0] for b in blocks], dtype=np.uint64),
+        'block_lengths': np.array([b[1] for b in blocks], dtype=np.uint32),
+        'source_size': size
+    }
+
+def save_capture_index(json_filename, pcap_file, packet_count):
+    """Zapisuje indeks pakietów pliku źródłowego, o ile zgadza się z liczbą pakietów analizy"""
+    index = scan_capture(pcap_file)
+    if len(index['offsets']) != packet_count:
+        return None
+    write_file_atomic(capture_index_path(json_filename), lambda f: np.savez(f, **index))
+    return index
+
+def find_capture_source(json_filename):
+    """Zwraca ścieżkę źródłowego pliku PCAP analizy z katalogu (lub z katalogu uploads) albo None"""
+    with get_catalog() as conn:
+        row = conn.execute("SELECT sha256, source_path FROM analyses WHERE json_filename = ?",
+                           (json_filename,)).fetchone()
+    if row is None:
+        return None
+    if row['source_path'] and os.path.exists(row['source_path']):
+        return row['source_path']
+    
+    # Analizy sprzed zapisywania ścieżki - przesłane pliki mają w nazwie prefiks skrótu
+    if row['sha256']:
+        prefix = f"{row['sha256'][:12]}_"
+        for name in os.listdir(app.config['UPLOAD_FOLDER']):
+            if name.startswith(prefix):
+                return os.path.join(app.config['UPLOAD_FOLDER'], name)
+    return None
+
+def set_capture_source(json_filename, source_path):
+    """Zapisuje w katalogu nową ścieżkę pliku źródłowego analizy (ten sam skrót SHA-256)"""
+    with get_catalog() as conn:
+        conn.execute("UPDATE analyses SET source_path = ? WHERE json_filename = ?",
+                     (os.path.abspath(source_path), json_filename))
+    
+    # Indeks mógł powstać dla poprzedniej kopii pliku - zostanie zbudowany ponownie
+    if os.path.exists(capture_index_path(json_filename)):
+        os.remove(capture_index_path(json_filename))
+
+def get_capture_index(json_filename):
+    """
+    Zwraca ścieżkę pliku źródłowego i indeks jego pakietów (budowany przy pierwszym użyciu)
+    
+    Raises:
+        ValueError: Gdy plik źródłowy jest niedostępny, zmienił się lub nie pasuje do analizy
+    """
+    source = find_capture_source(json_filename)
+    if source is None:
+        raise ValueError('Source capture file is not available')
+    
+    path = capture_index_path(json_filename)
+    index = None
+    if os.path.exists(path):
+        try:
+            with np.load(path) as npz:
+                index = {key: npz[key] for key in npz.files}
+            index['format'] = str(index['format'])
+            index['source_size'] = int(index['source_size'])
+        except NPZ_READ_ERRORS:
+            index = None
+    
+    if index is None:
+        with get_catalog() as conn:
+            packet_count = conn.execute("SELECT packet_count FROM analyses WHERE json_filename = ?",
+                                        (json_filename,)).fetchone()['packet_count']
+        index = save_capture_index(json_filename, source, packet_count)
+        if index is None:
+            raise ValueError('Source capture file does not match the analysis')
+    
+    if os.path.getsize(source) != index['source_size']:
+        raise ValueError('Source capture file has changed since the analysis')
+    return source, index
+
+def copy_byte_range(src, dst, start, length):
+    """Kopiuje zakres bajtów między plikami - w jądrze (copy_file_range), jeśli to możliwe"""
+    if hasattr(os, 'copy_file_range'):
+        try:
+            dst.flush()
+            copied = 0
+            while copied < length:
+                count = os.copy_file_range(src.fileno(), dst.fileno(), length - copied,
+                                           offset_src=start + copied)
+                if count == 0:
+                    break
+                copied += count
+            if copied == length:
+                return
+            start, length = start + copied, length - copied
+        except OSError:
+            pass
+    
+    src.seek(start)
+    while length > 0:
+        chunk = src.read(min(length, CAPTURE_COPY_CHUNK))
+        if not chunk:
+            break
+        dst.write(chunk)
+        length -= len(chunk)
+
+def write_capture_subset(source, index, packet_indices, out_path):
+    """
+    Zapisuje plik pcap/pcapng zawierający tylko wybrane pakiety
+    
+    Rekordy są kopiowane jako surowe zakresy bajtów, bez ponownego kodowania; bloki
+    strukturalne trafiają na swoje miejsca, a sąsiadujące zakresy są łączone w jedną kopię.
+    
+    Args:
+        source (str): Ścieżka pliku źródłowego
+        index (dict): Indeks zwrócony przez scan_capture
+        packet_indices (array): Indeksy pakietów (od 0)
+        out_path (str): Ścieżka pliku wynikowego
+    """
+    selected = np.unique(np.asarray(packet_indices, dtype=np.int64))
+    starts = np.concatenate([index['offsets'][selected], index['block_offsets']]).astype(np.int64)
+    lengths = np.concatenate([index['lengths'][selected], index['block_lengths']]).astype(np.int64)
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], starts[order] + lengths[order]
+    
+    # Łączenie zakresów, które w pliku źródłowym następują bezpośrednio po sobie
+    breaks = np.flatnonzero(starts[1:] != ends[:-1]) + 1
+    run_starts = starts[np.concatenate([[0], breaks])] if len(starts) else starts
+    run_ends = ends[np.concatenate([breaks - 1, [len(ends) - 1]])] if len(ends) else ends
+    
+    with open(source, 'rb') as src, open(out_path, 'wb') as dst:
+        for start, end in zip(run_starts.tolist(), run_ends.tolist()):
+            copy_byte_range(src, dst, start, end - start)
+
+def read_capture_packet(json_filename, packet_number):
+    """
+    Odczytuje pojedynczy pakiet z pliku źródłowego jako minimalny plik przechwytywania
+    
+    Args:
+        json_filename (str): Nazwa pliku analizy
+        packet_number (int): Numer pakietu (od 1)
+    
+    Returns:
+        bytes: Nagłówek pliku (lub bloki SHB/IDB dla pcapng) i rekord pakietu, albo None
+    """
+    source, index = get_capture_index(json_filename)
+    if packet_number < 1 or packet_number > len(index['offsets']):
+        return None
+    
+    offset = int(index['offsets'][packet_number - 1])
+    length = int(index['lengths'][packet_number - 1])
+    
+    with open(source, 'rb') as f:
+        # Bloki strukturalne poprzedzające pakiet (m.in. opis interfejsu z typem warstwy łącza)
+        parts = []
+        for block_offset, block_length in zip(index['block_offsets'].tolist(), index['block_lengths'].tolist()):
+            if block_offset > offset:
+                break
+            f.seek(block_offset)
+            parts.append(f.read(block_length))
+        f.seek(offset)
+        parts.append(f.read(length))
+    return b''.join(parts)
+
+# Ostatnio rozłożone pakiety ((nazwa analizy, numer pakietu) -> wynik)
+_dissection_cache = LRUCache('DISSECTION_CACHE_SIZE')
+DISSECTION_VALUE_LIMIT = 512  # Maks. długość tekstu wartości pola (np. surowych danych)
+
+def dissect_packet(json_filename, packet_number):
+    """
+    Pełny rozbiór pakietu przez scapy - wszystkie warstwy i pola, wykonywany na żądanie
+    
+    Args:
+        json_filename (str): Nazwa pliku analizy
+        packet_number (int): Numer pakietu (od 1)
+    
+    Returns:
+        dict: Podsumowanie pakietu i lista warstw z polami, albo None gdy pakiet nie istnieje
+    """
+    key = (json_filename, packet_number)
+    cached = _dissection_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    data = read_capture_packet(json_filename, packet_number)
+    if data is None:
+        return None
+    load_scapy()
+    packets = rdpcap(BytesIO(data), count=1)
+    if not packets:
+        return None
+    packet = packets[0]
+    
+    layers = []
+    layer = packet
+    while layer:
+        fields = []
+        for field in layer.fields_desc:
+            try:
+                value = field.i2repr(layer, layer.getfieldval(field.name))
+            except Exception:
+                value = repr(layer.getfieldval(field.name))
+            value = str(value)
+            if len(value) > DISSECTION_VALUE_LIMIT:
+                value = value[:DISSECTION_VALUE_LIMIT] + '…'
+            fields.append({'name': field.name, 'value': value})
+        layers.append({'name': layer.name, 'fields': fields})
+        layer = layer.payload
+    
+    result = {
+        'packet_number': packet_number,
+        'summary': packet.summary(),
+        'layers': layers
+    }
+    
+    return _dissection_cache.put(key, result)
+
+def reserve_analysis_name():
+    """
+    Rezerwuje unikalną nazwę analizy na podstawie daty i godziny
+    
+    Rezerwacją jest atomowo tworzony (O_EXCL) plik indeksu ramek, nadpisywany później
+    przez write_analysis - analizy zapisywane równolegle (np. przez batch.py) w tej samej
+    sekundzie dostają przyrostek _1, _2, ...
+    """
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    for attempt in itertools.count():
+        json_filename = f"pcap_analysis_{timestamp}{f'_{attempt}' if attempt else ''}.json"
+        if analysis_exists(json_filename):
+            continue
+        try:
+            os.close(os.open(analysis_frame_index_path(json_filename), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            continue
+        return json_filename
+
+def discard_analysis_files(json_filename):
+    """Usuwa pliki nieudanej analizy (dane, indeksy, payloady, kolumny, kostkę, piramidę i cache)"""
+    paths = (analysis_storage_path(json_filename), analysis_frame_index_path(json_filename),
+             payload_blob_path(json_filename), payload_index_path(json_filename), timeseries_path(json_filename),
+             packet_columns_path(json_filename), rollup_path(json_filename), capture_index_path(json_filename),
+             stats_cache_path(json_filename), geo_cache_path(json_filename))
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+# Funkcja przetwarzająca plik PCAP i zapisująca wynik analizy
+def ingest_pcap(file_path, original_name, sha256=None):
+    """
+    Przetwarza plik PCAP, zapisuje analizę JSON i rejestruje ją w katalogu
+    
+    Args:
+        file_path (str): Ścieżka do pliku PCAP
+        original_name (str): Nazwa pliku wyświetlana w katalogu
+        sha256 (str, optional): Skrót pliku, jeśli został już obliczony
+    
+    Returns:
+        str: Nazwa zapisanego pliku analizy JSON
+    """
+    # Generowanie nazwy pliku JSON na podstawie daty i godziny
+    json_filename = reserve_analysis_name()
+    
+    try:
+        # Payloady trafiają do osobnego pliku binarnego powiązanego z analizą
+        packets_data = pcap_to_json(file_path, payload_blob=json_filename)
+        if isinstance(packets_data, dict) and 'error' in packets_data:
+            raise ValueError(packets_data['error'])
+        
+        # Zapisanie danych analizy (skompresowane ramki NDJSON)
+        write_analysis(json_filename, packets_data)
+        
+        # Piramida szeregów czasowych dla powiększalnych wykresów
+        save_timeseries_pyramid(json_filename, packets_data)
+        
+        # Kolumny pakietów dla filtrów wyrażeń i kostka agregatów dla przekrojów statystyk
+        columns = save_packet_columns(json_filename, packets_data)
+        save_rollup_cube(json_filename, columns)
+        
+        # Położenie pakietów w pliku źródłowym - do eksportu wybranych pakietów bez dekodowania
+        try:
+            save_capture_index(json_filename, file_path, len(packets_data))
+        except (ValueError, OSError) as e:
+            print(f"Nie udało się zindeksować pliku {file_path}: {e}")
+        
+        register_analysis(
+            json_filename, packets_data,
+            original_name=original_name,
+            sha256=sha256 or file_sha256(file_path),
+            byte_size=os.path.getsize(file_path),
+            source_path=file_path
+        )
+    except BaseException:
+        # Nieudany import nie zostawia plików, które init_catalog uznałby później za analizę
+        discard_analysis_files(json_filename)
+        raise
+    
+    return json_filename
+
+# Cache statystyk zapisywany obok pliku analizy
+def stats_cache_path(json_filename):
+    base = os.path.splitext(json_filename)[0]
+    return os.path.join(app.config['JSON_FOLDER'], f"{base}.stats.json.gz")
+
+def load_cached_stats(json_filename):
+    """Zwraca statystyki z cache lub None, jeśli cache nie istnieje albo jest nieaktualny"""
+    cache_path = stats_cache_path(json_filename)
+    
+    if os.path.exists(cache_path):
+        try:
+            with gzip.open(cache_path, 'rt', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('version') == STATS_CACHE_VERSION:
+                stats = cached['stats']
+                stats['geo_data'] = get_geo_data(json_filename, stats)
+                return stats
+        except (ValueError, KeyError, OSError, EOFError):
+            pass
+    
+    return None
+
+# Kolumny akceptowane w bazie GeoIP w formacie CSV (pierwsza pasująca nazwa)
+GEOIP_CSV_COLUMNS = {
+    'network': ('network', 'cidr'),
+    'start': ('start_ip', 'ip_from', 'range_start', 'start'),
+    'end': ('end_ip', 'ip_to', 'range_end', 'end'),
+    'country': ('country_iso_code', 'country_code', 'country', 'country_name'),
+    'city': ('city_name', 'city'),
+    'lat': ('latitude', 'lat'),
+    'lon': ('longitude', 'lon', 'lng')
+}
+GEOIP_INDEX_VERSION = 1
+# Prefiks adresów IPv4 w przestrzeni IPv6 (::ffff:0:0/96) - wspólny klucz dla obu wersji
+IPV4_MAPPED_PREFIX = b'\x00' * 10 + b'\xff\xff'
+
+def ip_sort_key(address):
+    """Klucz adresu IP (GeoIP, filtry CIDR) - 16 bajtów big-endian (porządek bajtów = porządek liczbowy)"""
+    if isinstance(address, str):
+        if address.isdigit():
+            address = int(address)
+        else:
+            # Szybka ścieżka dla adresów tekstowych (inet_pton zamiast obiektów ipaddress)
+            try:
+                return IPV4_MAPPED_PREFIX + socket.inet_pton(socket.AF_INET, address)
+            except OSError:
+                try:
+                    return socket.inet_pton(socket.AF_INET6, address)
+                except OSError:
+                    raise ValueError(f'Invalid IP address: {address}')
+    ip = ipaddress.ip_address(address)
+    return IPV4_MAPPED_PREFIX + ip.packed if ip.version == 4 else ip.packed
+
+class GeoIPDatabase:
+    """
+    Lokalna baza geolokalizacji jako posortowana tablica rozłącznych zakresów adresów
+    
+    Zakresy i lokalizacje są trzymane w tablicach numpy; wyszukiwanie wielu adresów naraz
+    to jedno wyszukiwanie binarne (np.searchsorted) na kluczach 16-bajtowych.
+    """
+    
+    def __init__(self, starts, ends, countries, cities, lats, lons, signature):
+        order = np.argsort(starts, kind='stable')
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.countries = countries[order]
+        self.cities = cities[order]
+        self.lats = lats[order]
+        self.lons = lons[order]
+        self.signature = signature
+    
+    @staticmethod
+    def signature_of(path):
+        st = os.stat(path)
+        return f"{GEOIP_INDEX_VERSION}:{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+    
+    @classmethod
+    def from_rows(cls, rows, signature):
+        """Buduje bazę z krotek (początek, koniec, kraj, miasto, szerokość, długość)"""
+        rows = list(rows)
+        return cls(
+            np.array([row[0] for row in rows], dtype='S16'),
+            np.array([row[1] for row in rows], dtype='S16'),
+            np.array([row[2] for row in rows], dtype=str),
+            np.array([row[3] for row in rows], dtype=str),
+            np.array([row[4] for row in rows], dtype=np.float64),
+            np.array([row[5] for row in rows], dtype=np.float64),
+            signature
+        )
+    
+    @classmethod
+    def from_csv(cls, path, signature):
+        """Wczytuje bazę CSV z zakresami (network w notacji CIDR lub start/end jako adresy lub liczby)"""
+        import pandas as pd
+        frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+        frame.columns = [column.strip().lower() for column in frame.columns]
+        columns = {}
+        for name, aliases in GEOIP_CSV_COLUMNS.items():
+            columns[name] = next((alias for alias in aliases if alias in frame.columns), None)
+        
+        if columns['network'] is None and (columns['start'] is None or columns['end'] is None):
+            raise ValueError('GeoIP CSV needs a network column or start/end columns')
+        
+        def number(value):
+            try:
+                return float(value)
+            except ValueError:
+                return float('nan')
+        
+        def rows():
+            for record in frame.to_dict('records'):
+                try:
+                    if columns['network']:
+                        network = ipaddress.ip_network(record[columns['network']], strict=False)
+                        start, end = network.network_address, network.broadcast_address
+                    else:
+                        start, end = record[columns['start']], record[columns['end']]
+                    start, end = ip_sort_key(start), ip_sort_key(end)
+                except ValueError:
+                    continue
+                yield (
+                    start, end,
+                    record.get(columns['country'], '') if columns['country'] else '',
+                    record.get(columns['city'], '') if columns['city'] else '',
+                    number(record.get(columns['lat'], '')) if columns['lat'] else float('nan'),
+                    number(record.get(columns['lon'], '')) if columns['lon'] else float('nan')
+                )
+        
+        return cls.from_rows(rows(), signature)
+    
+    @classmethod
+    def from_mmdb(cls, path, signature):
+        """Wczytuje bazę w formacie MaxMind (wymaga opcjonalnego pakietu maxminddb)"""
+        try:
+            import maxminddb
+        except ImportError:
+            raise ValueError('Reading .mmdb databases requires the maxminddb package')
+        
+        def rows(reader):
+            for network, record in reader:
+                if not record:
+                    continue
+                location = record.get('location', {})
+                yield (
+                    ip_sort_key(network.network_address), ip_sort_key(network.broadcast_address),
+                    record.get('country', {}).get('iso_code', ''),
+                    record.get('city', {}).get('names', {}).get('en', ''),
+                    location.get('latitude', float('nan')),
+                    location.get('longitude', float('nan'))
+                )
+        
+        with maxminddb.open_database(path) as reader:
+            return cls.from_rows(rows(reader), signature)
+    
+    @classmethod
+    def load_index(cls, path):
+        with np.load(path) as npz:
+            return cls(npz['starts'], npz['ends'], npz['countries'], npz['cities'],
+                       npz['lats'], npz['lons'], str(npz['signature']))
+    
+    def save_index(self, path):
+        write_file_atomic(path, lambda f: np.savez(
+            f, starts=self.starts, ends=self.ends, countries=self.countries, cities=self.cities,
+            lats=self.lats, lons=self.lons, signature=self.signature))
+    
+    def lookup(self, addresses):
+        """
+        Geolokalizuje listę adresów IP
+        
+        Args:
+            addresses (list): Adresy IP (tekst)
+        
+        Returns:
+            list: Dla każdego adresu słownik (country, city, lat, lon) lub None
+        """
+        keys = []
+        for address in addresses:
+            try:
+                keys.append(ip_sort_key(address))
+            except ValueError:
+                keys.append(b'')
+        keys = np.array(keys, dtype='S16')
+        if not len(self.starts) or not len(keys):
+            return [None] * len(keys)
+        
+        positions = np.searchsorted(self.starts, keys, side='right') - 1
+        valid = positions >= 0
+        positions = np.maximum(positions, 0)
+        valid &= keys <= self.ends[positions]
+        
+        return [
+            {
+                'country': str(self.countries[position]),
+                'city': str(self.cities[position]),
+                'lat': float(self.lats[position]),
+                'lon': float(self.lons[position])
+            } if found else None
+            for position, found in zip(positions.tolist(), valid.tolist())
+        ]
+
+# Załadowana baza GeoIP (sygnatura pliku -> baza), współdzielona przez wszystkie analizy
+_geoip_database = {}
+
+def geoip_index_path():
+    return os.path.join(app.config['JSON_FOLDER'], 'geoip.index.npz')
+
+def get_geoip_database():
+    """Zwraca bazę GeoIP z konfiguracji (z pamięci, z zapisanego indeksu lub wczytaną z pliku) albo None"""
+    path = app.config.get('GEOIP_DATABASE')
+    if not path or not os.path.exists(path):
+        return None
+    
+    signature = GeoIPDatabase.signature_of(path)
+    if signature in _geoip_database:
+        return _geoip_database[signature]
+    
+    # Zapisany indeks pozwala pominąć parsowanie bazy w każdym procesie roboczym
+    index_path = geoip_index_path()
+    database = None
+    if os.path.exists(index_path):
+        try:
+            database = GeoIPDatabase.load_index(index_path)
+        except NPZ_READ_ERRORS:
+            database = None
+        if database is not None and database.signature != signature:
+            database = None
+    
+    if database is None:
+        try:
+            if path.lower().endswith('.mmdb'):
+                database = GeoIPDatabase.from_mmdb(path, signature)
+            else:
+                database = GeoIPDatabase.from_csv(path, signature)
+        except (ValueError, OSError) as e:
+            print(f"Nie udało się wczytać bazy GeoIP {path}: {e}")
+            return None
+        database.save_index(index_path)
+    
+    _geoip_database.clear()
+    _geoip_database[signature] = database
+    return database
+
+def geo_cache_path(json_filename):
+    base = os.path.splitext(json_filename)[0]
+    return os.path.join(app.config['JSON_FOLDER'], f"{base}.geo.json")
+
+def get_geo_data(json_filename, stats):
+    """
+    Geolokalizacja adresów IP analizy - każdy unikalny adres sprawdzany raz, wynik zapisywany w cache
+    
+    Args:
+        json_filename (str): Nazwa pliku analizy
+        stats (dict): Statystyki analizy (węzły grafu IP z liczbą pakietów)
+    
+    Returns:
+        list: Lokalizacje najaktywniejszych adresów (ip, country, city, lat, lon, packets)
+    """
+    database = get_geoip_database()
+    if database is None:
+        return []
+    
+    cache_path = geo_cache_path(json_filename)
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('signature') == database.signature:
+                return cached['geo_data']
+        except (ValueError, KeyError, OSError):
+            pass
+    
+    nodes = stats['network_graph']['nodes']
+    locations = database.lookup([node['id'] for node in nodes])
+    
+    geo_data = []
+    for node, location in zip(nodes, locations):
+        if location is None or np.isnan(location['lat']) or np.isnan(location['lon']):
+            continue
+        geo_data.append({'ip': node['id'], **location, 'packets': node.get('value', 0)})
+    geo_data.sort(key=lambda item: item['packets'], reverse=True)
+    geo_data = geo_data[:app.config['GEOIP_MAP_LIMIT']]
+    
+    write_file_atomic(cache_path, lambda f: json.dump({'signature': database.signature, 'geo_data': geo_data}, f),
+                      mode='w', encoding='utf-8')
+    return geo_data
+
+def get_analysis_stats(json_filename, data=None):
+    """Zwraca statystyki analizy z cache lub oblicza je i zapisuje do cache (JSON wczytywany tylko w razie potrzeby)"""
+    cached = load_cached_stats(json_filename)
+    if cached is not None:
+        return cached
+    
+    cache_path = stats_cache_path(json_filename)
+    
+    if data is None:
+        data = load_analysis(json_filename)
+    
+    stats = generate_extended_stats(data, get_packet_columns(json_filename, data))
+    
+    cached = json.dumps({'version': STATS_CACHE_VERSION, 'stats': stats}, default=json_serial).encode('utf-8')
+    write_file_atomic(cache_path, lambda f: f.write(gzip.compress(cached, compresslevel=ANALYSIS_COMPRESS_LEVEL)))
+    
+    # Nieskompresowany cache z poprzednich wersji nie jest już potrzebny
+    legacy_cache = cache_path[:-len('.gz')]
+    if os.path.exists(legacy_cache):
+        os.remove(legacy_cache)
+    
+    with get_catalog() as conn:
+        conn.execute("UPDATE analyses SET stats_cached = 1 WHERE json_filename = ?", (json_filename,))
+    
+    stats['geo_data'] = get_geo_data(json_filename, stats)
+    return stats
+
+# Rodzaje grafów dostępne przez API (rodzaj -> klucz w statystykach)
+GRAPH_KINDS = {
+    'ip': 'network_graph',
+    'mac': 'mac_graph',
+    'mac_protocol': 'enhanced_mac_graph'
+}
+GRAPH_GROUPINGS = ('auto', 'subnet24', 'subnet16', 'vendor', 'none')
+GRAPH_GROUP_PREFIX = 'group:'
+GRAPH_GROUP_COLOR = '#adb5bd'
+
+# Ostatnio używane indeksy grafów ((nazwa analizy, rodzaj) -> (mtime cache statystyk, indeks))
+_graph_index_cache = LRUCache('GRAPH_INDEX_CACHE_SIZE')
+
+class GraphIndex:
+    """
+    Indeks grafu komunikacji do redukcji po stronie serwera
+    
+    Przechowuje listę sąsiedztwa (nieskierowaną, z wagą = liczba pakietów) i ranking węzłów,
+    dzięki czemu wybór top-k węzłów, zwijanie pozostałych w grupy i rozwijanie pojedynczego
+    węzła nie wymagają przechodzenia po wszystkich krawędziach przy każdym żądaniu.
+    """
+    
+    def __init__(self, graph, kind):
+        self.kind = kind
+        self.nodes = {node['id']: node for node in graph['nodes']}
+        self.edges = {(edge['from'], edge['to']): edge for edge in graph['edges']}
+        self.adjacency = collections.defaultdict(dict)
+        for (src, dst), edge in self.edges.items():
+            self.adjacency[src][dst] = self.adjacency[src].get(dst, 0) + edge['value']
+            if src != dst:
+                self.adjacency[dst][src] = self.adjacency[dst].get(src, 0) + edge['value']
+        self.ranked = sorted(self.nodes, key=lambda node_id: self.nodes[node_id].get('value', 0), reverse=True)
+        # Parametry redukcji pochodzą z zapytania - pamiętane są tylko ostatnio używane warianty
+        self._reductions = LRUCache('GRAPH_REDUCTION_CACHE_SIZE')
+    
+    def node_value(self, node_id):
+        return self.nodes[node_id].get('value', 0)
+    
+    def group_key(self, node_id, grouping):
+        """Zwraca nazwę grupy węzła: podsieć /24 lub /16 (dla IPv6 /64 lub /48) albo producent karty"""
+        if grouping == 'vendor':
+            return get_mac_vendor(node_id)
+        
+        try:
+            address = ipaddress.ip_address(node_id)
+        except ValueError:
+            return 'other'
+        
+        if address.version == 4:
+            prefix = 24 if grouping == 'subnet24' else 16
+        else:
+            prefix = 64 if grouping == 'subnet24' else 48
+        return str(ipaddress.ip_network(f"{node_id}/{prefix}", strict=False))
+    
+    def resolve_grouping(self, grouping, top, max_groups):
+        """Rozwiązuje grupowanie 'auto' i sprawdza, czy pasuje do rodzaju grafu"""
+        if grouping not in GRAPH_GROUPINGS:
+            raise ValueError(f'Unknown grouping: {grouping}')
+        
+        if self.kind == 'ip':
+            if grouping == 'vendor':
+                raise ValueError('Vendor grouping is only available for MAC graphs')
+            if grouping == 'auto':
+                # /24, o ile liczba podsieci w ogonie mieści się w limicie grup
+                subnets = {self.group_key(node_id, 'subnet24') for node_id in self.ranked[top:]}
+                grouping = 'subnet24' if len(subnets) <= max_groups else 'subnet16'
+        else:
+            if grouping in ('subnet24', 'subnet16'):
+                raise ValueError('Subnet grouping is only available for the IP graph')
+            if grouping == 'auto':
+                grouping = 'vendor'
+        
+        return grouping
+    
+    def _merge_edge(self, edges, src, dst, edge):
+        """Dodaje krawędź (lub jej wagę) do zagregowanej krawędzi src -> dst"""
+        edge_id = f"{src}-{dst}"
+        merged = edges.get(edge_id)
+        if merged is None:
+            merged = edges[edge_id] = {'id': edge_id, 'from': src, 'to': dst, 'value': 0}
+            if 'protocols' in edge:
+                merged['protocols'] = []
+        
+        merged['value'] += edge['value']
+        for protocol in edge.get('protocols', ()):
+            if protocol not in merged['protocols']:
+                merged['protocols'].append(protocol)
+    
+    @staticmethod
+    def _finish_edges(edges):
+        for edge in edges.values():
+            if 'protocols' in edge:
+                edge['title'] = f"Packets: {edge['value']}\nProtocols: {', '.join(edge['protocols'])}"
+            else:
+                edge['title'] = f"Pakiety: {edge['value']}"
+        return list(edges.values())
+    
+    def group_node(self, group_id, members):
+        """Tworzy super-węzeł reprezentujący zwiniętą grupę"""
+        name = group_id[len(GRAPH_GROUP_PREFIX):]
+        value = sum(self.node_value(node_id) for node_id in members)
+        return {
+            'id': group_id,
+            'label': f"{name} ({len(members)})",
+            'title': f"Zwinięta grupa: {name}\nWęzły: {len(members)}\nPakiety: {value}\nDwuklik rozwija grupę",
+            'value': value,
+            'color': GRAPH_GROUP_COLOR,
+            'collapsed': True,
+            'members': len(members)
+        }
+    
+    def _edges_for(self, node_ids, representative):
+        """Agreguje krawędzie incydentne z podanymi węzłami na ich reprezentantów"""
+        edges = {}
+        seen = set()
+        for node_id in node_ids:
+            for neighbour in self.adjacency.get(node_id, ()):
+                for pair in ((node_id, neighbour), (neighbour, node_id)):
+                    edge = self.edges.get(pair)
+                    if edge is None or pair in seen:
+                        continue
+                    seen.add(pair)
+                    src, dst = representative.get(pair[0]), representative.get(pair[1])
+                    # Krawędzie wewnątrz jednej grupy znikają po zwinięciu
+                    if src is None or dst is None or (src == dst and pair[0] != pair[1]):
+                        continue
+                    self._merge_edge(edges, src, dst, edge)
+        return edges
+    
+    def reduce(self, top, grouping, max_groups):
+        """
+        Zwraca zredukowany graf: top-k węzłów wg liczby pakietów, a resztę zwiniętą w grupy
+        
+        Args:
+            top (int): Liczba pokazywanych najaktywniejszych węzłów
+            grouping (str): Sposób grupowania ogona (auto, subnet24, subnet16, vendor, none)
+            max_groups (int): Maks. liczba grup - mniejsze grupy trafiają do wspólnej grupy "other"
+        
+        Returns:
+            dict: Węzły i krawędzie gotowe dla vis.js oraz informacje o redukcji
+        """
+        return self._reduction(top, grouping, max_groups)[0]
+    
+    def _reduction(self, top, grouping, max_groups):
+        """Zredukowany graf wraz z przypisaniem węzłów do grup (z pamięci lub obliczony)"""
+        key = (top, grouping, max_groups)
+        cached = self._reductions.get(key)
+        if cached is not None:
+            return cached
+        
+        resolved = self.resolve_grouping(grouping, top, max_groups)
+        kept = self.ranked[:top]
+        representative = {node_id: node_id for node_id in kept}
+        groups = {}
+        
+        if resolved != 'none':
+            members = collections.defaultdict(list)
+            for node_id in self.ranked[top:]:
+                members[self.group_key(node_id, resolved)].append(node_id)
+            
+            # Grupy uporządkowane wg łącznego ruchu; nadmiarowe łączone we wspólną grupę
+            ordered = sorted(members.items(), key=lambda item: sum(self.node_value(n) for n in item[1]), reverse=True)
+            for position, (name, node_ids) in enumerate(ordered):
+                group_id = GRAPH_GROUP_PREFIX + (name if position < max_groups else 'other')
+                groups.setdefault(group_id, []).extend(node_ids)
+                for node_id in node_ids:
+                    representative[node_id] = group_id
+        
+        nodes = [dict(self.nodes[node_id]) for node_id in kept]
+        nodes.extend(self.group_node(group_id, node_ids) for group_id, node_ids in groups.items())
+        
+        edges = {}
+        for (src, dst), edge in self.edges.items():
+            a, b = representative.get(src), representative.get(dst)
+            if a is None or b is None or (a == b and src != dst):
+                continue
+            self._merge_edge(edges, a, b, edge)
+        
+        result = {
+            'kind': self.kind,
+            'grouping': resolved,
+            'nodes': nodes,
+            'edges': self._finish_edges(edges),
+            'total_nodes': len(self.nodes),
+            'total_edges': len(self.edges),
+            'shown_nodes': len(kept),
+            'groups': len(groups)
+        }
+        return self._reductions.put(key, (result, representative, groups))
+    
+    def expand(self, node_id, limit, top, grouping, max_groups):
+        """
+        Rozwija węzeł zredukowanego grafu
+        
+        Dla zwiniętej grupy zwraca jej najaktywniejszych członków (i przeliczone krawędzie
+        pozostałej części grupy), dla zwykłego węzła - jego najsilniej połączonych sąsiadów.
+        
+        Returns:
+            dict: Nowe węzły, krawędzie oraz liczba jeszcze nieujawnionych węzłów
+        """
+        _, representative, groups = self._reduction(top, grouping, max_groups)
+        
+        if node_id in groups:
+            members = sorted(groups[node_id], key=self.node_value, reverse=True)
+            revealed, remaining = members[:limit], members[limit:]
+            local = dict(representative)
+            local.update((member, member) for member in revealed)
+            
+            edges = self._edges_for(revealed + remaining, local)
+            nodes = [dict(self.nodes[member]) for member in revealed]
+            return {
+                'node': node_id,
+                'nodes': nodes,
+                'edges': self._finish_edges(edges),
+                'group': self.group_node(node_id, remaining) if remaining else None,
+                'remaining': len(remaining)
+            }
+        
+        if node_id not in self.nodes:
+            raise KeyError(node_id)
+        
+        neighbours = heapq.nlargest(limit, self.adjacency.get(node_id, {}).items(), key=lambda item: item[1])
+        edges = {}
+        for neighbour, _ in neighbours:
+            for pair in ((node_id, neighbour), (neighbour, node_id)):
+                if pair in self.edges:
+                    self._merge_edge(edges, pair[0], pair[1], self.edges[pair])
+        
+        return {
+            'node': node_id,
+            'nodes': [dict(self.nodes[neighbour]) for neighbour, _ in neighbours],
+            'edges': self._finish_edges(edges),
+            'group': None,
+            'remaining': max(len(self.adjacency.get(node_id, {})) - limit, 0)
+        }
+
+def get_graph_index(json_filename, kind, stats=None):
+    """Zwraca indeks grafu danego rodzaju - z pamięci lub zbudowany ze statystyk analizy"""
+    cache_path = stats_cache_path(json_filename)
+    mtime = os.path.getmtime(cache_path) if os.path.exists(cache_path) else None
+    
+    key = (json_filename, kind)
+    cached = _graph_index_cache.get(key)
+    if cached and mtime is not None and cached[0] == mtime:
+        return cached[1]
+    
+    if stats is None:
+        stats = get_analysis_stats(json_filename)
+    index = GraphIndex(stats[GRAPH_KINDS[kind]], kind)
+    
+    _graph_index_cache.put(key, (os.path.getmtime(cache_path), index))
+    return index
+
+def parse_graph_params(args):
+    """Odczytuje parametry redukcji grafu z zapytania"""
+    kind = args.get('kind', 'ip')
+    if kind not in GRAPH_KINDS:
+        raise ValueError(f'Unknown graph kind: {kind}')
+    
+    top = min(max(args.get('top', app.config['GRAPH_DEFAULT_TOP'], type=int), 1), 5000)
+    max_groups = min(max(args.get('max_groups', app.config['GRAPH_MAX_GROUPS'], type=int), 1), 500)
+    grouping = args.get('group', 'auto')
+    return kind, top, grouping, max_groups
+
+# Piramida szeregów czasowych - szerokości bucketów (s), od najdrobniejszego poziomu
+TIMESERIES_LEVELS = [0.001, 0.01, 0.1, 1, 10, 60, 600, 3600]
+TIMESERIES_VERSION = 1
+# Poziom jest wybierany tak, by okno zawierało co najwyżej points * TIMESERIES_OVERSAMPLE bucketów
+TIMESERIES_OVERSAMPLE = 4
+
+# Ostatnio używane piramidy (nazwa analizy -> (mtime pliku, tablice))
+_timeseries_cache = LRUCache('TIMESERIES_CACHE_SIZE')
+
+def timeseries_path(json_filename):
+    base = os.path.splitext(json_filename)[0]
+    return os.path.join(app.config['JSON_FOLDER'], f"{base}.timeseries.npz")
+
+def build_timeseries_pyramid(data):
+    """
+    Buduje wielopoziomową piramidę liczby pakietów i bajtów per protokół aplikacyjny
+    
+    Każdy poziom przechowuje tylko niepuste buckety (rzadko), posortowane po numerze bucketu,
+    więc dowolne okno czasowe można wyciąć wyszukiwaniem binarnym.
+    
+    Args:
+        data (list): Lista rekordów pakietów
+    
+    Returns:
+        dict: Tablice numpy gotowe do zapisu przez np.savez_compressed
+    """
+    timestamps = [get_packet_timestamp(packet) for packet in data]
+    valid = [(ts, packet) for ts, packet in zip(timestamps, data) if ts is not None]
+    
+    times = np.array([ts for ts, _ in valid], dtype=np.float64)
+    lengths = np.array([packet.get('length', 0) for _, packet in valid], dtype=np.int64)
+    codes = np.array([get_app_protocol_code(packet) for _, packet in valid], dtype=np.int64)
+    
+    t0 = float(times.min()) if len(times) else 0.0
+    t1 = float(times.max()) if len(times) else 0.0
+    pyramid = {
+        'version': np.array(TIMESERIES_VERSION),
+        't0': np.array(t0),
+        't1': np.array(t1),
+        'widths': np.array(TIMESERIES_LEVELS, dtype=np.float64),
+        'protocols': np.array(APP_PROTOCOLS)
+    }
+    
+    n_codes = len(APP_PROTOCOLS)
+    offsets = times - t0
+    for level, width in enumerate(TIMESERIES_LEVELS):
+        buckets = np.floor(offsets / width).astype(np.int64)
+        keys, inverse = np.unique(buckets * n_codes + codes, return_inverse=True)
+        pyramid[f'bucket_{level}'] = keys // n_codes
+        pyramid[f'proto_{level}'] = (keys % n_codes).astype(np.uint8)
+        pyramid[f'packets_{level}'] = np.bincount(inverse, minlength=len(keys)).astype(np.int64)
+        pyramid[f'bytes_{level}'] = np.bincount(inverse, weights=lengths, minlength=len(keys)).astype(np.int64)
+    
+    return pyramid
+
+def save_timeseries_pyramid(json_filename, data):
+    """Buduje piramidę i zapisuje ją obok pliku analizy"""
+    pyramid = build_timeseries_pyramid(data)
+    write_file_atomic(timeseries_path(json_filename), lambda f: np.savez_compressed(f, **pyramid))
+    return pyramid
+
+def get_timeseries_pyramid(json_filename):
+    """Zwraca piramidę analizy z pamięci, z pliku lub - dla starszych analiz - buduje ją z JSON"""
+    path = timeseries_path(json_filename)
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    
+    cached = _timeseries_cache.get(json_filename)
+    if cached and mtime is not None and cached[0] == mtime:
+        return cached[1]
+    
+    pyramid = None
+    if mtime is not None:
+        try:
+            with np.load(path) as npz:
+                if int(npz['version']) == TIMESERIES_VERSION:
+                    pyramid = {key: npz[key] for key in npz.files}
+        except NPZ_READ_ERRORS:
+            pyramid = None
+    
+    if pyramid is None:
+        pyramid = save_timeseries_pyramid(json_filename, load_analysis(json_filename))
+        mtime = os.path.getmtime(path)
+    
+    _timeseries_cache.put(json_filename, (mtime, pyramid))
+    return pyramid
+
+def lttb_indices(x, y, threshold):
+    """
+    Wybiera indeksy punktów metodą Largest-Triangle-Three-Buckets
+    
+    Zachowuje kształt serii (w tym lokalne maksima i minima) przy redukcji do threshold punktów.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        
+        # Pole trójkąta (a, kandydat, średnia następnego bucketu)
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    
+    return indices
+
+def query_timeseries(pyramid, start=None, end=None, points=300, protocol_code=None):
+    """
+    Zwraca serię pakietów/bajtów dla okna czasowego z odpowiedniego poziomu piramidy
+    
+    Args:
+        pyramid (dict): Tablice piramidy
+        start (float, optional): Początek okna (epoch, s) - domyślnie początek przechwytywania
+        end (float, optional): Koniec okna (epoch, s) - domyślnie koniec przechwytywania
+        points (int): Docelowa liczba punktów
+        protocol_code (int, optional): Kod protokołu aplikacyjnego (None - cały ruch)
+    
+    Returns:
+        dict: Znaczniki czasu bucketów, liczby pakietów i bajtów oraz szerokość bucketu
+    """
+    t0, t1 = float(pyramid['t0']), float(pyramid['t1'])
+    widths = pyramid['widths']
+    start = t0 if start is None else max(start, t0)
+    end = t1 if end is None else min(end, t1)
+    if end <= start:
+        end = start + widths[0]
+    
+    # Najdrobniejszy poziom, przy którym okno mieści się w limicie bucketów
+    span = end - start
+    level = next((i for i, width in enumerate(widths) if span / width <= points * TIMESERIES_OVERSAMPLE),
+                 len(widths) - 1)
+    width = float(widths[level])
+    first = int(np.floor((start - t0) / width))
+    last = int(np.floor((end - t0) / width))
+    
+    buckets = pyramid[f'bucket_{level}']
+    lo = np.searchsorted(buckets, first, side='left')
+    hi = np.searchsorted(buckets, last, side='right')
+    window_buckets = buckets[lo:hi] - first
+    window_packets = pyramid[f'packets_{level}'][lo:hi]
+    window_bytes = pyramid[f'bytes_{level}'][lo:hi]
+    if protocol_code is not None:
+        mask = pyramid[f'proto_{level}'][lo:hi] == protocol_code
+        window_buckets, window_packets, window_bytes = window_buckets[mask], window_packets[mask], window_bytes[mask]
+    
+    count = last - first + 1
+    packets = np.bincount(window_buckets, weights=window_packets, minlength=count)
+    byte_counts = np.bincount(window_buckets, weights=window_bytes, minlength=count)
+    timestamps = t0 + (first + np.arange(count)) * width
+    
+    # Redukcja do żądanej liczby punktów z zachowaniem szczytów
+    indices = lttb_indices(timestamps, byte_counts, points)
+    
+    return {
+        'start': start,
+        'end': end,
+        'bucket_width': width,
+        'level': level,
+        'timestamps': timestamps[indices].tolist(),
+        'packets': packets[indices].astype(np.int64).tolist(),
+        'bytes': byte_counts[indices].astype(np.int64).tolist()
+    }
+
+class JobRejected(Exception):
+    """Zgłaszany, gdy kolejka zadań danego rodzaju jest pełna"""
+
+# Kontekst procesów roboczych (konfiguracja trafia do nich przez init_job_worker)
+JOB_MP_CONTEXT = multiprocessing.get_context('spawn')
+
+# Rodzaje zadań, na które czeka wyświetlana strona - wolne miejsce w puli dostają przed raportami i eksportami
+INTERACTIVE_JOB_KINDS = ('stats', 'columns', 'bursts')
+
+class JobManager:
+    """
+    Wykonuje ciężkie zadania (statystyki, raporty PDF, eksport CSV) w puli procesów
+    
+    Każdy rodzaj zadania ma własny limit jednocześnie wykonywanych zadań i ograniczoną
+    kolejkę - nadmiarowe zgłoszenia są odrzucane (JobRejected), zamiast blokować serwer.
+    Łącznie wykonywanych jest najwyżej tyle zadań, ile jest procesów roboczych, więc zadanie
+    w stanie 'running' naprawdę działa, a nie czeka w wewnętrznej kolejce puli.
+    """
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._executor = None
+        self._jobs = collections.OrderedDict()
+        self._running = collections.Counter()
+        self._waiting = collections.defaultdict(collections.deque)
+        self._progress_queue = None
+    
+    def _get_progress_queue(self):
+        """Kolejka komunikatów o postępie (proces roboczy -> serwer) i wątek, który ją odbiera"""
+        global _job_progress_queue
+        if self._progress_queue is None:
+            self._progress_queue = JOB_MP_CONTEXT.Queue()
+            _job_progress_queue = self._progress_queue
+            threading.Thread(target=self._collect_progress, daemon=True).start()
+        return self._progress_queue
+    
+    def _collect_progress(self):
+        while True:
+            try:
+                job_id, progress = self._progress_queue.get()
+            except (EOFError, OSError):
+                # Kolejka zamknięta przy kończeniu pracy serwera
+                return
+            with self._lock:
+                job = self._jobs.get(job_id)
+                # Komunikaty mogą dotrzeć już po zakończeniu zadania
+                if job is not None and job['status'] == 'running':
+                    job['progress'] = progress
+    
+    def _get_executor(self):
+        if self._executor is None:
+            workers = app.config['WORKER_PROCESSES']
+            progress_queue = self._get_progress_queue()
+            if workers > 0:
+                # Procesy uruchamiane metodą spawn - fork serwera z działającymi wątkami (np. odbiorcą
+                # postępu) mógłby skopiować zajętą blokadę i zawiesić proces roboczy
+                self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=JOB_MP_CONTEXT,
+                                                     initializer=init_job_worker,
+                                                     initargs=(dict(app.config), progress_queue))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=max(sum(app.config['JOB_LIMITS'].values()), 1))
+        return self._executor
+    
+    def _capacity(self):
+        """Łączna liczba jednocześnie wykonywanych zadań - rozmiar puli"""
+        workers = app.config['WORKER_PROCESSES']
+        return workers if workers > 0 else max(sum(app.config['JOB_LIMITS'].values()), 1)
+    
+    def _can_start(self, kind):
+        """Czy zadanie danego rodzaju może wystartować (limit rodzaju i wolny proces roboczy)"""
+        return (self._running[kind] < app.config['JOB_LIMITS'].get(kind, 1)
+                and sum(self._running.values()) < self._capacity())
+    
+    def submit(self, kind, func, *args, key=None, on_done=None):
+        """
+        Zgłasza zadanie do wykonania
+        
+        Args:
+            kind (str): Rodzaj zadania (klucz w JOB_LIMITS)
+            func: Funkcja modułu wykonywana w procesie roboczym
+            *args: Argumenty funkcji (muszą dać się zserializować)
+            key (str, optional): Klucz zadania - identyczne niezakończone zadanie jest współdzielone
+            on_done (optional): Funkcja wywoływana w procesie serwera z wynikiem udanego zadania
+        
+        Returns:
+            str: Identyfikator zadania
+        """
+        with self._lock:
+            if key is not None:
+                for job in self._jobs.values():
+                    if job['key'] == key and job['finished'] is None:
+                        return job['id']
+            
+            if not self._can_start(kind) and len(self._waiting[kind]) >= app.config['JOB_QUEUE_LIMIT']:
+                raise JobRejected(kind)
+            
+            job = {
+                'id': uuid.uuid4().hex,
+                'kind': kind,
+                'status': 'queued',
+                'created': time.time(),
+                'started': None,
+                'finished': None,
+                'result': None,
+                'error': None,
+                'exception': None,
+                'progress': None,
+                'key': key,
+                'on_done': on_done,
+                'func': func,
+                'args': args,
+                'done': threading.Event()
+            }
+            self._jobs[job['id']] = job
+            
+            if self._can_start(kind):
+                self._start(job)
+            else:
+                self._waiting[kind].append(job)
+            
+            self._prune()
+            return job['id']
+    
+    def _start(self, job):
+        job['status'] = 'running'
+        job['started'] = time.time()
+        self._running[job['kind']] += 1
+        try:
+            try:
+                future = self._get_executor().submit(run_job, job['id'], job['func'], *job['args'])
+            except BrokenProcessPool:
+                # Pula mogła zostać uszkodzona (np. proces roboczy zabity) - tworzona jest nowa
+                self._executor = None
+                future = self._get_executor().submit(run_job, job['id'], job['func'], *job['args'])
+        except RuntimeError as e:
+            # Pula jest zamykana (koniec pracy serwera) - zadanie kończy się błędem
+            future = Future()
+            future.set_exception(e)
+        future.add_done_callback(lambda f, job=job: self._finish(job, f))
+    
+    def _finish(self, job, future):
+        with self._lock:
+            try:
+                job['result'] = future.result()
+                job['status'] = 'done'
+                if job['on_done'] is not None:
+                    job['on_done'](job['result'])
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._executor = None
+                job['exception'] = e
+                job['error'] = str(e)
+                job['status'] = 'error'
+            
+            job['finished'] = time.time()
+            job['func'] = job['args'] = job['on_done'] = None
+            self._running[job['kind']] -= 1
+            self._start_waiting()
+            
+            job['done'].set()
+    
+    def _start_waiting(self):
+        """Uruchamia oczekujące zadania, póki są wolne miejsca - najpierw interaktywne, potem najstarsze"""
+        while True:
+            candidates = [waiting[0] for kind, waiting in self._waiting.items() if waiting and self._can_start(kind)]
+            if not candidates:
+                return
+            job = min(candidates, key=lambda job: (job['kind'] not in INTERACTIVE_JOB_KINDS, job['created']))
+            self._waiting[job['kind']].popleft()
+            self._start(job)
+    
+    def _prune(self):
+        """Usuwa najstarsze zakończone zadania ponad limit historii"""
+        finished = [job_id for job_id, job in self._jobs.items() if job['finished'] is not None]
+        for job_id in finished[:max(len(finished) - app.config['JOB_HISTORY'], 0)]:
+            del self._jobs[job_id]
+    
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            
+            info = {key: job[key] for key in ('id', 'kind', 'status', 'created', 'started', 'finished',
+                                              'progress', 'result', 'error')}
+            if job['status'] == 'queued':
+                info['queue_position'] = self._waiting[job['kind']].index(job) + 1
+            return info
+    
+    def wait(self, job_id, timeout=None):
+        """Czeka na zakończenie zadania; zwraca True, jeśli zadanie się zakończyło"""
+        job = self._jobs.get(job_id)
+        return job is not None and job['done'].wait(timeout)
+
+jobs = JobManager()
+
+# Kolejka postępu zadań i identyfikator zadania wykonywanego w bieżącym wątku
+_job_progress_queue = None
+_job_context = threading.local()
+
+def init_job_worker(config, progress_queue):
+    """Inicjalizacja procesu roboczego - konfiguracja aplikacji i kolejka postępu z procesu serwera"""
+    global _job_progress_queue
+    app.config.update(config)
+    _job_progress_queue = progress_queue
+
+def run_job(job_id, func, *args):
+    """Wykonuje funkcję zadania, udostępniając jej identyfikator zadania dla report_job_progress"""
+    _job_context.job_id = job_id
+    try:
+        return func(*args)
+    finally:
+        _job_context.job_id = None
+
+def report_job_progress(stage, detail=None, step=None, steps=None):
+    """Przekazuje serwerowi bieżący etap zadania (poza zadaniem nie robi nic)"""
+    job_id = getattr(_job_context, 'job_id', None)
+    if job_id is None or _job_progress_queue is None:
+        return
+    
+    _job_progress_queue.put((job_id, {'stage': stage, 'detail': detail, 'step': step, 'steps': steps}))
+
+# Etapy generowania raportu PDF
+REPORT_STAGES = ['stats', 'charts', 'layout', 'write']
+# Sekcje raportu PDF, gdy nie wybrano żadnych
+REPORT_DEFAULT_OPTIONS = ['summary', 'protocols', 'ports', 'mac_addresses', 'mac_vendors', 'time', 'packet_size',
+                          'network', 'mac_network', 'top_ips', 'traffic_matrix', 'tcp_analysis', 'dns_analysis']
+# Wersja formatu raportów - zmiana unieważnia zapisane odciski
+REPORT_FORMAT_VERSION = 1
+
+def report_stage(stage, detail=None):
+    report_job_progress(stage, detail, REPORT_STAGES.index(stage) + 1, len(REPORT_STAGES))
+
+def track_layout_progress(doc):
+    """Raportuje postęp składania stron dokumentu ReportLab (etap layout, a po nim write)"""
+    total = [0]
+    
+    def on_progress(kind, value):
+        if kind == 'SIZE_EST':
+            total[0] = value
+        elif kind == 'PROGRESS':
+            report_stage('layout', f"{value}/{total[0]}")
+            # Po złożeniu wszystkich elementów ReportLab zapisuje plik
+            if value >= total[0]:
+                report_stage('write')
+    
+    doc.setProgressCallBack(on_progress)
+
+def report_fingerprint(json_filename, kind, options):
+    """
+    Odcisk raportu: analiza (nazwa, rozmiar, czas modyfikacji), rodzaj raportu i jego opcje
+    
+    Args:
+        json_filename (str): Nazwa pliku analizy JSON
+        kind (str): Rodzaj raportu ('report' lub 'filtered_report')
+        options: Opcje raportu (lista sekcji lub parametry filtrów) - muszą dać się zapisać jako JSON
+    
+    Returns:
+        str: Skrót SHA-256 w postaci szesnastkowej
+    """
+    info = os.stat(analysis_path(json_filename))
+    key = json.dumps({
+        'analysis': json_filename,
+        'size': info.st_size,
+        'mtime': info.st_mtime_ns,
+        'stats_version': STATS_CACHE_VERSION,
+        'format': REPORT_FORMAT_VERSION,
+        'kind': kind,
+        'options': options
+    }, sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def find_report(fingerprint):
+    """Zwraca nazwę zapisanego raportu o danym odcisku lub None (wpisy bez pliku są usuwane)"""
+    with get_catalog() as conn:
+        row = conn.execute("SELECT report_filename FROM reports WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        if row is None:
+            return None
+        if os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], row['report_filename'])):
+            return row['report_filename']
+        conn.execute("DELETE FROM reports WHERE fingerprint = ?", (fingerprint,))
+    return None
+
+def register_report(fingerprint, json_filename, kind, options, report_filename):
+    with get_catalog() as conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO reports (fingerprint, json_filename, kind, options, report_filename, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (fingerprint, json_filename, kind, json.dumps(options, sort_keys=True), report_filename,
+              datetime.datetime.now().isoformat(timespec='seconds')))
+
+# Zadanie: statystyki analizy (obliczane i zapisywane do cache)
+def run_analysis_stats(filename):
+    # Statystyki trafiają do cache analizy - serwer odczytuje je stamtąd, wynik zadania jest tylko podsumowaniem
+    return {'total_packets': get_analysis_stats(filename)['total_packets']}
+
+# Zadanie: analiza mikroburstów i jittera z własnym oknem i progiem (jeden przebieg po rekordach analizy)
+def run_burst_analysis(filename, window_ms, threshold_bps):
+    return analyze_bursts(iter_analysis(filename), window_ms, threshold_bps)
+
+# Zadanie: raport PDF całej analizy
+def run_report(filename, options, fingerprint):
+    report_stage('stats')
+    data = load_analysis(filename)
+    
+    stats = get_analysis_stats(filename, data)
+    report_filename = generate_pdf_report(filename, data, stats, options)
+    register_report(fingerprint, filename, 'report', options, report_filename)
+    return {'file': report_filename}
+
+# Zadanie: raport PDF z przefiltrowanych pakietów (indeksy pakietów wyznaczone przez serwer lub w zadaniu)
+def run_filtered_report(filename, filter_params, fingerprint, packet_indices=None):
+    report_stage('stats', 'filter')
+    packet_indices = resolve_packet_indices(filename, filter_params, packet_indices)
+    filtered_packets = read_analysis_packets_at(filename, packet_indices)
+    report_filename = generate_filtered_packets_report(filename, filtered_packets, filter_params)
+    register_report(fingerprint, filename, 'filtered_report', filter_params, report_filename)
+    return {'file': report_filename}
+
+# Zadanie: eksport wszystkich pakietów analizy do CSV (domyślnie do pliku o unikalnej nazwie w katalogu przesłanych plików)
+def run_csv_export(filename, csv_path=None):
+    data = load_analysis(filename)
+    
+    # Konwersja do DataFrame
+    df_data = []
+    for packet in data:
+        row = {
+            'Packet_Number': packet.get('packet_number', ''),
+            'Time': packet.get('time', ''),
+            'Length': packet.get('length', ''),
+            'Source_MAC': packet.get('ethernet', {}).get('src', ''),
+            'Destination_MAC': packet.get('ethernet', {}).get('dst', ''),
+            'Source_IP': packet.get('ip', {}).get('src', ''),
+            'Destination_IP': packet.get('ip', {}).get('dst', ''),
+            'Protocol': get_protocol_name(packet),
+            'App_Protocol': get_app_protocol(packet),
+            'Source_Port': packet.get('tcp', packet.get('udp', {})).get('sport', ''),
+            'Destination_Port': packet.get('tcp', packet.get('udp', {})).get('dport', ''),
+        }
+        df_data.append(row)
+    
+    import pandas as pd
+    df = pd.DataFrame(df_data)
+    
+    # Utworzenie pliku CSV
+    if csv_path is None:
+        csv_path = os.path.join(app.config['UPLOAD_FOLDER'], output_filename('packets_export', filename, 'csv'))
+    
+    df.to_csv(csv_path, index=False, encoding='utf-8')
+    return {'file': os.path.basename(csv_path)}
+
+# Zadanie: eksport przefiltrowanych pakietów do CSV (indeksy pakietów wyznaczone przez serwer lub w zadaniu)
+def run_filtered_csv_export(filename, packet_indices, filter_params=None):
+    packet_indices = resolve_packet_indices(filename, filter_params, packet_indices)
+    filtered_packets = read_analysis_packets_at(filename, packet_indices)
+    
+    # Konwersja filtrowanych pakietów do DataFrame
+    df_data = []
+    for packet in filtered_packets:
+        row = {
+            'Packet_Number': packet.get('packet_number', ''),
+            'Time': packet.get('time', ''),
+            'Length': packet.get('length', ''),
+            'Source_MAC': packet.get('ethernet', {}).get('src', ''),
+            'Destination_MAC': packet.get('ethernet', {}).get('dst', ''),
+            'Source_MAC_Vendor': packet.get('ethernet', {}).get('src_vendor', ''),
+            'Destination_MAC_Vendor': packet.get('ethernet', {}).get('dst_vendor', ''),
+            'Source_IP': packet.get('ip', {}).get('src', ''),
+            'Destination_IP': packet.get('ip', {}).get('dst', ''),
+            'Protocol': get_protocol_name(packet),
+            'App_Protocol': get_app_protocol(packet),
+            'Source_Port': packet.get('tcp', packet.get('udp', {})).get('sport', ''),
+            'Destination_Port': packet.get('tcp', packet.get('udp', {})).get('dport', ''),
+            'TTL': packet.get('ip', {}).get('ttl', ''),
+            'TCP_Flags': packet.get('tcp', {}).get('flags', '') if 'tcp' in packet else '',
+            'UDP_Length': packet.get('udp', {}).get('len', '') if 'udp' in packet else ''
+        }
+        df_data.append(row)
+    
+    import pandas as pd
+    df = pd.DataFrame(df_data)
+    
+    # Utworzenie pliku CSV
+    csv_filename = output_filename('filtered_packets', filename, 'csv')
+    csv_path = os.path.join(app.config['UPLOAD_FOLDER'], csv_filename)
+    
+    df.to_csv(csv_path, index=False, encoding='utf-8')
+    return {'file': csv_filename, 'total_packets': len(filtered_packets)}
+
+# Zadanie: eksport przefiltrowanych pakietów do pliku pcap/pcapng (kopie surowych rekordów)
+def run_filtered_pcap_export(filename, packet_indices, filter_params=None):
+    # Wystarczą indeksy pakietów - rekordy analizy nie są wczytywane
+    packet_indices = resolve_packet_indices(filename, filter_params, packet_indices)
+    source, index = get_capture_index(filename)
+    
+    pcap_filename = output_filename('filtered_packets', filename, index['format'])
+    write_capture_subset(source, index, packet_indices,
+                         os.path.join(app.config['UPLOAD_FOLDER'], pcap_filename))
+    return {'file': pcap_filename, 'total_packets': len(packet_indices)}
+
+# Zadanie: kolumny pakietów analizy (zapisywane do .columns.npz, odczytywane potem przez serwer)
+def run_packet_columns(filename):
+    return {'total_packets': len(get_packet_columns(filename)['time'])}
+
+# Klucz adresu pobrania wyniku w odpowiedzi API dla danego rodzaju zadania
+JOB_RESULT_URL_KEYS = {
+    'report': 'report_url',
+    'filtered_report': 'report_url',
+    'csv': 'csv_url',
+    'filtered_csv': 'csv_url',
+    'filtered_pcap': 'pcap_url'
+}
+
+def job_status_payload(info):
+    """Odpowiedź API dla zadania - po zakończeniu w formacie dotychczasowych endpointów"""
+    payload = {key: info[key] for key in ('id', 'kind', 'status', 'created', 'started', 'finished')}
+    payload['status_url'] = url_for('get_job', job_id=info['id'])
+    if 'queue_position' in info:
+        payload['queue_position'] = info['queue_position']
+    if info['status'] == 'running' and info['progress']:
+        payload['progress'] = info['progress']
+    
+    if info['status'] == 'done':
+        payload['success'] = True
+        result = info['result'] or {}
+        if 'file' in result and info['kind'] in JOB_RESULT_URL_KEYS:
+            payload[JOB_RESULT_URL_KEYS[info['kind']]] = url_for('download_report', filename=result['file'])
+        if 'total_packets' in result:
+            payload['total_packets'] = result['total_packets']
+    elif info['status'] == 'error':
+        payload['success'] = False
+        payload['error'] = info['error']
+    
+    return payload
+
+def job_accepted_response(job_id):
+    """Odpowiedź 202 z uchwytem zadania"""
+    response = jsonify(job_status_payload(jobs.get(job_id)))
+    response.status_code = 202
+    response.headers['Location'] = url_for('get_job', job_id=job_id)
+    return response
+
+def job_progress_page(job_id, title, back_url, next_url=None):
+    """
+    Strona oczekiwania na zadanie (dla zwykłych żądań przeglądarki, zamiast blokować wątek serwera)
+    
+    Strona odpytuje /api/jobs, a po zakończeniu zadania przechodzi do next_url
+    lub - gdy go nie podano - pobiera plik wynikowy zadania.
+    """
+    return render_template('job.html', job=job_status_payload(jobs.get(job_id)), title=title,
+                           back_url=back_url, next_url=next_url), 202
+
+def submit_stats_job(filename):
+    """Zgłasza obliczenie statystyk analizy - jedno zadanie wspólne dla wszystkich żądań tej analizy"""
+    return jobs.submit('stats', run_analysis_stats, filename, key=f'stats:{filename}')
+
+def cached_report_response(report_filename):
+    """Odpowiedź dla raportu, który już istnieje (identyczny odcisk opcji)"""
+    report_url = url_for('download_report', filename=report_filename)
+    if wants_job_handle():
+        return jsonify({'success': True, 'cached': True, 'report_url': report_url})
+    return redirect(report_url)
+
+def job_rejected_response(kind):
+    """Odpowiedź 503, gdy kolejka zadań danego rodzaju jest pełna"""
+    response = jsonify({'error': f'Too many {kind} jobs in progress, try again later'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
+
+# Czy klient prosi o uchwyt zadania zamiast strony postępu (fetch z Accept: application/json)
+def wants_job_handle():
+    return request.accept_mimetypes.best == 'application/json'
+
+def filter_params_from_request(payload):
+    """
+    Mapuje parametry filtrów z JSON żądania na parametry compile_filter
+    
+    Raises:
+        FilterSyntaxError: Gdy filtr jest niepoprawny (sprawdzane przed przekazaniem zadania)
+    """
+    filter_params = {
+        'Source IP': payload.get('srcIp', ''),
+        'Destination IP': payload.get('dstIp', ''),
+        'Source MAC': payload.get('srcMac', ''),
+        'Destination MAC': payload.get('dstMac', ''),
+        'Protocol': payload.get('protocol', ''),
+        'Application Protocol': payload.get('appProtocol', ''),
+        'Port': payload.get('port', ''),
+        'Min Length': payload.get('lengthMin', ''),
+        'Max Length': payload.get('lengthMax', ''),
+        'Start Time': payload.get('timeStart', ''),
+        'End Time': payload.get('timeEnd', ''),
+        'Expression': payload.get('expression', '')
+    }
+    compile_filter(filter_params)
+    return filter_params
+
+# Strona główna
+@app.route('/')
+def index():
+    # Lista analiz z katalogu - z wyszukiwaniem i stronicowaniem
+    query = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
+    page_size = app.config['CATALOG_PAGE_SIZE']
+    
+    where = ''
+    params = []
+    if query:
+        where = 'WHERE original_name LIKE ? OR json_filename LIKE ? OR sha256 LIKE ?'
+        params = [f'%{query}%', f'%{query}%', f'{query.lower()}%']
+    
+    with get_catalog() as conn:
+        total = conn.execute(f"SELECT COUNT(*) FROM analyses {where}", params).fetchone()[0]
+        analyses = conn.execute(
+            f"SELECT * FROM analyses {where} ORDER BY created_at DESC, json_filename DESC LIMIT ? OFFSET ?",
+            params + [page_size, (page - 1) * page_size]
+        ).fetchall()
+    
+    pages = max(1, (total + page_size - 1) // page_size)
+    
+    return render_template('index.html', analyses=analyses, query=query, page=page, pages=pages, total=total)
+
+# Formularz przesyłania pliku
+@app.route('/upload', methods=['POST'])
+def upload_file():
+    if 'file' not in request.files and 'file_path' not in request.form:
+        flash('Nie wybrano pliku ani nie podano ścieżki')
+        return redirect(request.url)
+    
+    # Obsługa przesłanego pliku
+    if 'file' in request.files and request.files['file'].filename:
+        file = request.files['file']
+        
+        if not allowed_file(file.filename):
+            flash('Nieprawidłowy format pliku. Dozwolone formaty: .pcap, .pcapng, .cap')
+            return redirect(url_for('index'))
+        
+        filename = secure_filename(file.filename)
+        original_name = filename
+        
+        # Zapis porcjami do pliku tymczasowego z jednoczesnym liczeniem skrótu
+        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], f".upload_{os.getpid()}_{id(file)}.part")
+        sha256 = save_upload_with_hash(file.stream, temp_path)
+        
+        existing = find_analysis_by_hash(sha256)
+        if existing:
+            if find_capture_source(existing) is None:
+                # Analiza bez dostępnego pliku źródłowego - przesłana kopia służy do eksportu PCAP
+                source_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{sha256[:12]}_{filename}")
+                os.replace(temp_path, source_path)
+                set_capture_source(existing, source_path)
+            else:
+                os.remove(temp_path)
+            flash(f'Ten plik został już przeanalizowany ({existing}) - pominięto ponowne przetwarzanie')
+            return redirect(url_for('view_json', filename=existing))
+        
+        # Prefiks skrótu w nazwie - różne pliki o tej samej nazwie nie nadpisują się
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{sha256[:12]}_{filename}")
+        os.replace(temp_path, file_path)
+    
+    # Obsługa ścieżki do pliku
+    elif 'file_path' in request.form and request.form['file_path'].strip():
+        file_path = request.form['file_path'].strip()
+        
+        if not os.path.exists(file_path):
+            flash(f'Plik nie istnieje: {file_path}')
+            return redirect(url_for('index'))
+        
+        if not allowed_file(file_path):
+            flash('Nieprawidłowy format pliku. Dozwolone formaty: .pcap, .pcapng, .cap')
+            return redirect(url_for('index'))
+        
+        original_name = os.path.basename(file_path)
+        sha256 = file_sha256(file_path)
+        
+        existing = find_analysis_by_hash(sha256)
+        if existing:
+            if find_capture_source(existing) is None:
+                set_capture_source(existing, file_path)
+            flash(f'Ten plik został już przeanalizowany ({existing}) - pominięto ponowne przetwarzanie')
+            return redirect(url_for('view_json', filename=existing))
+    
+    else:
+        flash('Nie wybrano pliku ani nie podano ścieżki')
+        return redirect(url_for('index'))
+    
+    # Przetwarzanie pliku PCAP
+    try:
+        json_filename = ingest_pcap(file_path, original_name=original_name, sha256=sha256)
+        
+        flash(f'Pomyślnie przetworzono plik. Zapisano jako {json_filename}')
+        return redirect(url_for('view_json', filename=json_filename))
+        
+    except Exception as e:
+        flash(f'Błąd podczas przetwarzania pliku: {str(e)}')
+        return redirect(url_for('index'))
+
+# Wyświetlanie przetworzonego pliku JSON
+@app.route('/view/<filename>')
+def view_json(filename):
+    try:
+        if not analysis_exists(filename):
+            flash('Plik nie istnieje')
+            return redirect(url_for('index'))
+        
+        # Statystyki z cache - przy pierwszym podglądzie obliczane w procesie roboczym, a przeglądarka
+        # czeka na stronie postępu; tabela pakietów jest pobierana stronami z /api/json
+        stats = load_cached_stats(filename)
+        if stats is None:
+            return job_progress_page(submit_stats_job(filename), 'Obliczanie statystyk', url_for('index'),
+                                     next_url=url_for('view_json', filename=filename))
+        
+        # Grafy osadzane w stronie są zredukowane (top-k węzłów + zwinięte grupy)
+        graphs = {
+            kind: get_graph_index(filename, kind, stats).reduce(
+                app.config['GRAPH_DEFAULT_TOP'], 'auto', app.config['GRAPH_MAX_GROUPS'])
+            for kind in GRAPH_KINDS
+        }
+        
+        return render_template('view.html', filename=filename, stats=stats, graphs=graphs,
+                               protocol_colors=PROTOCOL_COLORS, app_protocols=APP_PROTOCOLS)
+        
+    except JobRejected:
+        flash('Serwer jest zajęty obliczaniem statystyk innych analiz - spróbuj ponownie za chwilę')
+        return redirect(url_for('index'))
+    except Exception as e:
+        flash(f'Błąd podczas odczytu pliku: {str(e)}')
+        return redirect(url_for('index'))
+
+# Strumieniowe generowanie tablicy JSON z pakietów analizy (ramka po ramce, bez wczytywania całości)
+def stream_analysis_json(filename, indent=None):
+    return stream_json_array(iter_analysis_frames(filename), indent)
+
+def stream_json_array(batches, indent=None):
+    """Zapisuje porcje rekordów jako jedną tablicę JSON, porcja po porcji"""
+    separator = ',\n' if indent else ','
+    yield '[\n' if indent else '['
+    first = True
+    for frame in batches:
+        if not frame:
+            continue
+        chunk = separator.join(json.dumps(packet, indent=indent, default=json_serial) for packet in frame)
+        yield chunk if first else separator + chunk
+        first = False
+    yield '\n]\n' if indent else ']'
+
+# Formaty odpowiedzi /api/json (parametr format albo nagłówek Accept) i ich typy MIME
+API_JSON_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+# Inne typy MIME tych samych formatów spotykane w nagłówku Accept
+API_JSON_MIME_ALIASES = {
+    'application/jsonl': 'ndjson',
+    'application/x-msgpack': 'msgpack',
+    'application/vnd.apache.arrow.file': 'arrow'
+}
+API_JSON_FIELD_RE = re.compile(r'^[A-Za-z_]\w*(\.\w+)*$')
+API_JSON_MAX_PACKET_NUMBERS = 1000  # Maks. liczba numerów pakietów w parametrze packets
+# Kolumny Arrow, gdy klient nie wybrał pól (Arrow wymaga stałego, płaskiego schematu)
+ARROW_DEFAULT_FIELDS = [
+    'packet_number', 'timestamp', 'length', 'payload_len', 'app_proto',
+    'ethernet.src', 'ethernet.dst', 'ip.version', 'ip.src', 'ip.dst', 'ip.proto', 'ip.ttl',
+    'tcp.sport', 'tcp.dport', 'tcp.flags', 'udp.sport', 'udp.dport'
+]
+# Typy kolumn Arrow - pozostałe pola są tekstem (obiekty i listy zapisane jako JSON)
+ARROW_FIELD_TYPES = {
+    'packet_number': 'int64', 'timestamp': 'float64', 'length': 'int64', 'payload_len': 'int64',
+    'payload_length': 'int64', 'payload_truncated': 'bool', 'app_proto': 'int64',
+    'ip.version': 'int64', 'ip.proto': 'int64', 'ip.ttl': 'int64',
+    'tcp.sport': 'int64', 'tcp.dport': 'int64', 'tcp.seq': 'int64', 'tcp.ack': 'int64',
+    'tcp.window': 'int64', 'tcp.len': 'int64',
+    'udp.sport': 'int64', 'udp.dport': 'int64', 'udp.len': 'int64'
+}
+
+def negotiate_api_json_format(args, accept_mimetypes):
+    """
+    Wybiera format odpowiedzi: parametr format ma pierwszeństwo przed nagłówkiem Accept
+    
+    Returns:
+        str: Nazwa formatu z API_JSON_FORMATS (domyślnie 'json')
+    """
+    requested = args.get('format', '').strip().lower()
+    if requested:
+        if requested not in API_JSON_FORMATS:
+            raise ValueError(f"Unknown format: {requested} (available: {', '.join(API_JSON_FORMATS)})")
+        return requested
+    
+    mimetypes = {mimetype: name for name, mimetype in API_JSON_FORMATS.items()}
+    mimetypes.update(API_JSON_MIME_ALIASES)
+    best = accept_mimetypes.best_match(list(mimetypes), default='application/json')
+    return mimetypes[best]
+
+def parse_field_paths(value):
+    """Zamienia listę pól 'packet_number,ip.src,tcp.dport' na listę ścieżek (pusta = całe rekordy)"""
+    fields = [field.strip() for field in (value or '').split(',') if field.strip()]
+    for field in fields:
+        if not API_JSON_FIELD_RE.match(field):
+            raise ValueError(f'Invalid field: {field}')
+    return list(dict.fromkeys(fields))
+
+def parse_packet_numbers(value):
+    """Zamienia listę '1,5,9' na rosnącą tablicę numerów pakietów (None = parametr nie podany)"""
+    if value is None:
+        return None
+    try:
+        numbers = np.unique(np.array([int(item) for item in value.split(',') if item.strip()], dtype=np.int64))
+    except ValueError:
+        raise ValueError('packets must be a comma-separated list of packet numbers')
+    if len(numbers) > API_JSON_MAX_PACKET_NUMBERS:
+        raise ValueError(f'At most {API_JSON_MAX_PACKET_NUMBERS} packet numbers can be requested at once')
+    if len(numbers) and numbers[0] < 1:
+        raise ValueError('Packet numbers start at 1')
+    return numbers
+
+def project_packets(packets, fields):
+    """Płaskie rekordy z wybranymi polami (klucz to ścieżka pola, brakujące pola mają wartość None)"""
+    paths = [(field, field.split('.')) for field in fields]
+    projected = []
+    for packet in packets:
+        record = {}
+        for field, parts in paths:
+            value = packet
+            for part in parts:
+                value = value.get(part) if isinstance(value, dict) else None
+            record[field] = value
+        projected.append(record)
+    return projected
+
+def stream_ndjson(batches):
+    """Jeden rekord JSON w wierszu - klient może przetwarzać rekordy w miarę ich nadchodzenia"""
+    for batch in batches:
+        if batch:
+            yield ''.join(json.dumps(record, default=json_serial, separators=(',', ':')) + '\n' for record in batch)
+
+def msgpack_stream_encoder():
+    """Koder MessagePack: kolejne rekordy jako osobne obiekty (czytane np. przez msgpack.Unpacker)"""
+    try:
+        import msgpack
+    except ImportError:
+        raise ValueError('MessagePack output requires the msgpack package')
+    
+    def stream(batches):
+        packer = msgpack.Packer(default=str)
+        for batch in batches:
+            if batch:
+                yield b''.join(packer.pack(record) for record in batch)
+    
+    return stream
+
+def arrow_stream_encoder(fields):
+    """Koder Arrow IPC (format strumieniowy): jedna partia rekordów na porcję pakietów"""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ValueError('Arrow output requires the pyarrow package')
+    
+    schema = pa.schema([(field, getattr(pa, ARROW_FIELD_TYPES.get(field, 'string'))()) for field in fields])
+    
+    def column_values(batch, field):
+        values = [record[field] for record in batch]
+        if field in ARROW_FIELD_TYPES:
+            return values
+        return [value if value is None or isinstance(value, str)
+                else json.dumps(value, default=json_serial) if isinstance(value, (dict, list))
+                else str(value) for value in values]
+    
+    def stream(batches):
+        sink = BytesIO()
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for batch in batches:
+                if not batch:
+                    continue
+                writer.write_batch(pa.record_batch([column_values(batch, field) for field in fields], schema=schema))
+                yield sink.getvalue()
+                sink.seek(0)
+                sink.truncate()
+        # Znacznik końca strumienia
+        yield sink.getvalue()
+    
+    return stream
+
+    # Pobieranie pliku JSON
+@app.route('/download/<filename>')
+def download_file(filename):
+    if not analysis_exists(filename):
+        flash('Plik nie istnieje')
+        return redirect(url_for('index'))
+    
+    # Plik JSON odtwarzany z danych skompresowanych w trakcie wysyłania
+    response = app.response_class(stream_analysis_json(filename, indent=2), mimetype='application/json')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+# API do pobierania pakietów analizy: JSON, NDJSON, MessagePack lub Arrow IPC,
+# z wyborem pól (fields) i zakresu pakietów (offset, limit)
+@app.route('/api/json/<filename>')
 def get_json_data(filename):
     try:
-        file_path = os.path.join(app.config['JSON_FOLDER'], filename)
+        if not analysis_exists(filename):
+            return jsonify({'error': 'File not found'}), 404
+        
+        try:
+            output_format = negotiate_api_json_format(request.args, request.accept_mimetypes)
+            fields = parse_field_paths(request.args.get('fields'))
+            offset = request.args.get('offset', 0, type=int)
+            limit = request.args.get('limit', type=int)
+            if offset < 0 or (limit is not None and limit < 0):
+                raise ValueError('offset and limit must not be negative')
+            packet_numbers = parse_packet_numbers(request.args.get('packets'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if output_format == 'arrow' and not fields:
+            fields = ARROW_DEFAULT_FIELDS
+        
+        try:
+            if output_format == 'msgpack':
+                encode = msgpack_stream_encoder()
+            elif output_format == 'arrow':
+                encode = arrow_stream_encoder(fields)
+            elif output_format == 'ndjson':
+                encode = stream_ndjson
+            else:
+                encode = stream_json_array
+        except ValueError as e:
+            # Brak opcjonalnej biblioteki - format niedostępny na tym serwerze
+            return jsonify({'error': str(e)}), 406
+        
+        if packet_numbers is not None:
+            # Wybrane pakiety (np. strona tabeli z wynikami filtra) - numery spoza analizy są pomijane
+            packet_numbers = packet_numbers[packet_numbers <= count_analysis_packets(filename)]
+            batches = iter([read_analysis_packets_at(filename, packet_numbers - 1)])
+        else:
+            batches = iter_analysis_range(filename, offset, limit)
+        if fields:
+            batches = (project_packets(batch, fields) for batch in batches)
+        
+        response = app.response_class(encode(batches), mimetype=API_JSON_FORMATS[output_format])
+        response.headers['Vary'] = 'Accept'
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# API do leniwego pobierania pełnego payload pakietu (z obsługą nagłówka Range)
+@app.route('/api/payload/<filename>/<int:packet_number>')
+def get_packet_payload(filename, packet_number):
+    try:
+        blob_path = payload_blob_path(filename)
+        payload_ref = read_payload_ref(filename, packet_number)
+        
+        if payload_ref is None or payload_ref[1] == 0 or not os.path.exists(blob_path):
+            return jsonify({'error': 'Payload not found'}), 404
+        
+        offset, length = payload_ref
+        
+        # Zakres bajtów w obrębie payload tego pakietu
+        start, stop = 0, length
+        if request.range:
+            byte_range = request.range.range_for_length(length)
+            if byte_range is None:
+                response = make_response('', 416)
+                response.headers['Content-Range'] = f'bytes */{length}'
+                return response
+            start, stop = byte_range
+        
+        with open(blob_path, 'rb') as f:
+            f.seek(offset + start)
+            chunk = f.read(stop - start)
+        
+        if request.args.get('format') == 'hex':
+            return jsonify({
+                'packet_number': packet_number,
+                'length': length,
+                'start': start,
+                'stop': stop,
+                'hex': chunk.hex()
+            })
+        
+        response = make_response(chunk, 206 if request.range else 200)
+        response.headers['Content-Type'] = 'application/octet-stream'
+        response.headers['Accept-Ranges'] = 'bytes'
+        if request.range:
+            response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# API pełnego rozbioru pakietu - dekodowanie z pliku źródłowego przy otwarciu szczegółów
+@app.route('/api/dissect/<filename>/<int:packet_number>')
+def get_packet_dissection(filename, packet_number):
+    try:
+        if not analysis_exists(filename):
+            return jsonify({'error': 'File not found'}), 404
+        
+        try:
+            result = dissect_packet(filename, packet_number)
+        except ValueError as e:
+            # Brak lub zmiana pliku źródłowego - widok pokazuje wtedy tylko zapisane pola
+            return jsonify({'error': str(e)}), 409
+        
+        if result is None:
+            return jsonify({'error': 'Packet not found'}), 404
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# API szeregów czasowych - dowolne okno czasowe z piramidy wielorozdzielczej
+@app.route('/api/timeseries/<filename>')
+def get_timeseries(filename):
+    try:
+        if not analysis_exists(filename):
+            return jsonify({'error': 'File not found'}), 404
+        
+        points = request.args.get('points', 300, type=int)
+        points = min(max(points, 10), app.config['TIMESERIES_MAX_POINTS'])
+        
+        protocol = request.args.get('protocol', '')
+        protocol_code = None
+        if protocol:
+            if protocol not in APP_PROTOCOL_CODES:
+                return jsonify({'error': f'Unknown protocol: {protocol}'}), 400
+            protocol_code = APP_PROTOCOL_CODES[protocol]
+        
+        series = query_timeseries(
+            get_timeseries_pyramid(filename),
+            start=request.args.get('start', type=float),
+            end=request.args.get('end', type=float),
+            points=points,
+            protocol_code=protocol_code
+        )
+        series['protocol'] = protocol or None
+        return jsonify(series)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# API statystyk przekroju ruchu - odpowiedź z kostki agregatów, bez przeglądania pakietów
+@app.route('/api/stats/<filename>')
+def get_rollup_stats(filename):
+    try:
+        if not analysis_exists(filename):
+            return jsonify({'error': 'File not found'}), 404
+        
+        group_by = [dimension for dimension in request.args.get('group_by', '').split(',') if dimension]
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 1000)
+        
+        try:
+            result = query_rollup(
+                get_rollup_cube(filename),
+                start=request.args.get('start', type=float),
+                end=request.args.get('end', type=float),
+                protocol=request.args.get('protocol', ''),
+                src_net=request.args.get('src_net', ''),
+                dst_net=request.args.get('dst_net', ''),
+                port_class=request.args.get('port_class', ''),
+                group_by=group_by,
+                limit=limit
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# API macierzy ruchu - mapa cieplna hostów lub podsieci
+@app.route('/api/traffic_matrix/<filename>')
+def get_traffic_heatmap(filename):
+    try:
+        if not analysis_exists(filename):
+            return jsonify({'error': 'File not found'}), 404
+        
+        size = min(max(request.args.get('size', app.config['TRAFFIC_MATRIX_HEATMAP_SIZE'], type=int), 2), 100)
+        try:
+            return jsonify(traffic_heatmap(filename, size, request.args.get('metric', 'bytes'), request.args.get('level', 'auto')))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# API macierzy ruchu - z kim komunikuje się host (wiersz i kolumna macierzy)
+@app.route('/api/traffic_matrix/<filename>/peers')
+def get_traffic_peers(filename):
+    try:
+        if not analysis_exists(filename):
+            return jsonify({'error': 'File not found'}), 404
+        
+        host = request.args.get('host', '').strip()
+        if not host:
+            return jsonify({'error': 'Missing host parameter'}), 400
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 1000)
+        
+        try:
+            result = get_traffic_matrix(filename).peers(host, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if result is None:
+            return jsonify({'error': f'Unknown host: {host}'}), 404
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Wyniki /api/bursts według (analiza, okno, próg) - przebieg po pakietach nie jest powtarzany
+_burst_cache = LRUCache('BURST_CACHE_SIZE')
+
+# API mikroburstów i jittera z własnym oknem i progiem (przebieg po pakietach analizy w procesie roboczym)
+@app.route('/api/bursts/<filename>')
+def get_bursts(filename):
+    try:
+        if not analysis_exists(filename):
+            return jsonify({'error': 'File not found'}), 404
+        
+        window_ms = request.args.get('window_ms', app.config['BURST_WINDOW_MS'], type=float)
+        threshold_mbps = request.args.get('threshold_mbps', app.config['BURST_THRESHOLD_BPS'] / 1e6, type=float)
+        if not 0.001 <= window_ms <= 1000:
+            return jsonify({'error': 'window_ms must be between 0.001 and 1000'}), 400
+        if threshold_mbps <= 0:
+            return jsonify({'error': 'threshold_mbps must be positive'}), 400
+        
+        key = (filename, window_ms, threshold_mbps)
+        result = _burst_cache.get(key)
+        if result is None:
+            # Wynik trafia do pamięci podręcznej po zakończeniu zadania - klient ponawia wtedy zapytanie
+            return job_accepted_response(jobs.submit('bursts', run_burst_analysis, filename, window_ms,
+                                                     threshold_mbps * 1e6,
+                                                     key=f'bursts:{filename}:{window_ms}:{threshold_mbps}',
+                                                     on_done=lambda result: _burst_cache.put(key, result)))
+        return jsonify(result)
+        
+    except JobRejected:
+        return job_rejected_response('bursts')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# API rozkładu (kwantyle i histogram w skali logarytmicznej odtworzony ze szkicu)
+@app.route('/api/distribution/<filename>')
+def get_distribution(filename):
+    try:
+        if not analysis_exists(filename):
+            return jsonify({'error': 'File not found'}), 404
+        
+        metric = request.args.get('metric', 'packet_size')
+        protocol = request.args.get('protocol', '')
+        bins = min(max(request.args.get('bins', 30, type=int), 1), 200)
+        if metric not in DISTRIBUTION_METRICS:
+            return jsonify({'error': f'Unknown metric: {metric}'}), 400
+        
+        # Statystyki z cache, a przy pierwszym odczycie - uchwyt zadania, które je oblicza
+        stats = load_cached_stats(filename)
+        if stats is None:
+            return job_accepted_response(submit_stats_job(filename))
+        
+        sketches = stats['distributions']['sketches'][metric]
+        if protocol:
+            if protocol not in sketches['by_protocol']:
+                return jsonify({'error': f'Unknown protocol: {protocol}'}), 400
+            sketch = QuantileSketch.from_dict(sketches['by_protocol'][protocol])
+        else:
+            sketch = QuantileSketch.from_dict(sketches['overall'])
+        
+        label, unit, scale = DISTRIBUTION_METRICS[metric]
+        histogram = sketch.histogram(bins)
+        histogram['edges'] = [edge * scale for edge in histogram['edges']]
+        return jsonify({
+            'metric': metric,
+            'label': label,
+            'unit': unit,
+            'protocol': protocol or None,
+            'protocols': list(sketches['by_protocol']),
+            'summary': sketch.summary(DISTRIBUTION_QUANTILES, scale),
+            'histogram': histogram
+        })
+        
+    except JobRejected:
+        return job_rejected_response('stats')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# API zredukowanego grafu komunikacji
+@app.route('/api/graph/<filename>')
+def get_graph(filename):
+    try:
+        if not analysis_exists(filename):
+            return jsonify({'error': 'File not found'}), 404
         
-        if not os.path.exists(file_path):
+        # Indeks grafu powstaje ze statystyk - jeszcze nieobliczone są liczone w procesie roboczym
+        if not os.path.exists(stats_cache_path(filename)):
+            return job_accepted_response(submit_stats_job(filename))
+        
+        try:
+            kind, top, grouping, max_groups = parse_graph_params(request.args)
+            return jsonify(get_graph_index(filename, kind).reduce(top, grouping, max_groups))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+    except JobRejected:
+        return job_rejected_response('stats')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# API rozwijania węzła grafu (sąsiedzi węzła lub członkowie zwiniętej grupy)
+@app.route('/api/graph/<filename>/expand')
+def expand_graph_node(filename):
+    try:
+        if not analysis_exists(filename):
             return jsonify({'error': 'File not found'}), 404
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        node_id = request.args.get('node', '')
+        if not node_id:
+            return jsonify({'error': 'Missing node parameter'}), 400
         
-        return jsonify(data)
+        limit = min(max(request.args.get('limit', app.config['GRAPH_EXPAND_LIMIT'], type=int), 1), 1000)
         
+        if not os.path.exists(stats_cache_path(filename)):
+            return job_accepted_response(submit_stats_job(filename))
+        
+        try:
+            kind, top, grouping, max_groups = parse_graph_params(request.args)
+            index = get_graph_index(filename, kind)
+            return jsonify(index.expand(node_id, limit, top, grouping, max_groups))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except KeyError:
+            return jsonify({'error': f'Unknown node: {node_id}'}), 404
+        
+    except JobRejected:
+        return job_rejected_response('stats')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Funkcja do filtrowania pakietów
-def filter_packets(packets, filter_params):
+# Kolumnowa reprezentacja pakietów analizy - filtrowanie operacjami na tablicach numpy
+PACKET_COLUMNS_VERSION = 2
+PACKET_CATEGORY_COLUMNS = ('src_mac', 'dst_mac', 'src_vendor', 'dst_vendor', 'app_protocol', 'dns_qname')
+TRANSPORT_TCP = 1
+TRANSPORT_UDP = 2
+TCP_FLAG_BITS = {'F': 0x01, 'S': 0x02, 'R': 0x04, 'P': 0x08, 'A': 0x10, 'U': 0x20, 'E': 0x40, 'C': 0x80}
+
+# Ostatnio używane kolumny pakietów (nazwa analizy -> słownik tablic)
+_packet_columns_cache = LRUCache('PACKET_COLUMNS_CACHE_SIZE')
+
+def packet_columns_path(json_filename):
+    base = os.path.splitext(json_filename)[0]
+    return os.path.join(app.config['JSON_FOLDER'], f"{base}.columns.npz")
+
+def build_packet_columns(packets):
     """
-    Filtruje pakiety według określonych parametrów
+    Przekształca rekordy pakietów w kolumny numpy (jeden przebieg po pakietach)
     
     Args:
-        packets (list): Lista wszystkich pakietów do filtrowania
-        filter_params (dict): Parametry filtrowania
+        packets (list): Lista rekordów pakietów
     
     Returns:
-        list: Przefiltrowana lista pakietów
+        dict: Tablice kolumn; kolumny tekstowe jako kody (-1 = brak) i tablica '<nazwa>_categories'
     """
-    filtered = []
+    n = len(packets)
+    columns = {
+        'time': np.zeros(n, dtype=np.float64),
+        'length': np.zeros(n, dtype=np.int64),
+        'ip_version': np.zeros(n, dtype=np.int8),
+        'ip_proto': np.full(n, -1, dtype=np.int16),
+        'ttl': np.full(n, -1, dtype=np.int16),
+        'src_ip': np.zeros(n, dtype='S16'),
+        'dst_ip': np.zeros(n, dtype='S16'),
+        'has_addr': np.zeros(n, dtype=bool),
+        'transport': np.zeros(n, dtype=np.int8),
+        'sport': np.full(n, -1, dtype=np.int32),
+        'dport': np.full(n, -1, dtype=np.int32),
+        'tcp_flags': np.zeros(n, dtype=np.uint16),
+        'vlan': np.full(n, -1, dtype=np.int32),
+        'is_arp': np.zeros(n, dtype=bool),
+        'has_eth': np.zeros(n, dtype=bool),
+        'has_dns': np.zeros(n, dtype=bool),
+        'l2_len': np.zeros(n, dtype=np.int32),
+        'l3_len': np.zeros(n, dtype=np.int32),
+        'l4_len': np.zeros(n, dtype=np.int32),
+        'payload_len': np.zeros(n, dtype=np.int32)
+    }
+    categories = {name: {} for name in PACKET_CATEGORY_COLUMNS}
+    codes = {name: np.full(n, -1, dtype=np.int32) for name in PACKET_CATEGORY_COLUMNS}
     
-    srcIp = filter_params.get('Source IP', '')
-    dstIp = filter_params.get('Destination IP', '')
-    srcMac = filter_params.get('Source MAC', '')
-    dstMac = filter_params.get('Destination MAC', '')
-    protocol = filter_params.get('Protocol', '')
-    port = filter_params.get('Port', '')
-    lengthMin = filter_params.get('Min Length', '')
-    lengthMax = filter_params.get('Max Length', '')
-    timeStart = filter_params.get('Start Time', '')
-    timeEnd = filter_params.get('End Time', '')
+    def set_category(name, i, value):
+        if value:
+            codes[name][i] = categories[name].setdefault(value, len(categories[name]))
     
-    for packet in packets:
-        # Inicjalizacja wartości ważne dla filtrów
-        valid = True
-        
-        # MAC Źródłowe
-        if srcMac and 'ethernet' in packet and packet['ethernet']['src'] != srcMac:
-            if not srcMac.lower() in packet['ethernet']['src'].lower():  # Częściowe dopasowanie
-                valid = False
-        
-        # MAC Docelowe
-        if dstMac and 'ethernet' in packet and packet['ethernet']['dst'] != dstMac:
-            if not dstMac.lower() in packet['ethernet']['dst'].lower():  # Częściowe dopasowanie
-                valid = False
-        
-        # IP Źródłowe
-        if srcIp and 'ip' in packet and packet['ip']['src'] != srcIp:
-            if not srcIp in packet['ip']['src']:  # Częściowe dopasowanie
-                valid = False
-        
-        # IP Docelowe
-        if dstIp and 'ip' in packet and packet['ip']['dst'] != dstIp:
-            if not dstIp in packet['ip']['dst']:  # Częściowe dopasowanie
-                valid = False
-        
-        # Protokół
-        if protocol:
-            packet_protocol = ""
-            if 'tcp' in packet:
-                packet_protocol = "TCP"
-            elif 'udp' in packet:
-                packet_protocol = "UDP"
-            elif 'ip' in packet:
-                packet_protocol = f"IP({packet['ip']['proto']})"
-            
-            if protocol != packet_protocol:
-                valid = False
+    for i, packet in enumerate(packets):
+        timestamp = packet.get('timestamp')
+        if timestamp is None:
+            timestamp = datetime.datetime.fromisoformat(packet['time']).timestamp()
+        columns['time'][i] = timestamp
+        columns['length'][i] = int(packet['length'])
+        hdr_len, columns['payload_len'][i] = estimate_header_lengths(packet)
+        columns['l2_len'][i], columns['l3_len'][i], columns['l4_len'][i] = hdr_len
         
-        # Port (źródłowy lub docelowy)
-        if port:
-            port_num = int(port)
-            port_found = False
-            
-            if 'tcp' in packet:
-                if packet['tcp']['sport'] == port_num or packet['tcp']['dport'] == port_num:
-                    port_found = True
-            elif 'udp' in packet:
-                if packet['udp']['sport'] == port_num or packet['udp']['dport'] == port_num:
-                    port_found = True
-            
-            if not port_found:
-                valid = False
+        if 'ethernet' in packet:
+            ethernet = packet['ethernet']
+            columns['has_eth'][i] = True
+            set_category('src_mac', i, ethernet['src'].lower())
+            set_category('dst_mac', i, ethernet['dst'].lower())
+            set_category('src_vendor', i, ethernet.get('src_vendor'))
+            set_category('dst_vendor', i, ethernet.get('dst_vendor'))
         
-        # Długość pakietu
-        if lengthMin and int(packet['length']) < int(lengthMin):
-            valid = False
+        if packet.get('vlan'):
+            columns['vlan'][i] = packet['vlan'][0]
         
-        if lengthMax and int(packet['length']) > int(lengthMax):
-            valid = False
+        if 'ip' in packet:
+            columns['ip_version'][i] = packet['ip'].get('version', 4)
+            columns['ip_proto'][i] = packet['ip']['proto']
+            columns['ttl'][i] = packet['ip'].get('ttl', -1)
+        columns['is_arp'][i] = 'arp' in packet
+        
+        endpoints = get_ip_endpoints(packet)
+        if endpoints:
+            try:
+                columns['src_ip'][i] = ip_sort_key(endpoints[0])
+                columns['dst_ip'][i] = ip_sort_key(endpoints[1])
+                columns['has_addr'][i] = True
+            except ValueError:
+                pass
         
-        # Zakres czasowy
-        if timeStart or timeEnd:
-            packet_time = datetime.datetime.fromisoformat(packet['time'])
-            
-            if timeStart:
-                start_time = datetime.datetime.fromisoformat(timeStart)
-                if packet_time < start_time:
-                    valid = False
-            
-            if timeEnd:
-                end_time = datetime.datetime.fromisoformat(timeEnd)
-                if packet_time > end_time:
-                    valid = False
+        if 'tcp' in packet:
+            columns['transport'][i] = TRANSPORT_TCP
+            columns['sport'][i] = packet['tcp']['sport']
+            columns['dport'][i] = packet['tcp']['dport']
+            columns['tcp_flags'][i] = sum(TCP_FLAG_BITS.get(flag, 0) for flag in set(packet['tcp']['flags']))
+        elif 'udp' in packet:
+            columns['transport'][i] = TRANSPORT_UDP
+            columns['sport'][i] = packet['udp']['sport']
+            columns['dport'][i] = packet['udp']['dport']
+        
+        if 'dns' in packet:
+            columns['has_dns'][i] = True
+            set_category('dns_qname', i, packet['dns'].get('qname'))
+        
+        set_category('app_protocol', i, get_app_protocol(packet))
+    
+    for name in PACKET_CATEGORY_COLUMNS:
+        columns[name] = codes[name]
+        columns[f'{name}_categories'] = np.array(list(categories[name]), dtype=str)
+    return columns
+
+def save_packet_columns(json_filename, packets):
+    columns = build_packet_columns(packets)
+    write_file_atomic(packet_columns_path(json_filename),
+                      lambda f: np.savez(f, version=PACKET_COLUMNS_VERSION, **columns))
+    return columns
+
+def get_packet_columns(json_filename, packets=None):
+    """
+    Zwraca kolumny pakietów analizy - z pamięci, z pliku .columns.npz lub zbudowane z analizy
+    
+    Args:
+        json_filename (str): Nazwa analizy
+        packets (list, optional): Wczytane już rekordy analizy (użyte, gdy kolumny trzeba zbudować)
+    """
+    cached = _packet_columns_cache.get(json_filename)
+    if cached is not None:
+        return cached
+    
+    columns = None
+    path = packet_columns_path(json_filename)
+    if os.path.exists(path):
+        try:
+            with np.load(path) as npz:
+                if int(npz['version']) == PACKET_COLUMNS_VERSION:
+                    columns = {key: npz[key] for key in npz.files if key != 'version'}
+        except NPZ_READ_ERRORS:
+            # Uszkodzony plik (np. zapis przerwany przed wprowadzeniem zapisu atomowego) - budowany od nowa
+            columns = None
+    
+    if columns is None:
+        columns = save_packet_columns(json_filename, packets if packets is not None else load_analysis(json_filename))
+    
+    return _packet_columns_cache.put(json_filename, columns)
+
+class FilterSyntaxError(ValueError):
+    """Błąd w wyrażeniu filtra (nieznane pole, zła wartość lub składnia)"""
+    
+    def __init__(self, message, position=None):
+        if position is not None:
+            message = f"{message} (position {position + 1})"
+        super().__init__(message)
+        self.position = position
+
+# Pola wyrażeń filtrów: nazwa -> (rodzaj wartości, kolumny, wymagany protokół transportowy)
+# Pole z kilkoma kolumnami (np. ip.addr) pasuje, gdy warunek spełnia którakolwiek z nich
+FILTER_FIELDS = {
+    'ip.src': ('address', ('src_ip',), None),
+    'ip.dst': ('address', ('dst_ip',), None),
+    'ip.addr': ('address', ('src_ip', 'dst_ip'), None),
+    'host': ('address', ('src_ip', 'dst_ip'), None),
+    'eth.src': ('category', ('src_mac',), None),
+    'eth.dst': ('category', ('dst_mac',), None),
+    'eth.addr': ('category', ('src_mac', 'dst_mac'), None),
+    'eth.vendor': ('category', ('src_vendor', 'dst_vendor'), None),
+    'port': ('number', ('sport', 'dport'), None),
+    'srcport': ('number', ('sport',), None),
+    'dstport': ('number', ('dport',), None),
+    'tcp.port': ('number', ('sport', 'dport'), TRANSPORT_TCP),
+    'tcp.srcport': ('number', ('sport',), TRANSPORT_TCP),
+    'tcp.dstport': ('number', ('dport',), TRANSPORT_TCP),
+    'udp.port': ('number', ('sport', 'dport'), TRANSPORT_UDP),
+    'udp.srcport': ('number', ('sport',), TRANSPORT_UDP),
+    'udp.dstport': ('number', ('dport',), TRANSPORT_UDP),
+    'tcp.flags': ('number', ('tcp_flags',), TRANSPORT_TCP),
+    'frame.len': ('number', ('length',), None),
+    'len': ('number', ('length',), None),
+    'frame.time': ('time', ('time',), None),
+    'time': ('time', ('time',), None),
+    'frame.time_relative': ('relative', ('time',), None),
+    'ip.version': ('number', ('ip_version',), None),
+    'ip.proto': ('number', ('ip_proto',), None),
+    'ip.ttl': ('number', ('ttl',), None),
+    'vlan.id': ('number', ('vlan',), None),
+    'vlan': ('number', ('vlan',), None),
+    'app': ('category', ('app_protocol',), None),
+    'app.protocol': ('category', ('app_protocol',), None),
+    'dns.qname': ('category', ('dns_qname',), None)
+}
+FILTER_FIELDS.update({f'tcp.flags.{name}': ('flag', (bit,), TRANSPORT_TCP) for name, bit in {
+    'fin': 0x01, 'syn': 0x02, 'reset': 0x04, 'rst': 0x04, 'push': 0x08, 'psh': 0x08,
+    'ack': 0x10, 'urg': 0x20, 'ece': 0x40, 'cwr': 0x80
+}.items()})
+
+# Kolumny, w których -1 oznacza brak wartości (pakiet bez danej warstwy)
+FILTER_OPTIONAL_COLUMNS = {'sport', 'dport', 'ip_proto', 'ttl', 'vlan'}
+
+# Nazwy protokołów używane jako samodzielne warunki (np. "tcp and not port 22")
+FILTER_PROTOCOLS = {
+    'tcp': lambda c: c['transport'] == TRANSPORT_TCP,
+    'udp': lambda c: c['transport'] == TRANSPORT_UDP,
+    'icmp': lambda c: ((c['ip_version'] == 4) & (c['ip_proto'] == 1)) | ((c['ip_version'] == 6) & (c['ip_proto'] == 58)),
+    'arp': lambda c: c['is_arp'],
+    'ip': lambda c: c['ip_version'] == 4,
+    'ipv6': lambda c: c['ip_version'] == 6,
+    'eth': lambda c: c['has_eth'],
+    'dns': lambda c: c['has_dns'],
+    'vlan': lambda c: c['vlan'] >= 0
+}
+
+FILTER_TOKEN_RE = re.compile(r'\s*(?:(?P<string>"(?:[^"\\]|\\.)*")|(?P<op>==|!=|<=|>=|&&|\|\||[=()<>!])|(?P<word>[A-Za-z0-9_.:/+\-]+))')
+FILTER_KEYWORDS = {'and': '&&', 'or': '||', 'not': '!', 'eq': '==', 'ne': '!=', 'lt': '<', 'le': '<=',
+                   'gt': '>', 'ge': '>=', 'in': 'in', 'contains': 'contains'}
+FILTER_COMPARISONS = {'==', '!=', '<', '<=', '>', '>=', 'in', 'contains'}
+
+def tokenize_filter(text):
+    """Dzieli wyrażenie filtra na tokeny (rodzaj, wartość, pozycja)"""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = FILTER_TOKEN_RE.match(text, position)
+        if not match or match.end() == position:
+            raise FilterSyntaxError(f"Unexpected character '{text[position]}'", position)
+        start = match.start(match.lastgroup)
+        value = match.group(match.lastgroup)
+        if match.lastgroup == 'string':
+            tokens.append(('value', re.sub(r'\\(.)', r'\1', value[1:-1]), start))
+        elif match.lastgroup == 'op':
+            tokens.append(('op', '==' if value == '=' else value, start))
+        elif value.lower() in FILTER_KEYWORDS:
+            tokens.append(('op', FILTER_KEYWORDS[value.lower()], start))
+        else:
+            tokens.append(('word', value, start))
+        position = match.end()
+    return tokens
+
+class FilterParser:
+    """
+    Parser wyrażeń filtrów (składnia zbliżona do filtrów wyświetlania Wiresharka)
+    
+    Gramatyka:
+        wyrażenie := koniunkcja (("or" | "||") koniunkcja)*
+        koniunkcja := negacja (("and" | "&&") negacja)*
+        negacja := ("not" | "!") negacja | "(" wyrażenie ")" | pole [operator wartość]
+    
+    Wynikiem jest drzewo z krotek: ('and', a, b), ('or', a, b), ('not', a),
+    ('cmp', pole, operator, wartość, pozycja) oraz ('test', pole, pozycja).
+    """
+    
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize_filter(text)
+        self.index = 0
+    
+    def peek(self):
+        return self.tokens[self.index] if self.index < len(self.tokens) else (None, None, len(self.text))
+    
+    def advance(self):
+        token = self.peek()
+        self.index += 1
+        return token
+    
+    def parse(self):
+        if not self.tokens:
+            return None
+        node = self.parse_or()
+        kind, value, position = self.peek()
+        if kind is not None:
+            raise FilterSyntaxError(f"Unexpected '{value}'", position)
+        return node
+    
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek()[:2] == ('op', '||'):
+            self.advance()
+            node = ('or', node, self.parse_and())
+        return node
+    
+    def parse_and(self):
+        node = self.parse_not()
+        while self.peek()[:2] == ('op', '&&'):
+            self.advance()
+            node = ('and', node, self.parse_not())
+        return node
+    
+    def parse_not(self):
+        kind, value, position = self.advance()
+        if (kind, value) == ('op', '!'):
+            return ('not', self.parse_not())
+        if (kind, value) == ('op', '('):
+            node = self.parse_or()
+            kind, value, position = self.advance()
+            if (kind, value) != ('op', ')'):
+                raise FilterSyntaxError("Missing ')'", position)
+            return node
+        if kind != 'word':
+            raise FilterSyntaxError('Expected a field name' if kind else 'Unexpected end of expression', position)
+        
+        field = value.lower()
+        operator_kind, operator, _ = self.peek()
+        if operator_kind == 'op' and operator in FILTER_COMPARISONS:
+            self.advance()
+        elif operator_kind in ('word', 'value') and field in FILTER_FIELDS:
+            # Skrócona forma w stylu BPF: "port 53", "host 10.0.0.1"
+            operator = '=='
+        else:
+            return ('test', field, position)
+        
+        value_kind, operand, value_position = self.advance()
+        if value_kind not in ('word', 'value'):
+            raise FilterSyntaxError(f"Expected a value after '{field}'", value_position)
+        return ('cmp', field, operator, operand, position)
+
+@functools.lru_cache(maxsize=256)
+def parse_filter_expression(text):
+    """Parsuje wyrażenie filtra do drzewa (wynik zapamiętywany dla powtarzanych wyrażeń)"""
+    return FilterParser(text).parse()
+
+def parse_number_value(value, position, allow_float=False):
+    """Liczba lub zakres 'od-do' (włącznie) -> (dolna, górna granica)"""
+    parse = float if allow_float else (lambda v: int(v, 16) if v.lower().startswith('0x') else int(v))
+    try:
+        if '-' in value.lstrip('-'):
+            low, high = value.lstrip('-').split('-', 1)
+            low = '-' + low if value.startswith('-') else low
+            return parse(low), parse(high)
+        number = parse(value)
+        return number, number
+    except ValueError:
+        raise FilterSyntaxError(f"Invalid number '{value}'", position)
+
+def parse_address_value(value, position):
+    """Adres IP lub sieć CIDR -> (dolny, górny klucz adresu)"""
+    try:
+        if '/' in value:
+            network = ipaddress.ip_network(value, strict=False)
+            return ip_sort_key(network.network_address), ip_sort_key(network.broadcast_address)
+        key = ip_sort_key(value)
+        return key, key
+    except ValueError:
+        raise FilterSyntaxError(f"Invalid IP address or network '{value}'", position)
+
+def parse_time_value(value, position):
+    """Czas ISO 8601 (czas lokalny, jak w rekordach pakietów) lub znacznik czasu UNIX -> sekundy"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise FilterSyntaxError(f"Invalid time '{value}'", position)
+
+def compile_range_predicate(column_names, operator, low, high, position):
+    """Warunek porównania kolumn liczbowych z wartością lub zakresem"""
+    if operator in ('==', 'in'):
+        test = lambda column: (column >= low) & (column <= high)
+    elif low != high:
+        raise FilterSyntaxError(f"Operator '{operator}' cannot be used with a range", position)
+    elif operator == '<':
+        test = lambda column: column < low
+    elif operator == '<=':
+        test = lambda column: column <= low
+    elif operator == '>':
+        test = lambda column: column > low
+    elif operator == '>=':
+        test = lambda column: column >= low
+    else:
+        raise FilterSyntaxError(f"Operator '{operator}' is not supported here", position)
+    
+    def predicate(columns):
+        mask = None
+        for name in column_names:
+            column = columns[name]
+            matched = test(column)
+            if name in FILTER_OPTIONAL_COLUMNS:
+                matched &= column >= 0
+            mask = matched if mask is None else mask | matched
+        return mask
+    return predicate
+
+def compile_category_predicate(column_names, operator, value, position):
+    """Warunek na kolumnie tekstowej (równość bez rozróżniania wielkości liter lub 'contains')"""
+    if operator not in ('==', 'contains'):
+        raise FilterSyntaxError(f"Operator '{operator}' is not supported for text fields", position)
+    value = value.lower()
+    if column_names[0].endswith('_mac'):
+        value = value.replace('-', ':')
+    
+    def predicate(columns):
+        mask = None
+        for name in column_names:
+            categories = np.char.lower(columns[f'{name}_categories'])
+            if operator == 'contains':
+                matched_codes = np.flatnonzero(np.char.find(categories, value) >= 0)
+            else:
+                matched_codes = np.flatnonzero(categories == value)
+            matched = np.isin(columns[name], matched_codes)
+            mask = matched if mask is None else mask | matched
+        return mask
+    return predicate
+
+def compile_comparison(field, operator, value, position):
+    """Kompiluje pojedynczy warunek 'pole operator wartość' do funkcji kolumny -> maska"""
+    if field not in FILTER_FIELDS:
+        raise FilterSyntaxError(f"Unknown field '{field}'", position)
+    kind, column_names, transport = FILTER_FIELDS[field]
+    
+    # Nierówność jako zaprzeczenie równości - "ip.addr != X" odrzuca pakiety z X po dowolnej stronie
+    if operator == '!=':
+        inner = compile_comparison(field, '==', value, position)
+        return lambda columns: ~inner(columns)
+    
+    if kind == 'address':
+        if operator not in ('==', 'in'):
+            raise FilterSyntaxError(f"Operator '{operator}' is not supported for addresses", position)
+        low, high = parse_address_value(value, position)
+        
+        def predicate(columns):
+            mask = None
+            for name in column_names:
+                matched = (columns[name] >= low) & (columns[name] <= high)
+                mask = matched if mask is None else mask | matched
+            return mask & columns['has_addr']
+    elif kind == 'number':
+        low, high = parse_number_value(value, position)
+        predicate = compile_range_predicate(column_names, operator, low, high, position)
+    elif kind == 'time':
+        if '..' in value:
+            low, high = (parse_time_value(part, position) for part in value.split('..', 1))
+        else:
+            low = high = parse_time_value(value, position)
+        predicate = compile_range_predicate(column_names, operator, low, high, position)
+    elif kind == 'relative':
+        low, high = parse_number_value(value, position, allow_float=True)
+        range_predicate = compile_range_predicate(('relative_time',), operator, low, high, position)
+        
+        def predicate(columns):
+            times = columns['time']
+            start = times.min() if len(times) else 0.0
+            return range_predicate({'relative_time': times - start})
+    elif kind == 'flag':
+        expected, _ = parse_number_value(value, position)
+        if operator != '==' or expected not in (0, 1):
+            raise FilterSyntaxError(f"Flag '{field}' can only be compared with 0 or 1", position)
+        bit = column_names[0]
+        predicate = lambda columns: ((columns['tcp_flags'] & bit) != 0) == bool(expected)
+    else:
+        predicate = compile_category_predicate(column_names, operator, value, position)
+    
+    if transport is None:
+        return predicate
+    return lambda columns: predicate(columns) & (columns['transport'] == transport)
+
+def compile_filter_node(node):
+    """Kompiluje drzewo wyrażenia do funkcji zwracającej maskę pakietów spełniających filtr"""
+    kind = node[0]
+    if kind in ('and', 'or'):
+        left, right = compile_filter_node(node[1]), compile_filter_node(node[2])
+        if kind == 'and':
+            return lambda columns: left(columns) & right(columns)
+        return lambda columns: left(columns) | right(columns)
+    if kind == 'not':
+        inner = compile_filter_node(node[1])
+        return lambda columns: ~inner(columns)
+    if kind == 'test':
+        field, position = node[1], node[2]
+        if field in FILTER_PROTOCOLS:
+            return FILTER_PROTOCOLS[field]
+        if field in FILTER_FIELDS and FILTER_FIELDS[field][0] == 'flag':
+            return compile_comparison(field, '==', '1', position)
+        raise FilterSyntaxError(f"Unknown protocol or flag '{field}'", position)
+    return compile_comparison(*node[1:])
+
+# Wartości pola "Protokół" formularza filtrów jako warunki wyrażeń
+FILTER_FORM_PROTOCOLS = {
+    'TCP': ('test', 'tcp', None),
+    'UDP': ('test', 'udp', None),
+    'ICMP': ('test', 'icmp', None),
+    'ARP': ('test', 'arp', None),
+    'Inne': ('not', ('or', ('or', ('test', 'tcp', None), ('test', 'udp', None)),
+                     ('or', ('test', 'icmp', None), ('test', 'arp', None))))
+}
+
+def filter_params_to_node(filter_params):
+    """
+    Łączy pola formularza filtrów i wyrażenie filtra w jedno drzewo (koniunkcja warunków)
+    
+    Adresy IP są porównywane dokładnie lub jako sieć CIDR, adresy MAC częściowo
+    (jak dotychczas), port może być zakresem (np. 1000-2000).
+    """
+    nodes = []
+    
+    def add(field, operator, value):
+        value = str(value).strip()
+        if value:
+            nodes.append(('cmp', field, operator, value, None))
+    
+    add('ip.src', '==', filter_params.get('Source IP', ''))
+    add('ip.dst', '==', filter_params.get('Destination IP', ''))
+    add('eth.src', 'contains', filter_params.get('Source MAC', ''))
+    add('eth.dst', 'contains', filter_params.get('Destination MAC', ''))
+    
+    protocol = filter_params.get('Protocol', '')
+    if protocol in FILTER_FORM_PROTOCOLS:
+        nodes.append(FILTER_FORM_PROTOCOLS[protocol])
+    elif protocol:
+        # Etykiety w formacie IP(<numer protokołu>)
+        match = re.fullmatch(r'IP\((\d+)\)', protocol)
+        if not match:
+            raise FilterSyntaxError(f"Unknown protocol '{protocol}'")
+        add('ip.proto', '==', match.group(1))
+    
+    add('app', '==', filter_params.get('Application Protocol', ''))
+    add('port', '==', filter_params.get('Port', ''))
+    add('frame.len', '>=', filter_params.get('Min Length', ''))
+    add('frame.len', '<=', filter_params.get('Max Length', ''))
+    add('frame.time', '>=', filter_params.get('Start Time', ''))
+    add('frame.time', '<=', filter_params.get('End Time', ''))
+    
+    expression = parse_filter_expression(filter_params.get('Expression', '').strip())
+    if expression is not None:
+        nodes.append(expression)
+    
+    if not nodes:
+        return None
+    return functools.reduce(lambda left, right: ('and', left, right), nodes)
+
+def compile_filter(filter_params):
+    """
+    Kompiluje parametry filtrowania do funkcji kolumny pakietów -> maska logiczna
+    
+    Raises:
+        FilterSyntaxError: Gdy wyrażenie lub któreś z pól formularza jest niepoprawne
+    """
+    node = filter_params_to_node(filter_params)
+    if node is None:
+        return lambda columns: np.ones(len(columns['time']), dtype=bool)
+    return compile_filter_node(node)
+
+def normalize_filter_node(node):
+    """Drzewo wyrażenia bez pozycji w tekście - ten sam filtr zapisany inaczej daje ten sam klucz"""
+    if node is None:
+        return None
+    if node[0] in ('and', 'or'):
+        return (node[0], normalize_filter_node(node[1]), normalize_filter_node(node[2]))
+    if node[0] == 'not':
+        return ('not', normalize_filter_node(node[1]))
+    return node[:-1]
+
+def filter_cache_key(json_filename, filter_params):
+    """Klucz wyniku filtra: analiza, niepuste pola formularza i znormalizowane wyrażenie"""
+    fields = tuple(sorted(
+        (name, str(value).strip()) for name, value in filter_params.items()
+        if name != 'Expression' and str(value).strip()
+    ))
+    expression = parse_filter_expression(filter_params.get('Expression', '').strip())
+    return (json_filename, fields, normalize_filter_node(expression))
+
+class FilterResultCache:
+    """
+    Pamięć podręczna wyników filtrów (indeksy pasujących pakietów) typu LRU
+    
+    Rozmiar jest liczony w bajtach tablic indeksów - przy przekroczeniu limitu
+    (FILTER_CACHE_MAX_BYTES) usuwane są najdawniej używane wyniki.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, json_filename, filter_params):
+        """Zwraca indeksy pakietów spełniających filtr - z pamięci lub wyznaczone na kolumnach pakietów"""
+        key = filter_cache_key(json_filename, filter_params)
+        with self._lock:
+            indices = self._entries.get(key)
+            if indices is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return indices
+            self.misses += 1
+        
+        predicate = compile_filter(filter_params)
+        indices = np.flatnonzero(predicate(get_packet_columns(json_filename))).astype(np.uint32)
+        indices.flags.writeable = False
+        
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = indices
+                self.size += indices.nbytes
+            while self.size > app.config['FILTER_CACHE_MAX_BYTES'] and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.nbytes
+        return indices
+
+filter_results = FilterResultCache()
+
+def select_packet_indices(json_filename, filter_params):
+    """Zwraca indeksy (od 0) pakietów analizy spełniających filtr"""
+    return filter_results.get(json_filename, filter_params)
+
+def packet_columns_ready(json_filename):
+    """Czy kolumny pakietów są dostępne bez wczytywania analizy (w pamięci lub w pliku .columns.npz)"""
+    return _packet_columns_cache.get(json_filename) is not None or os.path.exists(packet_columns_path(json_filename))
+
+def request_packet_indices(json_filename, filter_params):
+    """
+    Indeksy pakietów dla zadania zgłaszanego przez żądanie
+    
+    Gdy kolumny pakietów nie są jeszcze zbudowane, zwraca None - filtr wyznacza wtedy zadanie
+    w procesie roboczym (resolve_packet_indices), a wątek serwera nie wczytuje całej analizy.
+    """
+    if packet_columns_ready(json_filename):
+        return select_packet_indices(json_filename, filter_params)
+    return None
+
+def resolve_packet_indices(json_filename, filter_params, packet_indices):
+    """Indeksy wyznaczone przez serwer albo - gdy ich nie przekazano - wyznaczone w zadaniu"""
+    if packet_indices is None:
+        packet_indices = select_packet_indices(json_filename, filter_params)
+    return packet_indices
+
+# Kostka agregatów (rollup) - liczby pakietów i bajtów w przekrojach
+# (bucket czasu × protokół aplikacyjny × podsieć źródłowa × podsieć docelowa × klasa portu)
+ROLLUP_VERSION = 2
+ROLLUP_DIMENSIONS = ('time', 'protocol', 'src_net', 'dst_net', 'port_class')
+ROLLUP_PORT_CLASSES = ['none', 'well-known', 'registered', 'dynamic']
+# Szerokości bucketów czasu (s) - wybierana najmniejsza, przy której kostka ma co najwyżej ROLLUP_MAX_BUCKETS bucketów
+ROLLUP_BUCKET_WIDTHS = [1, 10, 60, 600, 3600, 86400]
+ROLLUP_MAX_BUCKETS = 3600
+# Długości prefiksów podsieci w kostce (IPv4 / IPv6)
+ROLLUP_PREFIX_V4 = 24
+ROLLUP_PREFIX_V6 = 64
+
+# Ostatnio używane kostki (nazwa analizy -> tablice)
+_rollup_cache = LRUCache('ROLLUP_CACHE_SIZE')
+
+def rollup_path(json_filename):
+    base = os.path.splitext(json_filename)[0]
+    return os.path.join(app.config['JSON_FOLDER'], f"{base}.rollup.npz")
+
+def subnet_keys(keys):
+    """Zeruje bity hosta w 16-bajtowych kluczach adresów (IPv4 -> /24, IPv6 -> /64)"""
+    raw = keys.view(np.uint8).reshape(-1, 16).copy()
+    is_v4 = np.all(raw[:, :12] == np.frombuffer(IPV4_MAPPED_PREFIX, dtype=np.uint8), axis=1)
+    raw[is_v4, 12 + ROLLUP_PREFIX_V4 // 8:] = 0
+    raw[~is_v4, ROLLUP_PREFIX_V6 // 8:] = 0
+    return raw.view('S16').ravel()
+
+def format_subnet_key(key):
+    """Klucz podsieci -> zapis CIDR (np. 192.168.1.0/24)"""
+    key = key.ljust(16, b'\x00')
+    if key.startswith(IPV4_MAPPED_PREFIX):
+        return f"{ipaddress.IPv4Address(key[12:])}/{ROLLUP_PREFIX_V4}"
+    return f"{ipaddress.IPv6Address(key)}/{ROLLUP_PREFIX_V6}"
+
+def build_rollup_cube(columns):
+    """
+    Buduje rzadką kostkę agregatów z kolumn pakietów
+    
+    Zapisywane są tylko niepuste komórki: współrzędne w każdym wymiarze oraz liczba pakietów i bajtów.
+    
+    Args:
+        columns (dict): Kolumny pakietów (build_packet_columns)
+    
+    Returns:
+        dict: Tablice numpy gotowe do zapisu przez np.savez_compressed
+    """
+    times = columns['time']
+    t0 = float(times.min()) if len(times) else 0.0
+    span = float(times.max()) - t0 if len(times) else 0.0
+    width = next((w for w in ROLLUP_BUCKET_WIDTHS if span / w < ROLLUP_MAX_BUCKETS), ROLLUP_BUCKET_WIDTHS[-1])
+    buckets = np.floor((times - t0) / width).astype(np.int64)
+    
+    # Protokół aplikacyjny jako kod APP_PROTOCOLS (jak w piramidzie szeregów czasowych); -1 = Unknown
+    names = columns['app_protocol_categories'].tolist() + ['Unknown']
+    protocol = np.array([APP_PROTOCOL_CODES.get(name, APP_PROTOCOL_CODES['Unknown']) for name in names],
+                        dtype=np.int64)[columns['app_protocol']]
+    
+    # Podsieci jako kody wspólnego słownika; -1 = pakiet bez adresu IP
+    has_addr = columns['has_addr']
+    src_subnets, dst_subnets = subnet_keys(columns['src_ip']), subnet_keys(columns['dst_ip'])
+    networks, inverse = np.unique(np.concatenate([src_subnets[has_addr], dst_subnets[has_addr]]),
+                                  return_inverse=True)
+    src_net = np.full(len(times), -1, dtype=np.int64)
+    dst_net = np.full(len(times), -1, dtype=np.int64)
+    src_net[has_addr] = inverse[:has_addr.sum()]
+    dst_net[has_addr] = inverse[has_addr.sum():]
+    
+    # Klasa portu usługi (mniejszy z portów pakietu)
+    ports = np.where((columns['sport'] >= 0) & (columns['dport'] >= 0),
+                     np.minimum(columns['sport'], columns['dport']), -1)
+    port_class = np.select([ports < 0, ports < 1024, ports < 49152], [0, 1, 2], default=3)
+    
+    coordinates = np.stack([buckets, protocol, src_net, dst_net, port_class], axis=1)
+    if len(coordinates):
+        cells, cell_index = np.unique(coordinates, axis=0, return_inverse=True)
+        cell_index = cell_index.ravel()
+    else:
+        cells, cell_index = np.zeros((0, len(ROLLUP_DIMENSIONS)), dtype=np.int64), np.zeros(0, dtype=np.int64)
+    
+    return {
+        'version': np.array(ROLLUP_VERSION),
+        't0': np.array(t0),
+        'width': np.array(float(width)),
+        'networks': np.array([format_subnet_key(key) for key in networks.tolist()], dtype=str),
+        'protocols': np.array(APP_PROTOCOLS),
+        'time': cells[:, 0].astype(np.int32),
+        'protocol': cells[:, 1].astype(np.uint8),
+        'src_net': cells[:, 2].astype(np.int32),
+        'dst_net': cells[:, 3].astype(np.int32),
+        'port_class': cells[:, 4].astype(np.uint8),
+        'packets': np.bincount(cell_index, minlength=len(cells)).astype(np.int64),
+        'bytes': np.bincount(cell_index, weights=columns['length'], minlength=len(cells)).astype(np.int64)
+    }
+
+def save_rollup_cube(json_filename, columns):
+    cube = build_rollup_cube(columns)
+    write_file_atomic(rollup_path(json_filename), lambda f: np.savez_compressed(f, **cube))
+    return cube
+
+def get_rollup_cube(json_filename):
+    """Zwraca kostkę analizy z pamięci, z pliku lub - dla starszych analiz - buduje ją z kolumn pakietów"""
+    cached = _rollup_cache.get(json_filename)
+    if cached is not None:
+        return cached
+    
+    cube = None
+    path = rollup_path(json_filename)
+    if os.path.exists(path):
+        try:
+            with np.load(path) as npz:
+                if int(npz['version']) == ROLLUP_VERSION:
+                    cube = {key: npz[key] for key in npz.files}
+        except NPZ_READ_ERRORS:
+            cube = None
+    
+    if cube is None:
+        cube = save_rollup_cube(json_filename, get_packet_columns(json_filename))
+    
+    return _rollup_cache.put(json_filename, cube)
+
+def rollup_labels(cube, dimension, codes):
+    """Zamienia kody wymiaru kostki na etykiety"""
+    if dimension == 'time':
+        return (float(cube['t0']) + codes * float(cube['width'])).tolist()
+    if dimension == 'protocol':
+        protocols = cube['protocols']
+        return [str(protocols[code]) for code in codes.tolist()]
+    if dimension == 'port_class':
+        return [ROLLUP_PORT_CLASSES[code] for code in codes.tolist()]
+    networks = cube['networks']
+    return [str(networks[code]) if code >= 0 else None for code in codes.tolist()]
+
+def network_codes(cube, value):
+    """Kody podsieci kostki zawartych w podanym adresie/sieci (np. 10.0.0.0/8 lub 192.168.1.5)"""
+    try:
+        wanted = ipaddress.ip_network(value, strict=False)
+    except ValueError:
+        raise ValueError(f'Invalid network: {value}')
+    
+    codes = []
+    for code, network in enumerate(cube['networks'].tolist()):
+        network = ipaddress.ip_network(network)
+        if network.version == wanted.version and (network.subnet_of(wanted) or wanted.subnet_of(network)):
+            codes.append(code)
+    return codes
+
+def query_rollup(cube, start=None, end=None, protocol=None, src_net=None, dst_net=None, port_class=None,
+                 group_by=(), limit=50):
+    """
+    Agreguje komórki kostki dla wybranego przekroju
+    
+    Args:
+        cube (dict): Tablice kostki
+        start, end (float, optional): Okno czasowe (epoch, s), z dokładnością do szerokości bucketu
+        protocol (str, optional): Protokół aplikacyjny (APP_PROTOCOLS, np. TCP, DNS, HTTPS)
+        src_net, dst_net (str, optional): Adres lub sieć CIDR (pasują podsieci kostki w niej zawarte)
+        port_class (str, optional): none / well-known / registered / dynamic
+        group_by (tuple): Wymiary grupowania (puste - tylko sumy)
+        limit (int): Maks. liczba zwracanych grup (największe wg liczby pakietów)
+    
+    Returns:
+        dict: Sumy przekroju i lista grup z liczbą pakietów i bajtów
+    
+    Raises:
+        ValueError: Dla nieznanej wartości wymiaru
+    """
+    width = float(cube['width'])
+    mask = np.ones(len(cube['packets']), dtype=bool)
+    
+    if start is not None:
+        mask &= cube['time'] >= int(np.floor((start - float(cube['t0'])) / width))
+    if end is not None:
+        mask &= cube['time'] <= int(np.floor((end - float(cube['t0'])) / width))
+    if protocol:
+        protocols = cube['protocols'].tolist()
+        if protocol not in protocols:
+            raise ValueError(f'Unknown protocol: {protocol}')
+        mask &= cube['protocol'] == protocols.index(protocol)
+    if port_class:
+        if port_class not in ROLLUP_PORT_CLASSES:
+            raise ValueError(f'Unknown port class: {port_class}')
+        mask &= cube['port_class'] == ROLLUP_PORT_CLASSES.index(port_class)
+    if src_net:
+        mask &= np.isin(cube['src_net'], network_codes(cube, src_net))
+    if dst_net:
+        mask &= np.isin(cube['dst_net'], network_codes(cube, dst_net))
+    
+    packets, byte_counts = cube['packets'][mask], cube['bytes'][mask]
+    result = {
+        'bucket_width': width,
+        'cells': int(mask.sum()),
+        'totals': {'packets': int(packets.sum()), 'bytes': int(byte_counts.sum())}
+    }
+    
+    if group_by:
+        for dimension in group_by:
+            if dimension not in ROLLUP_DIMENSIONS:
+                raise ValueError(f'Unknown dimension: {dimension}')
+        
+        coordinates = np.stack([cube[dimension][mask].astype(np.int64) for dimension in group_by], axis=1)
+        if len(coordinates):
+            groups, group_index = np.unique(coordinates, axis=0, return_inverse=True)
+            group_index = group_index.ravel()
+        else:
+            groups, group_index = np.zeros((0, len(group_by)), dtype=np.int64), np.zeros(0, dtype=np.int64)
+        group_packets = np.bincount(group_index, weights=packets, minlength=len(groups)).astype(np.int64)
+        group_bytes = np.bincount(group_index, weights=byte_counts, minlength=len(groups)).astype(np.int64)
         
-        # Jeśli pakiet przeszedł wszystkie filtry, dodaj go do listy
-        if valid:
-            filtered.append(packet)
+        # Grupowanie po samym czasie zwraca pełną serię, pozostałe - największe grupy
+        if tuple(group_by) == ('time',):
+            order = np.arange(len(groups))
+        else:
+            order = np.argsort(-group_packets, kind='stable')[:limit]
+        
+        labels = {dimension: rollup_labels(cube, dimension, groups[order, i]) for i, dimension in enumerate(group_by)}
+        result['group_by'] = list(group_by)
+        result['groups'] = [
+            {**{dimension: labels[dimension][row] for dimension in group_by},
+             'packets': int(group_packets[position]), 'bytes': int(group_bytes[position])}
+            for row, position in enumerate(order.tolist())
+        ]
+        result['total_groups'] = len(groups)
+    
+    return result
+
+def format_ip_key(key):
+    """Klucz adresu (ip_sort_key) -> zapis tekstowy adresu"""
+    key = key.ljust(16, b'\x00')
+    if key.startswith(IPV4_MAPPED_PREFIX):
+        return str(ipaddress.IPv4Address(key[12:]))
+    return str(ipaddress.IPv6Address(key))
+
+TRAFFIC_MATRIX_METRICS = ('bytes', 'packets')
+TRAFFIC_MATRIX_LEVELS = ('auto', 'host', 'subnet')
+
+# Ostatnio używane macierze ruchu (nazwa analizy -> TrafficMatrix)
+_traffic_matrix_cache = LRUCache('TRAFFIC_MATRIX_CACHE_SIZE')
+
+class TrafficMatrix:
+    """
+    Rzadka macierz ruchu źródło × cel (bajty i pakiety) w formacie CSR
+    
+    Adresy są kodowane liczbami całkowitymi - indeksami w posortowanej tablicy 16-bajtowych
+    kluczy (ip_sort_key), więc wiersz/kolumnę hosta znajduje wyszukiwanie binarne. Macierz
+    powstaje z par (źródło, cel) wszystkich pakietów jako COO, a konwersja do CSR sumuje
+    powtórzenia. Wiersz to ruch wysłany przez hosta, kolumna (przez kopię CSC) - odebrany.
+    """
+    
+    def __init__(self, keys, bytes_matrix, packets_matrix, format_key=format_ip_key):
+        self.keys = keys
+        self.bytes = bytes_matrix.tocsr()
+        self.packets = packets_matrix.tocsr()
+        self.format_key = format_key
+        self._columns = None
+        self._subnets = None
+    
+    @classmethod
+    def from_columns(cls, columns):
+        """Buduje macierz z kolumn pakietów (pakiety bez adresów IP/ARP są pomijane)"""
+        from scipy import sparse
+        
+        has_addr = columns['has_addr']
+        src = columns['src_ip'][has_addr]
+        dst = columns['dst_ip'][has_addr]
+        keys, codes = np.unique(np.concatenate([src, dst]), return_inverse=True)
+        rows, cols = codes[:len(src)], codes[len(src):]
+        shape = (len(keys), len(keys))
+        
+        bytes_matrix = sparse.coo_matrix((columns['length'][has_addr].astype(np.int64), (rows, cols)), shape=shape)
+        packets_matrix = sparse.coo_matrix((np.ones(len(src), dtype=np.int64), (rows, cols)), shape=shape)
+        return cls(keys, bytes_matrix, packets_matrix)
+    
+    def __len__(self):
+        return len(self.keys)
+    
+    def matrix(self, metric):
+        return self.bytes if metric == 'bytes' else self.packets
+    
+    def subnets(self):
+        """Macierz zagregowana do podsieci (IPv4 /24, IPv6 /64): S^T · M · S, gdzie S to przynależność hostów"""
+        if self._subnets is None:
+            from scipy import sparse
+            
+            subnet_keys_, groups = np.unique(subnet_keys(self.keys), return_inverse=True)
+            membership = sparse.csr_matrix(
+                (np.ones(len(self.keys), dtype=np.int64), (np.arange(len(self.keys)), groups)),
+                shape=(len(self.keys), len(subnet_keys_))
+            )
+            self._subnets = TrafficMatrix(
+                subnet_keys_,
+                membership.T @ self.bytes @ membership,
+                membership.T @ self.packets @ membership,
+                format_key=format_subnet_key
+            )
+        return self._subnets
+    
+    def index_of(self, address):
+        """Indeks hosta w macierzy albo None (ValueError dla niepoprawnego adresu)"""
+        key = np.array([ip_sort_key(address)], dtype='S16')
+        position = int(np.searchsorted(self.keys, key)[0])
+        if position < len(self.keys) and self.keys[position] == key[0]:
+            return position
+        return None
+    
+    def _peer_list(self, matrices, i, limit):
+        # Niezerowe elementy wiersza (CSR) lub kolumny (CSC) wprost z tablic indptr/indices
+        bytes_matrix, packets_matrix = matrices
+        start, end = bytes_matrix.indptr[i], bytes_matrix.indptr[i + 1]
+        peers = bytes_matrix.indices[start:end]
+        values = bytes_matrix.data[start:end]
+        packets = packets_matrix.data[packets_matrix.indptr[i]:packets_matrix.indptr[i + 1]]
+        order = np.argsort(-values, kind='stable')[:limit]
+        return {
+            'bytes': int(values.sum()),
+            'packets': int(packets.sum()),
+            'peers_total': len(peers),
+            'peers': [{'peer': self.format_key(self.keys[peers[j]]), 'bytes': int(values[j]), 'packets': int(packets[j])}
+                      for j in order.tolist()]
+        }
+    
+    def peers(self, address, limit=20):
+        """
+        Z kim komunikuje się host: ruch wysłany (wiersz macierzy) i odebrany (kolumna)
+        
+        Args:
+            address (str): Adres IP hosta
+            limit (int): Maks. liczba partnerów w każdym kierunku (najwięcej bajtów)
+        
+        Returns:
+            dict: Sumy i lista partnerów dla ruchu wysłanego i odebranego albo None, gdy hosta nie ma w analizie
+        """
+        i = self.index_of(address)
+        if i is None:
+            return None
+        
+        if self._columns is None:
+            self._columns = (self.bytes.tocsc(), self.packets.tocsc())
+        
+        return {
+            'host': self.format_key(self.keys[i]),
+            'sent': self._peer_list((self.bytes, self.packets), i, limit),
+            'received': self._peer_list(self._columns, i, limit)
+        }
+    
+    def heatmap(self, size, metric='bytes'):
+        """
+        Fragment macierzy do mapy cieplnej: size najaktywniejszych węzłów na obu osiach
+        
+        Returns:
+            dict: Etykiety, wartości (lista wierszy: źródło -> cel) i udział pokazanego ruchu
+        """
+        matrix = self.matrix(metric)
+        activity = np.asarray(matrix.sum(axis=1)).ravel() + np.asarray(matrix.sum(axis=0)).ravel()
+        top = np.sort(np.argsort(-activity, kind='stable')[:size])
+        values = matrix[top][:, top].toarray()
+        total = int(matrix.sum())
+        
+        return {
+            'metric': metric,
+            'labels': [self.format_key(key) for key in self.keys[top]],
+            'values': values.tolist(),
+            'total_nodes': len(self.keys),
+            'shown_nodes': len(top),
+            'coverage': float(values.sum() / total) if total else 0.0
+        }
+
+def get_traffic_matrix(json_filename):
+    """Zwraca macierz ruchu analizy z pamięci lub zbudowaną z kolumn pakietów"""
+    cached = _traffic_matrix_cache.get(json_filename)
+    if cached is not None:
+        return cached
+    
+    return _traffic_matrix_cache.put(json_filename, TrafficMatrix.from_columns(get_packet_columns(json_filename)))
+
+def traffic_heatmap(json_filename, size=None, metric='bytes', level='auto'):
+    """
+    Mapa cieplna ruchu hostów, a przy większej liczbie hostów niż size - podsieci
+    
+    Args:
+        json_filename (str): Nazwa analizy
+        size (int, optional): Maks. liczba wierszy/kolumn (domyślnie TRAFFIC_MATRIX_HEATMAP_SIZE)
+        metric (str): 'bytes' lub 'packets'
+        level (str): 'auto', 'host' lub 'subnet'
+    """
+    if metric not in TRAFFIC_MATRIX_METRICS:
+        raise ValueError(f'Unknown metric: {metric}')
+    if level not in TRAFFIC_MATRIX_LEVELS:
+        raise ValueError(f'Unknown level: {level}')
+    size = size or app.config['TRAFFIC_MATRIX_HEATMAP_SIZE']
+    
+    matrix = get_traffic_matrix(json_filename)
+    if level == 'subnet' or (level == 'auto' and len(matrix) > size):
+        level = 'subnet'
+        matrix = matrix.subnets()
+    else:
+        level = 'host'
     
-    return filtered
+    result = matrix.heatmap(size, metric)
+    result['level'] = level
+    return result
 
 # Generowanie raportu PDF
 @app.route('/generate_report/<filename>')
 def generate_report(filename):
    try:
-       file_path = os.path.join(app.config['JSON_FOLDER'], filename)
-       
-       if not os.path.exists(file_path):
+       if not analysis_exists(filename):
            flash('Plik nie istnieje')
            return redirect(url_for('index'))
        
@@ -1675,21 +6722,27 @@ def generate_report(filename):
        options = request.args.getlist('options[]')
        
        if not options:
-           options = ['summary', 'protocols', 'ports', 'mac_addresses', 'mac_vendors', 'time', 'packet_size', 'network', 'mac_network', 'top_ips']
-       
-       # Wczytaj dane
-       with open(file_path, 'r', encoding='utf-8') as f:
-           data = json.load(f)
-       
-       # Generowanie rozszerzonych statystyk
-       stats = generate_extended_stats(data)
+           options = REPORT_DEFAULT_OPTIONS
        
-       # Generowanie raportu PDF
-       report_filename = generate_pdf_report(filename, data, stats, options)
+       # Identyczny raport (ta sama analiza i opcje) jest pobierany bez ponownego generowania
+       options = sorted(set(options))
+       fingerprint = report_fingerprint(filename, 'report', options)
+       report_filename = find_report(fingerprint)
+       if report_filename:
+           return cached_report_response(report_filename)
        
-       # Przekierowanie do pobrania wygenerowanego pliku PDF
-       return redirect(url_for('download_report', filename=report_filename))
+       # Generowanie raportu PDF w procesie roboczym - przeglądarka czeka na stronie postępu,
+       # która po zakończeniu zadania pobiera plik PDF
+       job_id = jobs.submit('report', run_report, filename, options, fingerprint, key=fingerprint)
+       if wants_job_handle():
+           return job_accepted_response(job_id)
+       return job_progress_page(job_id, 'Generowanie raportu PDF', url_for('view_json', filename=filename))
    
+   except JobRejected:
+       if wants_job_handle():
+           return job_rejected_response('report')
+       flash('Serwer jest zajęty generowaniem innych raportów - spróbuj ponownie za chwilę')
+       return redirect(url_for('view_json', filename=filename))
    except Exception as e:
        flash(f'Błąd podczas generowania raportu: {str(e)}')
        return redirect(url_for('view_json', filename=filename))
@@ -1705,43 +6758,21 @@ def download_report(filename):
 @app.route('/export_csv/<filename>')
 def export_csv(filename):
     try:
-        file_path = os.path.join(app.config['JSON_FOLDER'], filename)
-        
-        if not os.path.exists(file_path):
+        if not analysis_exists(filename):
             flash('Plik nie istnieje')
             return redirect(url_for('index'))
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Konwersja do DataFrame
-        df_data = []
-        for packet in data:
-            row = {
-                'Packet_Number': packet.get('packet_number', ''),
-                'Time': packet.get('time', ''),
-                'Length': packet.get('length', ''),
-                'Source_MAC': packet.get('ethernet', {}).get('src', ''),
-                'Destination_MAC': packet.get('ethernet', {}).get('dst', ''),
-                'Source_IP': packet.get('ip', {}).get('src', ''),
-                'Destination_IP': packet.get('ip', {}).get('dst', ''),
-                'Protocol': 'TCP' if 'tcp' in packet else 'UDP' if 'udp' in packet else 'Other',
-                'Source_Port': packet.get('tcp', packet.get('udp', {})).get('sport', ''),
-                'Destination_Port': packet.get('tcp', packet.get('udp', {})).get('dport', ''),
-            }
-            df_data.append(row)
-        
-        df = pd.DataFrame(df_data)
-        
-        # Utworzenie pliku CSV
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        csv_filename = f"packets_export_{timestamp}.csv"
-        csv_path = os.path.join(app.config['UPLOAD_FOLDER'], csv_filename)
-        
-        df.to_csv(csv_path, index=False, encoding='utf-8')
-        
-        return send_from_directory(app.config['UPLOAD_FOLDER'], csv_filename, as_attachment=True)
+        # Eksport w procesie roboczym - przeglądarka czeka na stronie postępu i pobiera plik po zakończeniu
+        job_id = jobs.submit('csv', run_csv_export, filename)
+        if wants_job_handle():
+            return job_accepted_response(job_id)
+        return job_progress_page(job_id, 'Eksport CSV', url_for('view_json', filename=filename))
         
+    except JobRejected:
+        if wants_job_handle():
+            return job_rejected_response('csv')
+        flash('Serwer jest zajęty innymi eksportami - spróbuj ponownie za chwilę')
+        return redirect(url_for('view_json', filename=filename))
     except Exception as e:
         flash(f'Błąd podczas eksportu CSV: {str(e)}')
         return redirect(url_for('view_json', filename=filename))
@@ -1749,42 +6780,27 @@ def export_csv(filename):
 @app.route('/generate_filtered_report/<filename>', methods=['POST'])
 def generate_filtered_report(filename):
     try:
-        file_path = os.path.join(app.config['JSON_FOLDER'], filename)
-        
-        if not os.path.exists(file_path):
+        if not analysis_exists(filename):
             return jsonify({'error': 'File not found'}), 404
         
-        # Pobierz dane JSON
-        with open(file_path, 'r', encoding='utf-8') as f:
-            all_packets = json.load(f)
-        
         # Pobierz parametry filtrowania z zapytania POST
-        filter_params = {
-            'Source IP': request.json.get('srcIp', ''),
-            'Destination IP': request.json.get('dstIp', ''),
-            'Source MAC': request.json.get('srcMac', ''),
-            'Destination MAC': request.json.get('dstMac', ''),
-            'Protocol': request.json.get('protocol', ''),
-            'Port': request.json.get('port', ''),
-            'Min Length': request.json.get('lengthMin', ''),
-            'Max Length': request.json.get('lengthMax', ''),
-            'Start Time': request.json.get('timeStart', ''),
-            'End Time': request.json.get('timeEnd', '')
-        }
-        
-        # Filtrowanie pakietów według parametrów
-        filtered_packets = filter_packets(all_packets, filter_params)
-        
-        # Generowanie raportu
-        report_filename = generate_filtered_packets_report(filename, filtered_packets, filter_params)
-        
-        # Zwracanie ścieżki do wygenerowanego raportu
-        return jsonify({
-            'success': True,
-            'message': 'Report generated successfully',
-            'report_url': url_for('download_report', filename=report_filename)
-        })
-        
+        filter_params = filter_params_from_request(request.json)
+        
+        fingerprint = report_fingerprint(filename, 'filtered_report', filter_params)
+        report_filename = find_report(fingerprint)
+        if report_filename:
+            return jsonify({'success': True, 'cached': True,
+                            'report_url': url_for('download_report', filename=report_filename)})
+        
+        # Wynik filtra z pamięci podręcznej (wspólnej z eksportami), raport w procesie roboczym
+        packet_indices = request_packet_indices(filename, filter_params)
+        return job_accepted_response(jobs.submit('filtered_report', run_filtered_report, filename, filter_params,
+                                                 fingerprint, packet_indices, key=fingerprint))
+        
+    except FilterSyntaxError as e:
+        return jsonify({'error': str(e)}), 400
+    except JobRejected:
+        return job_rejected_response('filtered_report')
     except Exception as e:
         app.logger.error(f"Error generating filtered report: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -1793,76 +6809,94 @@ def generate_filtered_report(filename):
 @app.route('/export_filtered_csv/<filename>', methods=['POST'])
 def export_filtered_csv(filename):
     try:
-        file_path = os.path.join(app.config['JSON_FOLDER'], filename)
+        if not analysis_exists(filename):
+            return jsonify({'error': 'File not found'}), 404
         
-        if not os.path.exists(file_path):
+        # Pobierz parametry filtrowania z zapytania POST
+        filter_params = filter_params_from_request(request.json)
+        
+        # Wynik filtra z pamięci podręcznej (wspólnej z raportem), eksport w procesie roboczym
+        packet_indices = request_packet_indices(filename, filter_params)
+        return job_accepted_response(jobs.submit('filtered_csv', run_filtered_csv_export, filename, packet_indices,
+                                                 filter_params))
+        
+    except FilterSyntaxError as e:
+        return jsonify({'error': str(e)}), 400
+    except JobRejected:
+        return job_rejected_response('filtered_csv')
+    except Exception as e:
+        app.logger.error(f"Error exporting filtered CSV: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# Endpoint do eksportu filtrowanych pakietów do pliku PCAP
+@app.route('/export_filtered_pcap/<filename>', methods=['POST'])
+def export_filtered_pcap(filename):
+    try:
+        if not analysis_exists(filename):
             return jsonify({'error': 'File not found'}), 404
         
-        # Pobierz dane JSON
-        with open(file_path, 'r', encoding='utf-8') as f:
-            all_packets = json.load(f)
+        if find_capture_source(filename) is None:
+            return jsonify({'error': 'Source capture file is not available'}), 409
         
         # Pobierz parametry filtrowania z zapytania POST
-        filter_params = {
-            'Source IP': request.json.get('srcIp', ''),
-            'Destination IP': request.json.get('dstIp', ''),
-            'Source MAC': request.json.get('srcMac', ''),
-            'Destination MAC': request.json.get('dstMac', ''),
-            'Protocol': request.json.get('protocol', ''),
-            'Port': request.json.get('port', ''),
-            'Min Length': request.json.get('lengthMin', ''),
-            'Max Length': request.json.get('lengthMax', ''),
-            'Start Time': request.json.get('timeStart', ''),
-            'End Time': request.json.get('timeEnd', '')
-        }
+        filter_params = filter_params_from_request(request.json)
         
-        # Filtrowanie pakietów według parametrów
-        filtered_packets = filter_packets(all_packets, filter_params)
-        
-        # Konwersja filtrowanych pakietów do DataFrame
-        df_data = []
-        for packet in filtered_packets:
-            row = {
-                'Packet_Number': packet.get('packet_number', ''),
-                'Time': packet.get('time', ''),
-                'Length': packet.get('length', ''),
-                'Source_MAC': packet.get('ethernet', {}).get('src', ''),
-                'Destination_MAC': packet.get('ethernet', {}).get('dst', ''),
-                'Source_MAC_Vendor': packet.get('ethernet', {}).get('src_vendor', ''),
-                'Destination_MAC_Vendor': packet.get('ethernet', {}).get('dst_vendor', ''),
-                'Source_IP': packet.get('ip', {}).get('src', ''),
-                'Destination_IP': packet.get('ip', {}).get('dst', ''),
-                'Protocol': 'TCP' if 'tcp' in packet else 'UDP' if 'udp' in packet else 'Other',
-                'Source_Port': packet.get('tcp', packet.get('udp', {})).get('sport', ''),
-                'Destination_Port': packet.get('tcp', packet.get('udp', {})).get('dport', ''),
-                'TTL': packet.get('ip', {}).get('ttl', ''),
-                'TCP_Flags': packet.get('tcp', {}).get('flags', '') if 'tcp' in packet else '',
-                'UDP_Length': packet.get('udp', {}).get('len', '') if 'udp' in packet else ''
-            }
-            df_data.append(row)
+        # Wynik filtra z pamięci podręcznej, kopiowanie rekordów w procesie roboczym
+        packet_indices = request_packet_indices(filename, filter_params)
+        return job_accepted_response(jobs.submit('filtered_pcap', run_filtered_pcap_export, filename, packet_indices,
+                                                 filter_params))
+        
+    except FilterSyntaxError as e:
+        return jsonify({'error': str(e)}), 400
+    except JobRejected:
+        return job_rejected_response('filtered_pcap')
+    except Exception as e:
+        app.logger.error(f"Error exporting filtered PCAP: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# API filtrowania - numery pakietów spełniających filtr (pola formularza i/lub wyrażenie)
+@app.route('/api/filter/<filename>', methods=['GET', 'POST'])
+def get_filtered_packets(filename):
+    try:
+        if not analysis_exists(filename):
+            return jsonify({'error': 'File not found'}), 404
         
-        df = pd.DataFrame(df_data)
+        if request.method == 'POST':
+            filter_params = filter_params_from_request(request.json or {})
+        else:
+            filter_params = filter_params_from_request({'expression': request.args.get('expr', '')})
         
-        # Utworzenie pliku CSV
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_filename = os.path.splitext(os.path.basename(filename))[0]
-        csv_filename = f"filtered_packets_{base_filename}_{timestamp}.csv"
-        csv_path = os.path.join(app.config['UPLOAD_FOLDER'], csv_filename)
+        # Kolumny pakietów budowane w procesie roboczym - klient ponawia zapytanie po zakończeniu zadania
+        if not packet_columns_ready(filename):
+            return job_accepted_response(jobs.submit('columns', run_packet_columns, filename,
+                                                     key=f'columns:{filename}'))
         
-        df.to_csv(csv_path, index=False, encoding='utf-8')
+        started = time.perf_counter()
+        indices = select_packet_indices(filename, filter_params)
         
-        # Zwracanie informacji o wygenerowanym pliku
         return jsonify({
-            'success': True,
-            'message': 'Filtered CSV exported successfully',
-            'csv_url': url_for('download_report', filename=csv_filename),
-            'total_packets': len(filtered_packets)
+            'total': len(get_packet_columns(filename)['time']),
+            'matched': len(indices),
+            'packet_numbers': (indices + 1).tolist(),
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
         })
         
+    except FilterSyntaxError as e:
+        return jsonify({'error': str(e)}), 400
+    except JobRejected:
+        return job_rejected_response('columns')
     except Exception as e:
-        app.logger.error(f"Error exporting filtered CSV: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+# Stan zadania wykonywanego w tle (raporty, eksporty)
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    info = jobs.get(job_id)
+    if info is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(job_status_payload(info))
+
 # Ścieżka do plików statycznych JavaScript i CSS
 @app.route('/static/<path:path>')
 def send_static(path):
@@ -1877,5 +6911,42 @@ def page_not_found(e):
 def internal_server_error(e):
    return render_template('500.html'), 500
 
+_app_initialized = False
+
+def init_app_storage():
+    """Jednorazowo tworzy katalogi danych i katalog analiz (wywoływane przez create_app i przed żądaniem)"""
+    global _app_initialized
+    if _app_initialized:
+        return
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['JSON_FOLDER'], exist_ok=True)
+    os.makedirs(os.path.join('static', 'img'), exist_ok=True)
+    init_catalog()
+    _app_initialized = True
+
+# Serwer uruchomiony jako main:app (bez create_app) inicjalizuje dane przy pierwszym żądaniu
+app.before_request(init_app_storage)
+
+def create_app(config=None):
+    """
+    Przygotowuje aplikację do pracy: nadpisuje konfigurację i tworzy katalogi oraz katalog analiz
+    
+    Import modułu nie wykonuje żadnych operacji na dysku ani nie ładuje ciężkich bibliotek,
+    więc procesy robocze i narzędzia (batch.py) startują szybko.
+    
+    Args:
+        config (dict, optional): Klucze konfiguracji nadpisujące wartości domyślne
+    
+    Returns:
+        Flask: Skonfigurowana aplikacja
+    """
+    if config:
+        app.config.update(config)
+        # Katalog analiz leży domyślnie w katalogu danych JSON
+        if 'JSON_FOLDER' in config and 'CATALOG_DB' not in config:
+            app.config['CATALOG_DB'] = os.path.join(app.config['JSON_FOLDER'], 'catalog.db')
+    init_app_storage()
+    return app
+
 if __name__ == '__main__':
-   app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+   create_app().run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
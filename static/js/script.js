@@ -108,12 +108,201 @@ function initCharts() {
         initNetworkEfficiencyChart();
     }
     
+    // Histogram rozkładu w skali logarytmicznej (ze szkicu kwantyli na serwerze)
+    if (document.getElementById('distributionChart')) {
+        initDistributionChart();
+    }
+    
+    // Macierz ruchu źródło × cel (mapa cieplna i partnerzy hosta)
+    if (document.getElementById('trafficMatrix')) {
+        initTrafficMatrix();
+    }
+    
     // Ulepszony graf MAC z protokołami
     if (document.getElementById('enhancedMacGraph')) {
         initEnhancedMacGraph();
     }
 }
 
+// Histogram wybranego rozkładu - przedziały logarytmiczne wyznaczane przez /api/distribution
+function initDistributionChart() {
+    const metricSelect = document.getElementById('distributionMetric');
+    const protocolSelect = document.getElementById('distributionProtocol');
+    const chart = new Chart(document.getElementById('distributionChart').getContext('2d'), {
+        type: 'bar',
+        data: {
+            labels: [],
+            datasets: [{
+                label: 'Liczba wartości',
+                data: [],
+                backgroundColor: 'rgba(75, 192, 192, 0.7)',
+                borderColor: 'rgba(75, 192, 192, 1)',
+                borderWidth: 1
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            scales: {
+                y: {
+                    beginAtZero: true,
+                    title: { display: true, text: 'Liczba wartości' }
+                }
+            },
+            plugins: {
+                legend: { display: false },
+                title: { display: true, text: '' }
+            }
+        }
+    });
+    
+    function formatEdge(value) {
+        return value >= 100 ? value.toFixed(0) : value >= 1 ? value.toFixed(1) : value.toPrecision(2);
+    }
+    
+    function load() {
+        const params = new URLSearchParams({ metric: metricSelect.value, bins: 30 });
+        if (protocolSelect.value) params.set('protocol', protocolSelect.value);
+        
+        fetchWhenReady(`/api/distribution/${filename}?${params.toString()}`)
+            .then(response => response.json())
+            .then(result => {
+                if (result.error) {
+                    throw new Error(result.error);
+                }
+                
+                // Lista protokołów zależy od wybranego rozkładu
+                const selected = protocolSelect.value;
+                protocolSelect.innerHTML = '<option value="">Wszystkie protokoły</option>' + result.protocols
+                    .map(protocol => `<option value="${escapeHtml(protocol)}">${escapeHtml(protocol)}</option>`).join('');
+                protocolSelect.value = result.protocols.includes(selected) ? selected : '';
+                
+                const histogram = result.histogram;
+                const labels = histogram.counts.map((_, i) => `${formatEdge(histogram.edges[i])}-${formatEdge(histogram.edges[i + 1])}`);
+                const counts = histogram.counts.slice();
+                if (histogram.zero_count) {
+                    labels.unshift('0');
+                    counts.unshift(histogram.zero_count);
+                }
+                
+                chart.data.labels = labels;
+                chart.data.datasets[0].data = counts;
+                chart.options.scales.x = { title: { display: true, text: `${result.label} (${result.unit}, skala log.)` } };
+                chart.options.plugins.title.text = `p50 ${result.summary.p50.toFixed(2)} · p99 ${result.summary.p99.toFixed(2)} · p99.9 ${result.summary.p99_9.toFixed(2)} ${result.unit}`;
+                chart.update();
+            })
+            .catch(error => console.error('Błąd pobierania rozkładu:', error));
+    }
+    
+    metricSelect.addEventListener('change', load);
+    protocolSelect.addEventListener('change', load);
+    load();
+}
+
+// Mapa cieplna macierzy ruchu jako tabela - intensywność koloru w skali logarytmicznej
+function initTrafficMatrix() {
+    const container = document.getElementById('trafficMatrix');
+    const summary = document.getElementById('trafficMatrixSummary');
+    const metricSelect = document.getElementById('trafficMatrixMetric');
+    const levelSelect = document.getElementById('trafficMatrixLevel');
+    const hostInput = document.getElementById('trafficMatrixHost');
+    const peersContainer = document.getElementById('trafficMatrixPeers');
+    
+    function cellColor(value, maxLog) {
+        if (!value) return '';
+        const intensity = Math.log10(value + 1) / maxLog;
+        return `background-color: rgba(220, 53, 69, ${(0.1 + 0.9 * intensity).toFixed(2)});`;
+    }
+    
+    function load() {
+        const params = new URLSearchParams({ metric: metricSelect.value, level: levelSelect.value });
+        
+        fetch(`/api/traffic_matrix/${filename}?${params.toString()}`)
+            .then(response => response.json())
+            .then(result => {
+                if (result.error) {
+                    throw new Error(result.error);
+                }
+                
+                const scope = result.level === 'subnet' ? 'podsieci' : 'hostów';
+                summary.textContent = `Pokazano ${result.shown_nodes} z ${result.total_nodes} ${scope} ` +
+                    `(${(result.coverage * 100).toFixed(1)}% ruchu IP). Wiersze - źródło, kolumny - cel.`;
+                
+                if (!result.shown_nodes) {
+                    container.innerHTML = '<p class="text-muted">Brak ruchu IP w analizie</p>';
+                    return;
+                }
+                
+                const maxLog = Math.max(1, ...result.values.map(row => Math.log10(Math.max(...row) + 1)));
+                const clickable = result.level === 'host';
+                const label = text => clickable
+                    ? `<a href="#" class="traffic-matrix-host" data-host="${escapeHtml(text)}">${escapeHtml(text)}</a>`
+                    : escapeHtml(text);
+                
+                let html = '<table class="table table-sm table-bordered small mb-0" style="font-size: 0.7rem;"><thead><tr><th></th>';
+                result.labels.forEach(text => {
+                    html += `<th style="writing-mode: vertical-rl; white-space: nowrap;">${label(text)}</th>`;
+                });
+                html += '</tr></thead><tbody>';
+                result.values.forEach((row, i) => {
+                    html += `<tr><th class="text-nowrap">${label(result.labels[i])}</th>`;
+                    row.forEach((value, j) => {
+                        const title = `${result.labels[i]} → ${result.labels[j]}: ${value.toLocaleString()} ${result.metric === 'bytes' ? 'B' : 'pakietów'}`;
+                        html += `<td title="${escapeHtml(title)}" style="${cellColor(value, maxLog)}"></td>`;
+                    });
+                    html += '</tr>';
+                });
+                container.innerHTML = html + '</tbody></table>';
+                
+                container.querySelectorAll('.traffic-matrix-host').forEach(link => {
+                    link.addEventListener('click', event => {
+                        event.preventDefault();
+                        hostInput.value = link.dataset.host;
+                        loadPeers();
+                    });
+                });
+            })
+            .catch(error => {
+                container.innerHTML = `<p class="text-danger">${escapeHtml(error.message)}</p>`;
+            });
+    }
+    
+    function peersTable(title, direction) {
+        let html = `<div class="col-md-6"><h6>${title}: ${direction.bytes.toLocaleString()} B, ${direction.packets.toLocaleString()} pakietów, partnerów: ${direction.peers_total}</h6>`;
+        html += '<table class="table table-sm table-striped small"><thead><tr><th>Adres</th><th>Bajty</th><th>Pakiety</th></tr></thead><tbody>';
+        direction.peers.forEach(peer => {
+            html += `<tr><td>${escapeHtml(peer.peer)}</td><td>${peer.bytes.toLocaleString()}</td><td>${peer.packets.toLocaleString()}</td></tr>`;
+        });
+        return html + '</tbody></table></div>';
+    }
+    
+    function loadPeers() {
+        const host = hostInput.value.trim();
+        if (!host) return;
+        
+        fetch(`/api/traffic_matrix/${filename}/peers?${new URLSearchParams({ host: host }).toString()}`)
+            .then(response => response.json())
+            .then(result => {
+                if (result.error) {
+                    throw new Error(result.error);
+                }
+                peersContainer.innerHTML = peersTable(`Wysłane przez ${escapeHtml(result.host)}`, result.sent) +
+                    peersTable(`Odebrane przez ${escapeHtml(result.host)}`, result.received);
+            })
+            .catch(error => {
+                peersContainer.innerHTML = `<div class="col-12"><p class="text-danger">${escapeHtml(error.message)}</p></div>`;
+            });
+    }
+    
+    metricSelect.addEventListener('change', load);
+    levelSelect.addEventListener('change', load);
+    document.getElementById('trafficMatrixPeersButton').addEventListener('click', loadPeers);
+    hostInput.addEventListener('keydown', event => {
+        if (event.key === 'Enter') loadPeers();
+    });
+    load();
+}
+
 function initPayloadChart() {
     const payloadCtx = document.getElementById('payloadChart').getContext('2d');
     const payloadData = JSON.parse(document.getElementById('payloadStatsData').textContent);
@@ -178,7 +367,7 @@ function initThroughputChart() {
     const throughputCtx = document.getElementById('throughputChart').getContext('2d');
     const throughputData = JSON.parse(document.getElementById('throughputStatsData').textContent);
     
-    new Chart(throughputCtx, {
+    const throughputChart = new Chart(throughputCtx, {
         type: 'line',
         data: {
             labels: throughputData.time_labels,
@@ -250,6 +439,87 @@ function initThroughputChart() {
             }
         }
     });
+    
+    // Powiększanie - dane z /api/timeseries przeliczane na wartości na sekundę
+    enableTimeSeriesZoom(throughputChart, 'throughputChart', (chart, series) => {
+        chart.data.datasets[0].data = series.bytes.map(value => value / series.bucket_width);
+        chart.data.datasets[1].data = series.packets.map(value => value / series.bucket_width);
+    });
+}
+
+// Etykieta osi czasu - z milisekundami dla bucketów krótszych niż sekunda
+function formatTimeSeriesLabel(timestamp, bucketWidth) {
+    const date = new Date(timestamp * 1000);
+    const time = date.toLocaleTimeString('pl-PL', { hour12: false });
+    if (bucketWidth >= 1) {
+        return time;
+    }
+    return `${time}.${String(date.getMilliseconds()).padStart(3, '0')}`;
+}
+
+// Powiększanie wykresów czasowych: kliknięcie przybliża 4x wokół punktu,
+// przyciski w nagłówku karty oddalają lub przywracają cały zakres
+function enableTimeSeriesZoom(chart, chartId, applySeries) {
+    const state = { start: null, end: null, timestamps: null };
+    const points = 200;
+    
+    function load(start, end) {
+        const params = new URLSearchParams({ points: points });
+        if (start !== null) params.set('start', start);
+        if (end !== null) params.set('end', end);
+        
+        return fetch(`/api/timeseries/${filename}?${params.toString()}`)
+            .then(response => response.json())
+            .then(series => {
+                if (series.error) {
+                    throw new Error(series.error);
+                }
+                state.start = series.start;
+                state.end = series.end;
+                state.timestamps = series.timestamps;
+                chart.data.labels = series.timestamps.map(ts => formatTimeSeriesLabel(ts, series.bucket_width));
+                applySeries(chart, series);
+                chart.update();
+                
+                // Inne karty (np. rozkład protokołów) mogą pokazać statystyki tego samego okna
+                document.dispatchEvent(new CustomEvent('timeserieswindow', {
+                    detail: { chartId: chartId, start: start, end: end }
+                }));
+            })
+            .catch(error => console.error('Błąd pobierania szeregu czasowego:', error));
+    }
+    
+    function zoom(center, factor) {
+        if (state.start === null) {
+            return;
+        }
+        const halfSpan = (state.end - state.start) * factor / 2;
+        load(center - halfSpan, center + halfSpan);
+    }
+    
+    chart.options.onClick = (event, elements) => {
+        if (!elements.length) {
+            return;
+        }
+        if (state.timestamps === null) {
+            // Pierwsze kliknięcie - wykres zawiera jeszcze dane statyczne, pozycja jako ułamek zakresu
+            const fraction = elements[0].index / Math.max(1, chart.data.labels.length - 1);
+            load(null, null).then(() => zoom(state.start + fraction * (state.end - state.start), 0.25));
+            return;
+        }
+        zoom(state.timestamps[elements[0].index], 0.25);
+    };
+    chart.update();
+    
+    document.querySelectorAll(`[data-timeseries-controls="${chartId}"] button`).forEach(button => {
+        button.addEventListener('click', function() {
+            if (this.dataset.zoom === 'reset' || state.start === null) {
+                load(null, null);
+            } else {
+                zoom((state.start + state.end) / 2, 4);
+            }
+        });
+    });
 }
 
 // Wykres payload per protocol
@@ -370,12 +640,73 @@ function initNetworkEfficiencyChart() {
 }
 
 // Ulepszony graf komunikacji MAC z protokołami
+// Rozwijanie węzła zredukowanego grafu dwuklikiem - członkowie zwiniętej grupy lub najsilniej połączeni sąsiedzi
+function enableGraphExpansion(network, nodes, edges, kind, styleNode, styleEdge) {
+    network.on('doubleClick', function (params) {
+        if (params.nodes.length === 0) return;
+        
+        const nodeId = params.nodes[0];
+        const query = new URLSearchParams({ kind: kind, node: nodeId });
+        // Nowe węzły pojawiają się w miejscu rozwijanego węzła
+        const origin = network.getPositions([nodeId])[nodeId];
+        
+        fetchWhenReady(`/api/graph/${filename}/expand?${query.toString()}`)
+            .then(response => response.json())
+            .then(result => {
+                if (result.error) throw new Error(result.error);
+                
+                const node = nodes.get(nodeId);
+                if (node && node.collapsed) {
+                    // Krawędzie grupy są przeliczane przez serwer - stare są usuwane
+                    edges.remove(network.getConnectedEdges(nodeId));
+                    if (result.group) {
+                        nodes.update(styleNode(result.group));
+                    } else {
+                        nodes.remove(nodeId);
+                    }
+                }
+                
+                nodes.add(result.nodes
+                    .filter(newNode => !nodes.get(newNode.id))
+                    .map(newNode => ({ ...styleNode(newNode), x: origin.x, y: origin.y })));
+                edges.update(result.edges
+                    .filter(edge => nodes.get(edge.from) && nodes.get(edge.to))
+                    .map(styleEdge));
+                // Fizyka mogła zostać wyłączona po pierwszej stabilizacji
+                network.setOptions({ physics: { enabled: true } });
+                network.stabilize(100);
+            })
+            .catch(error => console.error('Błąd rozwijania węzła grafu:', error));
+    });
+}
+
+// Styl zwiniętej grupy węzłów (podsieć lub producent)
+function collapsedNodeStyle(node) {
+    return {
+        ...node,
+        color: {
+            background: node.color,
+            border: '#495057',
+            highlight: {
+                background: node.color,
+                border: '#ff0000'
+            }
+        },
+        font: {
+            color: '#000000',
+            size: 12
+        },
+        shape: 'diamond',
+        size: Math.max(15, Math.min(40, Math.sqrt(node.value)))
+    };
+}
+
 function initEnhancedMacGraph() {
     const macContainer = document.getElementById('enhancedMacGraph');
     const macData = JSON.parse(document.getElementById('enhancedMacGraphData').textContent);
     
     // Przygotowanie węzłów z kolorami protokołów
-    const nodes = new vis.DataSet(macData.nodes.map(node => ({
+    const styleNode = node => node.collapsed ? collapsedNodeStyle(node) : ({
         ...node,
         color: {
             background: node.color,
@@ -391,9 +722,9 @@ function initEnhancedMacGraph() {
         },
         shape: 'dot',
         size: Math.max(10, Math.min(50, node.value / 10))
-    })));
+    });
     
-    const edges = new vis.DataSet(macData.edges.map(edge => ({
+    const styleEdge = edge => ({
         ...edge,
         width: Math.max(1, Math.min(10, edge.value / 5)),
         color: {
@@ -403,7 +734,10 @@ function initEnhancedMacGraph() {
         smooth: {
             type: 'continuous'
         }
-    })));
+    });
+    
+    const nodes = new vis.DataSet(macData.nodes.map(styleNode));
+    const edges = new vis.DataSet(macData.edges.map(styleEdge));
     
     const data = { nodes, edges };
     const options = {
@@ -438,6 +772,7 @@ function initEnhancedMacGraph() {
     };
     
     const network = new vis.Network(macContainer, data, options);
+    enableGraphExpansion(network, nodes, edges, 'mac_protocol', styleNode, styleEdge);
     
     // Dodanie legendy protokołów
     const legendContainer = document.createElement('div');
@@ -452,19 +787,14 @@ function initEnhancedMacGraph() {
         font-size: 12px;
     `;
     
-    const protocolColors = {
-        'TCP': '#FF6B6B',
-        'UDP': '#4ECDC4',
-        'ICMP': '#45B7D1',
-        'ARP': '#96CEB4',
-        'DNS': '#FECA57',
-        'HTTP': '#FF9FF3',
-        'HTTPS': '#54A0FF',
-        'Unknown': '#DDA0DD'
-    };
+    const protocolColors = JSON.parse(document.getElementById('protocolColorsData').textContent);
+    
+    // Legenda tylko dla protokołów obecnych w grafie
+    const graphProtocols = new Set(macData.nodes.map(node => node.protocol));
+    graphProtocols.add('Unknown');
     
     let legendHTML = '<strong>Protokoły:</strong><br>';
-    Object.entries(protocolColors).forEach(([protocol, color]) => {
+    Object.entries(protocolColors).filter(([protocol]) => graphProtocols.has(protocol)).forEach(([protocol, color]) => {
         legendHTML += `<div style="margin: 2px 0;"><span style="display: inline-block; width: 12px; height: 12px; background: ${color}; margin-right: 5px; border-radius: 50%;"></span>${protocol}</div>`;
     });
     
@@ -555,27 +885,35 @@ window.addEventListener('resize', function() {
     });
 });
 
+// Kolory wycinków wykresu protokołów - kolory protokołów z serwera, pozostałe z palety
+const PROTOCOL_CHART_PALETTE = [
+    'rgba(54, 162, 235, 0.7)',
+    'rgba(255, 99, 132, 0.7)',
+    'rgba(255, 206, 86, 0.7)',
+    'rgba(75, 192, 192, 0.7)',
+    'rgba(153, 102, 255, 0.7)',
+    'rgba(255, 159, 64, 0.7)',
+    'rgba(201, 203, 207, 0.7)'
+];
+
+function protocolChartColors(labels, protocolColors) {
+    return labels.map((label, i) => protocolColors[label] || PROTOCOL_CHART_PALETTE[i % PROTOCOL_CHART_PALETTE.length]);
+}
+
 // Wykres protokołów (Pie Chart)
 function initProtocolChart() {
     const protocolCtx = document.getElementById('protocolChart').getContext('2d');
     const protocolData = JSON.parse(document.getElementById('protocolData').textContent);
+    const protocolColors = JSON.parse(document.getElementById('protocolColorsData').textContent);
     
     // Konfiguracja z lepszym zarządzaniem responsywnością
-    new Chart(protocolCtx, {
+    const protocolChart = new Chart(protocolCtx, {
         type: 'pie',
         data: {
             labels: Object.keys(protocolData),
             datasets: [{
                 data: Object.values(protocolData),
-                backgroundColor: [
-                    'rgba(54, 162, 235, 0.7)',
-                    'rgba(255, 99, 132, 0.7)',
-                    'rgba(255, 206, 86, 0.7)',
-                    'rgba(75, 192, 192, 0.7)',
-                    'rgba(153, 102, 255, 0.7)',
-                    'rgba(255, 159, 64, 0.7)',
-                    'rgba(201, 203, 207, 0.7)'
-                ]
+                backgroundColor: protocolChartColors(Object.keys(protocolData), protocolColors)
             }]
         },
         options: {
@@ -601,6 +939,41 @@ function initProtocolChart() {
             }
         }
     });
+    
+    // Rozkład protokołów z kostki agregatów (/api/stats) - dla całej analizy lub okna wykresu czasowego
+    const windowInfo = document.getElementById('protocolWindow');
+    function loadWindow(start, end) {
+        const params = new URLSearchParams({ group_by: 'protocol' });
+        if (start !== null) params.set('start', start);
+        if (end !== null) params.set('end', end);
+        
+        fetch(`/api/stats/${filename}?${params.toString()}`)
+            .then(response => response.json())
+            .then(result => {
+                if (result.error) {
+                    throw new Error(result.error);
+                }
+                protocolChart.data.labels = result.groups.map(group => group.protocol);
+                protocolChart.data.datasets[0].data = result.groups.map(group => group.packets);
+                protocolChart.data.datasets[0].backgroundColor = protocolChartColors(protocolChart.data.labels, protocolColors);
+                protocolChart.update();
+                
+                if (windowInfo) {
+                    const scope = start === null ? 'Cała analiza' :
+                        `Okno ${formatTimeSeriesLabel(start, 1)} – ${formatTimeSeriesLabel(end, 1)}`;
+                    windowInfo.textContent = `${scope}: ${result.totals.packets.toLocaleString()} pakietów, ${result.totals.bytes.toLocaleString()} B`;
+                }
+            })
+            .catch(error => console.error('Błąd pobierania agregatów:', error));
+    }
+    
+    // Powiększenie wykresu czasowego zawęża rozkład protokołów do widocznego okna
+    document.addEventListener('timeserieswindow', event => {
+        if (event.detail.chartId === 'timeChart') {
+            loadWindow(event.detail.start, event.detail.end);
+        }
+    });
+    loadWindow(null, null);
 }
 
 // Wykres portów (Bar Chart)
@@ -754,7 +1127,7 @@ function initTimeChart() {
    const timeCtx = document.getElementById('timeChart').getContext('2d');
    const timeData = JSON.parse(document.getElementById('timeData').textContent);
    
-   new Chart(timeCtx, {
+   const timeChart = new Chart(timeCtx, {
        type: 'line',
        data: {
            labels: timeData.labels,
@@ -794,6 +1167,10 @@ function initTimeChart() {
            }
        }
    });
+   
+   enableTimeSeriesZoom(timeChart, 'timeChart', (chart, series) => {
+       chart.data.datasets[0].data = series.packets;
+   });
 }
 
 // Wykres wielkości pakietów (Histogram)
@@ -846,8 +1223,17 @@ function initNetworkGraph() {
     const networkContainer = document.getElementById('networkGraph');
     const networkData = JSON.parse(document.getElementById('networkData').textContent);
     
+    // Liczba połączeń węzłów liczona jednym przejściem po krawędziach
+    const connectionCounts = {};
+    networkData.edges.forEach(edge => {
+        connectionCounts[edge.from] = (connectionCounts[edge.from] || 0) + 1;
+        connectionCounts[edge.to] = (connectionCounts[edge.to] || 0) + 1;
+    });
+    
     // Przygotowanie węzłów z lepszym kolorowaniem i rozmiarami
-    const nodes = new vis.DataSet(networkData.nodes.map(node => {
+    const styleNode = node => {
+        if (node.collapsed) return collapsedNodeStyle(node);
+        
         // Określenie koloru na podstawie typu IP (lokalne vs publiczne)
         let nodeColor = '#4ECDC4'; // Domyślny kolor
         let ipType = 'Inne prywatne';
@@ -866,10 +1252,7 @@ function initNetworkGraph() {
             ipType = 'Adres publiczny';
         }
         
-        // Znajdź liczbę połączeń dla tego węzła
-        const connections = networkData.edges.filter(edge => 
-            edge.from === node.id || edge.to === node.id
-        ).length;
+        const connections = connectionCounts[node.id] || 0;
         
         return {
             ...node,
@@ -899,9 +1282,9 @@ function initNetworkGraph() {
             // Dodanie tooltipa który wyświetla się po najechaniu (prosty tekst)
             title: `IP: ${node.id}\nTyp: ${ipType}\nPakiety: ${node.value}\nPołączenia: ${connections}`
         };
-    }));
+    };
     
-    const edges = new vis.DataSet(networkData.edges.map(edge => ({
+    const styleEdge = edge => ({
         ...edge,
         width: Math.max(1, Math.min(8, edge.value / 3)), // Lepsze skalowanie grubości
         color: {
@@ -929,7 +1312,10 @@ function initNetworkGraph() {
         },
         // Dodanie tooltipa dla krawędzi (prosty tekst)
         title: `${edge.from} → ${edge.to}\nPakiety: ${edge.value}`
-    })));
+    });
+    
+    const nodes = new vis.DataSet(networkData.nodes.map(styleNode));
+    const edges = new vis.DataSet(networkData.edges.map(styleEdge));
     
     const data = { nodes, edges };
     const options = {
@@ -989,6 +1375,7 @@ function initNetworkGraph() {
     };
     
     const network = new vis.Network(networkContainer, data, options);
+    enableGraphExpansion(network, nodes, edges, 'ip', styleNode, styleEdge);
     
     // Dodanie legendy typów IP
     const legendContainer = document.createElement('div');
@@ -1011,7 +1398,8 @@ function initNetworkGraph() {
         'APIPA (169.254.x.x)': '#FECA57',
         'Publiczne': '#54A0FF',
         'Specjalne (0.0.0.0, 255.255.255.255)': '#FF6B6B',
-        'Inne prywatne': '#4ECDC4'
+        'Inne prywatne': '#4ECDC4',
+        'Zwinięta grupa (dwuklik rozwija)': '#adb5bd'
     };
     
     let legendHTML = '<strong style="color: #333; margin-bottom: 8px; display: block;">Typy adresów IP:</strong>';
@@ -1079,7 +1467,9 @@ function initMacGraph() {
    const macData = JSON.parse(document.getElementById('macGraphData').textContent);
    
    // Wykorzystanie biblioteki vis.js do wizualizacji grafu MAC
-   const nodes = new vis.DataSet(macData.nodes);
+   const styleNode = node => node.collapsed ? collapsedNodeStyle(node) : node;
+   const styleEdge = edge => edge;
+   const nodes = new vis.DataSet(macData.nodes.map(styleNode));
    const edges = new vis.DataSet(macData.edges);
    
    const data = { nodes, edges };
@@ -1125,7 +1515,8 @@ function initMacGraph() {
        }
    };
    
-   new vis.Network(macContainer, data, options);
+   const network = new vis.Network(macContainer, data, options);
+   enableGraphExpansion(network, nodes, edges, 'mac', styleNode, styleEdge);
 }
 
 // Mapa geolokalizacyjna IP
@@ -1150,134 +1541,381 @@ function initGeoMap() {
    });
 }
 
+// Numery pakietów spełniających ostatnio zastosowany filtr (null = bez filtra)
+let filteredPacketNumbers = null;
+// Rekordy pakietów bieżącej strony tabeli (numer pakietu -> rekord)
+const packetsPage = new Map();
+
+// Komórki wiersza tabeli pakietów (te same kolumny co w nagłówku tabeli)
+function packetTableRow(packet, appProtocols) {
+   let protocol = 'Inne';
+   if (packet.tcp) protocol = 'TCP';
+   else if (packet.udp) protocol = 'UDP';
+   else if (packet.ip) protocol = String(packet.ip.proto);
+   else if (packet.arp) protocol = 'ARP';
+   
+   // Starsze analizy nie mają zapisanego kodu protokołu aplikacyjnego
+   const appProtocol = packet.app_proto !== undefined ? appProtocols[packet.app_proto] : (packet.tcp ? 'TCP' : packet.udp ? 'UDP' : packet.arp ? 'ARP' : 'Unknown');
+   const ports = packet.tcp ? `${packet.tcp.sport} → ${packet.tcp.dport}` : packet.udp ? `${packet.udp.sport} → ${packet.udp.dport}` : '-';
+   
+   return [
+       packet.packet_number,
+       escapeHtml(packet.time),
+       packet.ethernet ? escapeHtml(packet.ethernet.src) : '',
+       packet.ethernet ? escapeHtml(packet.ethernet.dst) : '',
+       packet.ethernet ? escapeHtml(packet.ethernet.src_vendor) : '',
+       packet.ip ? escapeHtml(packet.ip.src) : packet.arp ? escapeHtml(packet.arp.psrc) : '',
+       packet.ip ? escapeHtml(packet.ip.dst) : packet.arp ? escapeHtml(packet.arp.pdst) : '',
+       protocol,
+       escapeHtml(appProtocol),
+       ports,
+       packet.length,
+       `<button class="btn btn-sm btn-info packet-details-btn" data-packet-id="${packet.packet_number}">Szczegóły</button>`
+   ];
+}
+
+// Strona tabeli pakietów z /api/json - kolejne pakiety (offset/limit) albo pakiety pasujące do filtra
+function loadPacketsPage(request, callback) {
+   const total = parseInt(document.getElementById('packetsTable').dataset.total) || 0;
+   const appProtocols = JSON.parse(document.getElementById('appProtocolsData').textContent);
+   let url = `/api/json/${filename}?offset=${request.start}&limit=${request.length}`;
+   let recordsFiltered = total;
+   
+   if (filteredPacketNumbers !== null) {
+       const numbers = filteredPacketNumbers.slice(request.start, request.start + request.length);
+       recordsFiltered = filteredPacketNumbers.length;
+       if (!numbers.length) {
+           callback({ draw: request.draw, recordsTotal: total, recordsFiltered: recordsFiltered, data: [] });
+           return;
+       }
+       url = `/api/json/${filename}?packets=${numbers.join(',')}`;
+   }
+   
+   fetch(url)
+       .then(response => response.json())
+       .then(packets => {
+           if (packets.error) {
+               throw new Error(packets.error);
+           }
+           packetsPage.clear();
+           packets.forEach(packet => packetsPage.set(packet.packet_number, packet));
+           callback({
+               draw: request.draw,
+               recordsTotal: total,
+               recordsFiltered: recordsFiltered,
+               data: packets.map(packet => packetTableRow(packet, appProtocols))
+           });
+       })
+       .catch(error => console.error('Error loading packets:', error));
+}
+
 // Zaawansowany podgląd pakietów
 function initAdvancedPacketViewer() {
-   // Inicjalizacja komponentu DataTables dla tabeli pakietów (jeśli istnieje)
-   if (document.getElementById('packetsTable')) {
-       $('#packetsTable').DataTable({
-           pageLength: 25,
-           order: [[0, 'asc']],
-           responsive: true,
-           columnDefs: [
-               { responsivePriority: 1, targets: 0 },
-               { responsivePriority: 2, targets: 1 },
-               { responsivePriority: 3, targets: 2 }
-           ]
-       });
-   }
+   // Inicjalizacja komponentu DataTables dla tabeli pakietów (jeśli istnieje) - strony pobierane z serwera
+   const packetsTable = document.getElementById('packetsTable');
+   if (!packetsTable) return;
    
-   // Obsługa podglądu szczegółów pakietu
-   const packetDetails = document.querySelectorAll('.packet-details-btn');
-   packetDetails.forEach(btn => {
-       btn.addEventListener('click', function() {
-           const packetId = this.getAttribute('data-packet-id');
-           const packetData = JSON.parse(document.getElementById(`packet-data-${packetId}`).textContent);
-           
-           // Wypełnianie modalu danymi pakietu
-           document.getElementById('packetModalLabel').textContent = `Pakiet #${packetId}`;
-           
-           // Formatowanie JSON do wyświetlenia
-           document.getElementById('packetModalBody').innerHTML = `
-               <div class="packet-tabs">
-                   <ul class="nav nav-tabs" id="packetTab" role="tablist">
+   $('#packetsTable').DataTable({
+       pageLength: 25,
+       serverSide: true,
+       searching: false,
+       ordering: false,
+       ajax: loadPacketsPage,
+       responsive: true,
+       columnDefs: [
+           { responsivePriority: 1, targets: 0 },
+           { responsivePriority: 2, targets: 1 },
+           { responsivePriority: 3, targets: 2 }
+       ]
+   });
+   
+   // Obsługa podglądu szczegółów pakietu (przyciski są tworzone przy każdym przełączeniu strony)
+   packetsTable.addEventListener('click', function(event) {
+       const btn = event.target.closest('.packet-details-btn');
+       if (!btn) return;
+       
+       const packetId = btn.getAttribute('data-packet-id');
+       const packetData = packetsPage.get(parseInt(packetId));
+       
+       // Wypełnianie modalu danymi pakietu
+       document.getElementById('packetModalLabel').textContent = `Pakiet #${packetId}`;
+       
+       // Formatowanie JSON do wyświetlenia
+       document.getElementById('packetModalBody').innerHTML = `
+           <div class="packet-tabs">
+               <ul class="nav nav-tabs" id="packetTab" role="tablist">
+                   <li class="nav-item" role="presentation">
+                       <button class="nav-link active" id="summary-tab" data-bs-toggle="tab" data-bs-target="#summary" type="button" role="tab">Podsumowanie</button>
+                   </li>
+                   <li class="nav-item" role="presentation">
+                       <button class="nav-link" id="ethernet-tab" data-bs-toggle="tab" data-bs-target="#ethernet" type="button" role="tab">Ethernet</button>
+                   </li>
+                   ${packetData.ip ? `
                        <li class="nav-item" role="presentation">
-                           <button class="nav-link active" id="summary-tab" data-bs-toggle="tab" data-bs-target="#summary" type="button" role="tab">Podsumowanie</button>
+                           <button class="nav-link" id="ip-tab" data-bs-toggle="tab" data-bs-target="#ip" type="button" role="tab">IP</button>
                        </li>
+                   ` : ''}
+                   ${packetData.arp ? `
                        <li class="nav-item" role="presentation">
-                           <button class="nav-link" id="ethernet-tab" data-bs-toggle="tab" data-bs-target="#ethernet" type="button" role="tab">Ethernet</button>
+                           <button class="nav-link" id="arp-tab" data-bs-toggle="tab" data-bs-target="#arp" type="button" role="tab">ARP</button>
                        </li>
-                       ${packetData.ip ? `
-                           <li class="nav-item" role="presentation">
-                               <button class="nav-link" id="ip-tab" data-bs-toggle="tab" data-bs-target="#ip" type="button" role="tab">IP</button>
-                           </li>
-                       ` : ''}
-                       ${packetData.tcp ? `
-                           <li class="nav-item" role="presentation">
-                               <button class="nav-link" id="tcp-tab" data-bs-toggle="tab" data-bs-target="#tcp" type="button" role="tab">TCP</button>
-                           </li>
-                       ` : ''}
-                       ${packetData.udp ? `
-                           <li class="nav-item" role="presentation">
-                               <button class="nav-link" id="udp-tab" data-bs-toggle="tab" data-bs-target="#udp" type="button" role="tab">UDP</button>
-                           </li>
-                       ` : ''}
+                   ` : ''}
+                   ${packetData.tcp ? `
                        <li class="nav-item" role="presentation">
-                           <button class="nav-link" id="raw-tab" data-bs-toggle="tab" data-bs-target="#raw" type="button" role="tab">Raw</button>
+                           <button class="nav-link" id="tcp-tab" data-bs-toggle="tab" data-bs-target="#tcp" type="button" role="tab">TCP</button>
                        </li>
-                   </ul>
-                   <div class="tab-content" id="packetTabContent">
-                       <div class="tab-pane fade show active" id="summary" role="tabpanel">
-                           <table class="table">
-                               <tr><th>Numer pakietu</th><td>${packetData.packet_number}</td></tr>
-                               <tr><th>Czas</th><td>${packetData.time}</td></tr>
-                               <tr><th>Długość</th><td>${packetData.length} bajtów</td></tr>
-                               ${packetData.ethernet ? `
-                               <tr><th>MAC Źródło</th><td>${packetData.ethernet.src}</td></tr>
-                               <tr><th>MAC Cel</th><td>${packetData.ethernet.dst}</td></tr>
-                               <tr><th>Producent (Źródło)</th><td>${packetData.ethernet.src_vendor}</td></tr>
-                               <tr><th>Producent (Cel)</th><td>${packetData.ethernet.dst_vendor}</td></tr>
-                               ` : ''}
-                               ${packetData.ip ? `
-                               <tr><th>IP Źródło</th><td>${packetData.ip.src}</td></tr>
-                               <tr><th>IP Cel</th><td>${packetData.ip.dst}</td></tr>
-                               ` : ''}
-                           </table>
-                       </div>
-                       ${packetData.ethernet ? `
-                       <div class="tab-pane fade" id="ethernet" role="tabpanel">
-                           <table class="table">
-                               <tr><th>MAC Źródło</th><td>${packetData.ethernet.src}</td></tr>
-                               <tr><th>MAC Cel</th><td>${packetData.ethernet.dst}</td></tr>
-                               <tr><th>Typ</th><td>${packetData.ethernet.type}</td></tr>
-                               <tr><th>Producent (Źródło)</th><td>${packetData.ethernet.src_vendor}</td></tr>
-                               <tr><th>Producent (Cel)</th><td>${packetData.ethernet.dst_vendor}</td></tr>
-                           </table>
-                       </div>
-                       ` : ''}
-                       ${packetData.ip ? `
-                       <div class="tab-pane fade" id="ip" role="tabpanel">
-                           <table class="table">
-                               <tr><th>Źródło</th><td>${packetData.ip.src}</td></tr>
-                               <tr><th>Cel</th><td>${packetData.ip.dst}</td></tr>
-                               <tr><th>Protokół</th><td>${packetData.ip.proto}</td></tr>
-                               <tr><th>TTL</th><td>${packetData.ip.ttl}</td></tr>
-                           </table>
-                       </div>
-                       ` : ''}
-                       ${packetData.tcp ? `
-                       <div class="tab-pane fade" id="tcp" role="tabpanel">
-                           <table class="table">
-                               <tr><th>Port źródłowy</th><td>${packetData.tcp.sport}</td></tr>
-                               <tr><th>Port docelowy</th><td>${packetData.tcp.dport}</td></tr>
-                               <tr><th>Flagi</th><td>${packetData.tcp.flags}</td></tr>
-                               <tr><th>Sekwencja</th><td>${packetData.tcp.seq}</td></tr>
-                               <tr><th>Potwierdzenie</th><td>${packetData.tcp.ack}</td></tr>
-                           </table>
-                       </div>
+                   ` : ''}
+                   ${packetData.udp ? `
+                       <li class="nav-item" role="presentation">
+                           <button class="nav-link" id="udp-tab" data-bs-toggle="tab" data-bs-target="#udp" type="button" role="tab">UDP</button>
+                       </li>
+                   ` : ''}
+                   ${packetData.dns ? `
+                       <li class="nav-item" role="presentation">
+                           <button class="nav-link" id="dns-tab" data-bs-toggle="tab" data-bs-target="#dns" type="button" role="tab">DNS</button>
+                       </li>
+                   ` : ''}
+                   ${packetData.payload_length ? `
+                       <li class="nav-item" role="presentation">
+                           <button class="nav-link" id="payload-tab" data-bs-toggle="tab" data-bs-target="#payload" type="button" role="tab">Payload</button>
+                       </li>
+                   ` : ''}
+                   <li class="nav-item" role="presentation">
+                       <button class="nav-link" id="layers-tab" data-bs-toggle="tab" data-bs-target="#layers" type="button" role="tab">Wszystkie warstwy</button>
+                   </li>
+                   <li class="nav-item" role="presentation">
+                       <button class="nav-link" id="raw-tab" data-bs-toggle="tab" data-bs-target="#raw" type="button" role="tab">Raw</button>
+                   </li>
+               </ul>
+               <div class="tab-content" id="packetTabContent">
+                   <div class="tab-pane fade show active" id="summary" role="tabpanel">
+                       <table class="table">
+                           <tr><th>Numer pakietu</th><td>${packetData.packet_number}</td></tr>
+                           <tr><th>Czas</th><td>${packetData.time}</td></tr>
+                           <tr><th>Długość</th><td>${packetData.length} bajtów</td></tr>
+                           ${packetData.ethernet ? `
+                           <tr><th>MAC Źródło</th><td>${packetData.ethernet.src}</td></tr>
+                           <tr><th>MAC Cel</th><td>${packetData.ethernet.dst}</td></tr>
+                           <tr><th>Producent (Źródło)</th><td>${packetData.ethernet.src_vendor}</td></tr>
+                           <tr><th>Producent (Cel)</th><td>${packetData.ethernet.dst_vendor}</td></tr>
+                           ` : ''}
+                           ${packetData.ip ? `
+                           <tr><th>IP Źródło</th><td>${packetData.ip.src}</td></tr>
+                           <tr><th>IP Cel</th><td>${packetData.ip.dst}</td></tr>
+                           ` : ''}
+                       </table>
+                   </div>
+                   ${packetData.ethernet ? `
+                   <div class="tab-pane fade" id="ethernet" role="tabpanel">
+                       <table class="table">
+                           <tr><th>MAC Źródło</th><td>${packetData.ethernet.src}</td></tr>
+                           <tr><th>MAC Cel</th><td>${packetData.ethernet.dst}</td></tr>
+                           <tr><th>Typ</th><td>${packetData.ethernet.type}</td></tr>
+                           ${packetData.vlan ? `<tr><th>VLAN</th><td>${packetData.vlan.join(' / ')}</td></tr>` : ''}
+                           <tr><th>Producent (Źródło)</th><td>${packetData.ethernet.src_vendor}</td></tr>
+                           <tr><th>Producent (Cel)</th><td>${packetData.ethernet.dst_vendor}</td></tr>
+                       </table>
+                   </div>
+                   ` : ''}
+                   ${packetData.ip ? `
+                   <div class="tab-pane fade" id="ip" role="tabpanel">
+                       <table class="table">
+                           <tr><th>Wersja</th><td>IPv${packetData.ip.version || 4}</td></tr>
+                           <tr><th>Źródło</th><td>${packetData.ip.src}</td></tr>
+                           <tr><th>Cel</th><td>${packetData.ip.dst}</td></tr>
+                           <tr><th>Protokół</th><td>${packetData.ip.proto}</td></tr>
+                           <tr><th>${packetData.ip.version === 6 ? 'Hop limit' : 'TTL'}</th><td>${packetData.ip.ttl}</td></tr>
+                           ${packetData.ip.ext_headers ? `<tr><th>Nagłówki rozszerzeń</th><td>${packetData.ip.ext_headers.join(', ')}</td></tr>` : ''}
+                       </table>
+                   </div>
+                   ` : ''}
+                   ${packetData.dns ? `
+                   <div class="tab-pane fade" id="dns" role="tabpanel">
+                       <table class="table">
+                           <tr><th>Typ wiadomości</th><td>${packetData.dns.qr ? 'Odpowiedź' : 'Zapytanie'}</td></tr>
+                           <tr><th>ID transakcji</th><td>${packetData.dns.id}</td></tr>
+                           <tr><th>Nazwa</th><td>${escapeHtml(packetData.dns.qname)}</td></tr>
+                           <tr><th>Typ rekordu</th><td>${packetData.dns.qtype}</td></tr>
+                           ${packetData.dns.qr ? `<tr><th>Kod odpowiedzi</th><td>${packetData.dns.rcode}</td></tr>` : ''}
+                       </table>
+                       ${packetData.dns.answers ? `
+                       <table class="table table-sm">
+                           <thead><tr><th>Nazwa</th><th>Typ</th><th>TTL</th><th>Dane</th></tr></thead>
+                           <tbody>
+                               ${packetData.dns.answers.map(answer => `<tr><td>${escapeHtml(answer.name)}</td><td>${answer.type}</td><td>${answer.ttl}</td><td>${escapeHtml(answer.data)}</td></tr>`).join('')}
+                           </tbody>
+                       </table>
                        ` : ''}
-                       ${packetData.udp ? `
-                       <div class="tab-pane fade" id="udp" role="tabpanel">
-                           <table class="table">
-                               <tr><th>Port źródłowy</th><td>${packetData.udp.sport}</td></tr>
-                               <tr><th>Port docelowy</th><td>${packetData.udp.dport}</td></tr>
-                               <tr><th>Długość</th><td>${packetData.udp.len}</td></tr>
-                           </table>
-                       </div>
+                   </div>
+                   ` : ''}
+                   ${packetData.arp ? `
+                   <div class="tab-pane fade" id="arp" role="tabpanel">
+                       <table class="table">
+                           <tr><th>Operacja</th><td>${packetData.arp.op === 1 ? 'Żądanie (who-has)' : packetData.arp.op === 2 ? 'Odpowiedź (is-at)' : packetData.arp.op}</td></tr>
+                           <tr><th>IP nadawcy</th><td>${packetData.arp.psrc}</td></tr>
+                           <tr><th>MAC nadawcy</th><td>${packetData.arp.hwsrc}</td></tr>
+                           <tr><th>IP docelowe</th><td>${packetData.arp.pdst}</td></tr>
+                           <tr><th>MAC docelowy</th><td>${packetData.arp.hwdst}</td></tr>
+                       </table>
+                   </div>
+                   ` : ''}
+                   ${packetData.tcp ? `
+                   <div class="tab-pane fade" id="tcp" role="tabpanel">
+                       <table class="table">
+                           <tr><th>Port źródłowy</th><td>${packetData.tcp.sport}</td></tr>
+                           <tr><th>Port docelowy</th><td>${packetData.tcp.dport}</td></tr>
+                           <tr><th>Flagi</th><td>${packetData.tcp.flags}</td></tr>
+                           <tr><th>Sekwencja</th><td>${packetData.tcp.seq}</td></tr>
+                           <tr><th>Potwierdzenie</th><td>${packetData.tcp.ack}</td></tr>
+                       </table>
+                   </div>
+                   ` : ''}
+                   ${packetData.udp ? `
+                   <div class="tab-pane fade" id="udp" role="tabpanel">
+                       <table class="table">
+                           <tr><th>Port źródłowy</th><td>${packetData.udp.sport}</td></tr>
+                           <tr><th>Port docelowy</th><td>${packetData.udp.dport}</td></tr>
+                           <tr><th>Długość</th><td>${packetData.udp.len}</td></tr>
+                       </table>
+                   </div>
+                   ` : ''}
+                   ${packetData.payload_length ? `
+                   <div class="tab-pane fade" id="payload" role="tabpanel">
+                       <p class="mt-2">
+                           Długość payload: ${packetData.payload_length} bajtów
+                           ${packetData.payload_truncated ? '<span class="badge bg-warning text-dark ms-2">podgląd skrócony</span>' : ''}
+                       </p>
+                       <pre id="payloadPreview">${escapeHtml(packetData.payload_preview !== undefined ? packetData.payload_preview : packetData.payload_preview_hex)}</pre>
+                       ${packetData.payload_ref ? `
+                       <button class="btn btn-sm btn-outline-primary" id="loadFullPayloadBtn">Wczytaj pełny payload (hex)</button>
+                       <a class="btn btn-sm btn-outline-secondary ms-2" href="/api/payload/${filename}/${packetData.packet_number}">Pobierz payload</a>
                        ` : ''}
-                       <div class="tab-pane fade" id="raw" role="tabpanel">
-                           <pre>${JSON.stringify(packetData, null, 2)}</pre>
+                   </div>
+                   ` : ''}
+                   <div class="tab-pane fade" id="layers" role="tabpanel">
+                       <div id="packetLayers" class="mt-2">
+                           <i class="fas fa-spinner fa-spin"></i> Dekodowanie pakietu...
                        </div>
                    </div>
+                   <div class="tab-pane fade" id="raw" role="tabpanel">
+                       <pre>${JSON.stringify(packetData, null, 2)}</pre>
+                   </div>
                </div>
-           `;
-           
-           // Otwieranie modalu
-           const packetModal = new bootstrap.Modal(document.getElementById('packetModal'));
-           packetModal.show();
-       });
+           </div>
+       `;
+       
+       // Leniwe pobieranie pełnego payload z API
+       const loadFullPayloadBtn = document.getElementById('loadFullPayloadBtn');
+       if (loadFullPayloadBtn) {
+           loadFullPayloadBtn.addEventListener('click', function() {
+               fetch(`/api/payload/${filename}/${packetData.packet_number}?format=hex`)
+                   .then(response => response.json())
+                   .then(payload => {
+                       document.getElementById('payloadPreview').textContent = payload.hex;
+                       loadFullPayloadBtn.disabled = true;
+                   })
+                   .catch(error => console.error('Error loading payload:', error));
+           });
+       }
+       
+       // Pełny rozbiór pakietu wykonywany na serwerze dopiero przy otwarciu szczegółów
+       loadPacketDissection(packetData.packet_number);
+       
+       // Otwieranie modalu
+       const packetModal = new bootstrap.Modal(document.getElementById('packetModal'));
+       packetModal.show();
    });
 }
 
+// Pobieranie i wyświetlanie wszystkich warstw pakietu zdekodowanych z pliku źródłowego
+function loadPacketDissection(packetNumber) {
+    fetch(`/api/dissect/${filename}/${packetNumber}`)
+        .then(response => response.json())
+        .then(result => {
+            const container = document.getElementById('packetLayers');
+            if (!container) return;
+            
+            if (result.error) {
+                container.innerHTML = `<div class="alert alert-secondary">Pełny rozbiór niedostępny: ${escapeHtml(result.error)}</div>`;
+                return;
+            }
+            
+            container.innerHTML = `
+                <p><code>${escapeHtml(result.summary)}</code></p>
+                ${result.layers.map(layer => `
+                    <h6 class="mt-3">${escapeHtml(layer.name)}</h6>
+                    <table class="table table-sm">
+                        <tbody>
+                            ${layer.fields.map(field => `<tr><th class="w-25">${escapeHtml(field.name)}</th><td><code>${escapeHtml(field.value)}</code></td></tr>`).join('')}
+                        </tbody>
+                    </table>
+                `).join('')}
+            `;
+        })
+        .catch(error => console.error('Error loading packet dissection:', error));
+}
+
+// Zabezpieczenie tekstu przed wstawieniem do HTML
+function escapeHtml(text) {
+   const div = document.createElement('div');
+   div.textContent = text || '';
+   return div.innerHTML;
+}
+
+// Oczekiwanie na wynik zadania wykonywanego w tle - odpowiedź 202 zawiera uchwyt zadania
+function resolveJobResponse(response, onProgress) {
+    if (!response.ok) {
+        throw new Error(response.status === 503 ? 'Serwer jest zajęty - spróbuj ponownie za chwilę' : 'Network response was not ok');
+    }
+    return response.json().then(data => response.status === 202 ? pollJob(data.status_url, onProgress) : data);
+}
+
+// Zapytanie API, które przy brakujących danych zwraca uchwyt zadania (202) - po zakończeniu zadania jest ponawiane
+function fetchWhenReady(url, options, onPending) {
+    return fetch(url, options).then(response => {
+        if (response.status !== 202) return response;
+        if (onPending) onPending();
+        return response.json()
+            .then(data => pollJob(data.status_url))
+            .then(job => job.success ? fetchWhenReady(url, options, onPending) : Promise.reject(new Error(job.error)));
+    });
+}
+
+// Odpytywanie o stan zadania z rosnącym odstępem, aż zadanie się zakończy
+function pollJob(statusUrl, onProgress, delay = 500) {
+    return new Promise(resolve => setTimeout(resolve, delay))
+        .then(() => fetch(statusUrl))
+        .then(response => response.json())
+        .then(job => {
+            if (job.status === 'queued' || job.status === 'running') {
+                if (onProgress) onProgress(job);
+                return pollJob(statusUrl, onProgress, Math.min(delay * 1.5, 3000));
+            }
+            return job;
+        });
+}
+
+// Opis etapu zadania generowania raportu (np. "wykresy 2/4: Protocol Distribution")
+const REPORT_STAGE_LABELS = {
+    stats: 'statystyki',
+    charts: 'wykresy',
+    layout: 'układ stron',
+    write: 'zapis pliku'
+};
+
+function describeJobProgress(job) {
+    if (job.status === 'queued') {
+        return `w kolejce (${job.queue_position || 1})`;
+    }
+    if (!job.progress) return 'start';
+    
+    const progress = job.progress;
+    let text = REPORT_STAGE_LABELS[progress.stage] || progress.stage;
+    if (progress.step && progress.steps) text += ` ${progress.step}/${progress.steps}`;
+    if (progress.detail) text += `: ${progress.detail}`;
+    return text;
+}
+
 // Generator raportów PDF
 function initReportGenerator() {
    const reportBtn = document.getElementById('generateReportBtn');
@@ -1311,7 +1949,7 @@ function initReportGenerator() {
        
        // Zbieranie zaznaczonych opcji
        const options = [];
-       document.querySelectorAll('#reportOptions input[type="checkbox"]:checked').forEach(checkbox => {
+       this.querySelectorAll('input[type="checkbox"]:checked').forEach(checkbox => {
            options.push(checkbox.value);
        });
        
@@ -1329,8 +1967,35 @@ function initReportGenerator() {
            params.append('options[]', option);
        });
        
-       // Przekierowanie do endpointu generującego PDF
-       window.location.href = `/generate_report/${filename}?${params.toString()}`;
+       // Raport generowany w tle - po zakończeniu zadania przekierowanie do pobrania PDF
+       const originalText = reportBtn.innerHTML;
+       reportBtn.disabled = true;
+       reportBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Generowanie...';
+       
+       const restoreButton = () => {
+           reportBtn.disabled = false;
+           reportBtn.innerHTML = originalText;
+       };
+       
+       fetch(`/generate_report/${filename}?${params.toString()}`, {
+           headers: { 'Accept': 'application/json' }
+       })
+       .then(response => resolveJobResponse(response, job => {
+           reportBtn.innerHTML = `<i class="fas fa-spinner fa-spin"></i> ${escapeHtml(describeJobProgress(job))}`;
+       }))
+       .then(data => {
+           restoreButton();
+           if (data.success) {
+               window.location.href = data.report_url;
+           } else {
+               alert(`Błąd generowania raportu: ${data.error}`);
+           }
+       })
+       .catch(error => {
+           console.error('Error:', error);
+           restoreButton();
+           alert(`Wystąpił błąd podczas generowania raportu: ${error.message}`);
+       });
    });
 }
 
@@ -1347,6 +2012,7 @@ function initFilteredReportGenerator() {
        const srcIp = document.getElementById('filter-src-ip').value;
        const dstIp = document.getElementById('filter-dst-ip').value;
        const protocol = document.getElementById('filter-protocol').value;
+       const appProtocol = document.getElementById('filter-app-protocol').value;
        const port = document.getElementById('filter-port').value;
        const lengthMin = document.getElementById('filter-length-min').value;
        const lengthMax = document.getElementById('filter-length-max').value;
@@ -1360,6 +2026,7 @@ function initFilteredReportGenerator() {
            srcIp: srcIp,
            dstIp: dstIp,
            protocol: protocol,
+           appProtocol: appProtocol,
            port: port,
            lengthMin: lengthMin,
            lengthMax: lengthMax,
@@ -1379,12 +2046,9 @@ function initFilteredReportGenerator() {
            },
            body: JSON.stringify(filterData)
        })
-       .then(response => {
-           if (!response.ok) {
-               throw new Error('Network response was not ok');
-           }
-           return response.json();
-       })
+       .then(response => resolveJobResponse(response, job => {
+           filteredReportBtn.innerHTML = `<i class="fas fa-spinner fa-spin"></i> ${escapeHtml(describeJobProgress(job))}`;
+       }))
        .then(data => {
            // Przywrócenie przycisku
            filteredReportBtn.disabled = false;
@@ -1419,6 +2083,7 @@ function initFilteredReportGenerator() {
            const srcIp = document.getElementById('filter-src-ip').value.toLowerCase();
            const dstIp = document.getElementById('filter-dst-ip').value.toLowerCase();
            const protocol = document.getElementById('filter-protocol').value;
+           const appProtocol = document.getElementById('filter-app-protocol').value;
            const port = document.getElementById('filter-port').value;
            const lengthMin = parseInt(document.getElementById('filter-length-min').value) || 0;
            const lengthMax = parseInt(document.getElementById('filter-length-max').value) || Number.MAX_SAFE_INTEGER;
@@ -1435,8 +2100,9 @@ function initFilteredReportGenerator() {
                    const srcIdx = 5;    // Źródło IP
                    const dstIdx = 6;    // Cel IP
                    const protoIdx = 7;  // Protokół
-                   const portsIdx = 8;  // Porty
-                   const lengthIdx = 9; // Długość
+                   const appProtoIdx = 8; // Aplikacja
+                   const portsIdx = 9;  // Porty
+                   const lengthIdx = 10; // Długość
                    
                    // Dane z wiersza
                    const rowSrcMac = data[srcMacIdx].toLowerCase();
@@ -1444,6 +2110,7 @@ function initFilteredReportGenerator() {
                    const rowSrc = data[srcIdx].toLowerCase();
                    const rowDst = data[dstIdx].toLowerCase();
                    const rowProto = data[protoIdx];
+                   const rowAppProto = data[appProtoIdx];
                    const rowPorts = data[portsIdx];
                    const rowLength = parseInt(data[lengthIdx]) || 0;
                    
@@ -1455,6 +2122,7 @@ function initFilteredReportGenerator() {
                    if (srcIp && !rowSrc.includes(srcIp)) match = false;
                    if (dstIp && !rowDst.includes(dstIp)) match = false;
                    if (protocol && rowProto !== protocol) match = false;
+                   if (appProtocol && rowAppProto !== appProtocol) match = false;
                    if (port && !rowPorts.includes(port)) match = false;
                    if (rowLength < lengthMin || rowLength > lengthMax) match = false;
                    
@@ -1480,6 +2148,7 @@ function initFilteredReportGenerator() {
            document.getElementById('filter-src-ip').value = '';
            document.getElementById('filter-dst-ip').value = '';
            document.getElementById('filter-protocol').value = '';
+           document.getElementById('filter-app-protocol').value = '';
            document.getElementById('filter-port').value = '';
            document.getElementById('filter-length-min').value = '';
            document.getElementById('filter-length-max').value = '';
@@ -1492,10 +2161,43 @@ function initFilteredReportGenerator() {
    }
 }
 
+// Wartości pól formularza filtrów (wraz z wyrażeniem filtra)
+function collectFilterData() {
+    const srcMac = document.getElementById('filter-src-mac').value;
+    const dstMac = document.getElementById('filter-dst-mac').value;
+    const srcIp = document.getElementById('filter-src-ip').value;
+    const dstIp = document.getElementById('filter-dst-ip').value;
+    const protocol = document.getElementById('filter-protocol').value;
+    const appProtocol = document.getElementById('filter-app-protocol').value;
+    const port = document.getElementById('filter-port').value;
+    const lengthMin = document.getElementById('filter-length-min').value;
+    const lengthMax = document.getElementById('filter-length-max').value;
+    const timeStart = document.getElementById('filter-time-start').value;
+    const timeEnd = document.getElementById('filter-time-end').value;
+    const expression = document.getElementById('filter-expression').value;
+    
+    // Dane w formacie oczekiwanym przez serwer
+    return {
+        srcMac: srcMac,
+        dstMac: dstMac,
+        srcIp: srcIp,
+        dstIp: dstIp,
+        protocol: protocol,
+        appProtocol: appProtocol,
+        port: port,
+        lengthMin: lengthMin,
+        lengthMax: lengthMax,
+        timeStart: timeStart,
+        timeEnd: timeEnd,
+        expression: expression
+    };
+}
+
 // Generator filtrowanych raportów
 function initFilteredReportGenerator() {
    const filteredReportBtn = document.getElementById('generateFilteredReportBtn');
    const filteredCSVBtn = document.getElementById('generateFilteredCSVBtn');
+   const filteredPcapBtn = document.getElementById('generateFilteredPcapBtn');
    
    if (filteredReportBtn) {
        // Obsługa kliknięcia przycisku "Raport z filtrów"
@@ -1511,33 +2213,24 @@ function initFilteredReportGenerator() {
        });
    }
    
+   if (filteredPcapBtn) {
+       // Obsługa kliknięcia przycisku "Filtrowany PCAP"
+       filteredPcapBtn.addEventListener('click', function() {
+           generateFilteredExport('pcap');
+       });
+   }
+   
+   // Opis rodzaju eksportu w komunikatach o błędach
+   function describeExportType(exportType) {
+       if (exportType === 'csv') return 'eksportu CSV';
+       if (exportType === 'pcap') return 'eksportu PCAP';
+       return 'generowania raportu';
+   }
+   
    // Wspólna funkcja do generowania eksportów
    function generateFilteredExport(exportType) {
        // Pobieranie wartości filtrów
-       const srcMac = document.getElementById('filter-src-mac').value;
-       const dstMac = document.getElementById('filter-dst-mac').value;
-       const srcIp = document.getElementById('filter-src-ip').value;
-       const dstIp = document.getElementById('filter-dst-ip').value;
-       const protocol = document.getElementById('filter-protocol').value;
-       const port = document.getElementById('filter-port').value;
-       const lengthMin = document.getElementById('filter-length-min').value;
-       const lengthMax = document.getElementById('filter-length-max').value;
-       const timeStart = document.getElementById('filter-time-start').value;
-       const timeEnd = document.getElementById('filter-time-end').value;
-       
-       // Przygotowanie danych do wysłania
-       const filterData = {
-           srcMac: srcMac,
-           dstMac: dstMac,
-           srcIp: srcIp,
-           dstIp: dstIp,
-           protocol: protocol,
-           port: port,
-           lengthMin: lengthMin,
-           lengthMax: lengthMax,
-           timeStart: timeStart,
-           timeEnd: timeEnd
-       };
+       const filterData = collectFilterData();
        
        // Określenie przycisku i endpointu
        let button, endpoint, loadingText, originalText;
@@ -1547,6 +2240,11 @@ function initFilteredReportGenerator() {
            endpoint = `/export_filtered_csv/${filename}`;
            loadingText = '<i class="fas fa-spinner fa-spin"></i> Eksportowanie CSV...';
            originalText = '<i class="fas fa-file-csv"></i> Filtrowany CSV';
+       } else if (exportType === 'pcap') {
+           button = filteredPcapBtn;
+           endpoint = `/export_filtered_pcap/${filename}`;
+           loadingText = '<i class="fas fa-spinner fa-spin"></i> Eksportowanie PCAP...';
+           originalText = '<i class="fas fa-file-export"></i> Filtrowany PCAP';
        } else {
            button = filteredReportBtn;
            endpoint = `/generate_filtered_report/${filename}`;
@@ -1566,12 +2264,9 @@ function initFilteredReportGenerator() {
            },
            body: JSON.stringify(filterData)
        })
-       .then(response => {
-           if (!response.ok) {
-               throw new Error('Network response was not ok');
-           }
-           return response.json();
-       })
+       .then(response => resolveJobResponse(response, job => {
+           button.innerHTML = `<i class="fas fa-spinner fa-spin"></i> ${escapeHtml(describeJobProgress(job))}`;
+       }))
        .then(data => {
            // Przywrócenie przycisku
            button.disabled = false;
@@ -1583,11 +2278,14 @@ function initFilteredReportGenerator() {
                    window.location.href = data.csv_url;
                    // Wyświetl informację o liczbie wyeksportowanych pakietów
                    alert(`Wyeksportowano ${data.total_packets} pakietów do pliku CSV.`);
+               } else if (exportType === 'pcap') {
+                   window.location.href = data.pcap_url;
+                   alert(`Wyeksportowano ${data.total_packets} pakietów do pliku PCAP.`);
                } else {
                    window.location.href = data.report_url;
                }
            } else {
-               alert(`Błąd ${exportType === 'csv' ? 'eksportu CSV' : 'generowania raportu'}: ${data.error}`);
+               alert(`Błąd ${describeExportType(exportType)}: ${data.error}`);
            }
        })
        .catch(error => {
@@ -1595,71 +2293,43 @@ function initFilteredReportGenerator() {
            // Przywrócenie przycisku
            button.disabled = false;
            button.innerHTML = originalText;
-           alert(`Wystąpił błąd podczas ${exportType === 'csv' ? 'eksportu CSV' : 'generowania raportu'}. Sprawdź konsolę przeglądarki.`);
+           alert(`Wystąpił błąd podczas ${describeExportType(exportType)}. Sprawdź konsolę przeglądarki.`);
        });
    }
    
-   // Obsługa przycisku "Zastosuj filtry"
+   // Obsługa przycisku "Zastosuj filtry" - filtr obliczany na serwerze (te same reguły co w eksportach)
    const applyFiltersBtn = document.getElementById('apply-filters');
    if (applyFiltersBtn) {
+       const filterStatus = document.getElementById('filter-status');
+       
        applyFiltersBtn.addEventListener('click', function() {
-           // Tutaj można dodać kod do filtrowania tabeli bez generowania raportu PDF
-           // Na przykład filtrowanie w DataTables
-           
-           // Pobieranie wartości filtrów
-           const srcMac = document.getElementById('filter-src-mac').value.toLowerCase();
-           const dstMac = document.getElementById('filter-dst-mac').value.toLowerCase();
-           const srcIp = document.getElementById('filter-src-ip').value.toLowerCase();
-           const dstIp = document.getElementById('filter-dst-ip').value.toLowerCase();
-           const protocol = document.getElementById('filter-protocol').value;
-           const port = document.getElementById('filter-port').value;
-           const lengthMin = parseInt(document.getElementById('filter-length-min').value) || 0;
-           const lengthMax = parseInt(document.getElementById('filter-length-max').value) || Number.MAX_SAFE_INTEGER;
-           
-           // Zastosowanie niestandardowego filtra do DataTables
-           const dataTable = $('#packetsTable').DataTable();
-           
-           // Własny filtr wyszukiwania
-           $.fn.dataTable.ext.search.push(
-               function(settings, data, dataIndex) {
-                   // Indeksy kolumn w tabeli
-                   const srcMacIdx = 2; // MAC Źródłowe
-                   const dstMacIdx = 3; // MAC Docelowe
-                   const srcIdx = 5;    // Źródło IP
-                   const dstIdx = 6;    // Cel IP
-                   const protoIdx = 7;  // Protokół
-                   const portsIdx = 8;  // Porty
-                   const lengthIdx = 9; // Długość
-                   
-                   // Dane z wiersza
-                   const rowSrcMac = data[srcMacIdx].toLowerCase();
-                   const rowDstMac = data[dstMacIdx].toLowerCase();
-                   const rowSrc = data[srcIdx].toLowerCase();
-                   const rowDst = data[dstIdx].toLowerCase();
-                   const rowProto = data[protoIdx];
-                   const rowPorts = data[portsIdx];
-                   const rowLength = parseInt(data[lengthIdx]) || 0;
-                   
-                   // Sprawdzanie warunków filtrowania
-                   let match = true;
-                   
-                   if (srcMac && !rowSrcMac.includes(srcMac)) match = false;
-                   if (dstMac && !rowDstMac.includes(dstMac)) match = false;
-                   if (srcIp && !rowSrc.includes(srcIp)) match = false;
-                   if (dstIp && !rowDst.includes(dstIp)) match = false;
-                   if (protocol && rowProto !== protocol) match = false;
-                   if (port && !rowPorts.includes(port)) match = false;
-                   if (rowLength < lengthMin || rowLength > lengthMax) match = false;
-                   
-                   return match;
+           // Przy pierwszym filtrze serwer buduje kolumny pakietów w zadaniu - po jego zakończeniu zapytanie jest ponawiane
+           fetchWhenReady(`/api/filter/${filename}`, {
+               method: 'POST',
+               headers: {
+                   'Content-Type': 'application/json',
+               },
+               body: JSON.stringify(collectFilterData())
+           }, () => {
+               filterStatus.className = 'small mt-1 text-muted';
+               filterStatus.textContent = 'Przygotowywanie indeksu pakietów...';
+           })
+           .then(response => response.json())
+           .then(result => {
+               if (result.error) {
+                   filterStatus.className = 'small mt-1 text-danger';
+                   filterStatus.textContent = `Błąd filtra: ${result.error}`;
+                   return;
                }
-           );
-           
-           // Przeładowanie tabeli z uwzględnieniem filtrów
-           dataTable.draw();
-           
-           // Usunięcie filtra po zastosowaniu
-           $.fn.dataTable.ext.search.pop();
+               
+               // Tabela pokazuje strony pasujących pakietów (pobierane z /api/json)
+               filteredPacketNumbers = result.packet_numbers;
+               $('#packetsTable').DataTable().page('first').draw('page');
+               
+               filterStatus.className = 'small mt-1 text-muted';
+               filterStatus.textContent = `Pasujące pakiety: ${result.matched} z ${result.total} (${result.elapsed_ms} ms)`;
+           })
+           .catch(error => console.error('Error applying filters:', error));
        });
    }
    
@@ -1673,14 +2343,18 @@ function initFilteredReportGenerator() {
            document.getElementById('filter-src-ip').value = '';
            document.getElementById('filter-dst-ip').value = '';
            document.getElementById('filter-protocol').value = '';
+           document.getElementById('filter-app-protocol').value = '';
            document.getElementById('filter-port').value = '';
            document.getElementById('filter-length-min').value = '';
            document.getElementById('filter-length-max').value = '';
            document.getElementById('filter-time-start').value = '';
            document.getElementById('filter-time-end').value = '';
+           document.getElementById('filter-expression').value = '';
+           document.getElementById('filter-status').textContent = '';
+           filteredPacketNumbers = null;
            
            // Przywrócenie oryginalnej tabeli
-           $('#packetsTable').DataTable().search('').columns().search('').draw();
+           $('#packetsTable').DataTable().page('first').draw('page');
        });
    }
 }
\ No newline at end of file